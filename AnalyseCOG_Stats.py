@@ -2,6 +2,8 @@ import os
 import glob
 from osgeo import gdal
 
+from gdal_profiles import apply_profile
+
 def analyze_geotiff_files(file_list):
     """
     Analyses a list of single-band GeoTIFF files and returns their
@@ -78,6 +80,7 @@ def print_results(results):
         print(f"{result['filename']:<30} {nodata_str:<15} {result['min_value']:<15.6f} {result['max_value']:<15.6f}")
 
 if __name__ == "__main__":
+    apply_profile('analysis')
     geotiff_dir = "/var/www/html2/lidar"
     file_list = glob.glob(os.path.join(geotiff_dir, "*.tif"))
     
@@ -8,6 +8,8 @@ import os
 import glob
 from osgeo import gdal
 
+from gdal_profiles import apply_profile
+
 def get_file_size(file_path):
     """
     Returns file size in MB
@@ -142,6 +144,7 @@ def save_text_results(results, output_file='analysis_results.txt'):
                    f"{result['max_value']:<15.6f}\n")
 
 if __name__ == "__main__":
+    apply_profile('analysis')
     geotiff_dir = "/Volumes/MyShare/lidar"
     #geotiff_dir = "/Volumes/MyShare/lidar_deflate"
     #geotiff_dir = "/Users/alexdonald/Downloads/newlidar"
@@ -1,14 +1,36 @@
 import os
+import json
 import zipfile
 from osgeo import gdal
 import requests
 
+from asc_mosaic import mosaic_members, print_mosaic_report, save_mosaic_report
+from fingerprint import JsonCache
+from gdal_profiles import apply_profile
+from reproject_cog import reproject_to_cog, projected_output_path
+from validate_cogs import validate_file, VALIDATOR_VERSION, DEFAULT_CACHE_DIR
+from verify_recompression import verify_rasters, print_report
+
 
 class ZipRasterProcessor:
-    def __init__(self, url_list, output_dir):
+    def __init__(self, url_list, output_dir, verify_output=False, validate_before_publish=False,
+                 quarantine_dir=None, staging_memory_limit=256 * 1024 * 1024,
+                 validation_cache_dir=DEFAULT_CACHE_DIR, extra_projections=(), warp_memory_mb=512,
+                 direct_mosaic=True):
         self.url_list = url_list
         self.output_dir = output_dir
         self.projection = 'EPSG:29902'
+        self.verify_output = verify_output
+        self.validate_before_publish = validate_before_publish
+        self.quarantine_dir = quarantine_dir or os.path.join(output_dir, 'quarantine')
+        # Rasters up to this uncompressed size are staged in /vsimem instead of on disk
+        self.staging_memory_limit = staging_memory_limit
+        self.validation_cache_dir = validation_cache_dir
+        # Also write tile-matrix-aligned COGs in these CRSs, e.g. ('EPSG:3857', 'EPSG:2157')
+        self.extra_projections = extra_projections
+        self.warp_memory_mb = warp_memory_mb
+        # Mosaic the ASCII members straight into a tiled GeoTIFF instead of a VRT
+        self.direct_mosaic = direct_mosaic
 
     def download_zip(self, url, output_path):
         if os.path.exists(output_path):
@@ -19,7 +41,7 @@ class ZipRasterProcessor:
             with open(output_path, 'wb') as f:
                 f.write(r.content)
                 
-            with open('processed/logfile.txt', 'a') as f:
+            with open(os.path.join(self.output_dir, 'logfile.txt'), 'a') as f:
                 f.write(url + '\n')
                 print(f"Downloaded and logged: {url}")
             
@@ -43,8 +65,13 @@ class ZipRasterProcessor:
                         print(f"No files found in {folder_prefix} folder within {zip_path}")
                         continue
 
-                    vrt_path = self.create_virtual_raster(z, folder_files, folder_prefix)
-                    self.convert_to_cog(vrt_path, folder_prefix, zip_path)
+                    mosaic_path = self.create_mosaic(z, folder_files, folder_prefix) if self.direct_mosaic else None
+                    if mosaic_path is not None:
+                        self.convert_to_cog(mosaic_path, folder_prefix, zip_path)
+                        os.remove(mosaic_path)
+                    else:
+                        vrt_path = self.create_virtual_raster(z, folder_files, folder_prefix)
+                        self.convert_to_cog(vrt_path, folder_prefix, zip_path)
         except zipfile.BadZipFile as e:
             print(f"Bad zip file: {zip_path}. Error: {e}")
 
@@ -55,6 +82,23 @@ class ZipRasterProcessor:
         except OSError as e:
             print(f"Error deleting file {zip_path}: {e}")
 
+    def create_mosaic(self, zip_file, file_list, folder_name):
+        """
+        Writes the members into a tiled GeoTIFF mosaic and reports any anomalies.
+        Returns None if some members can not be placed pixel-aligned, so the
+        caller can fall back to a resampling VRT.
+        """
+        name = f"{os.path.basename(zip_file.filename).replace('.zip', '')}_{folder_name}"
+        mosaic_path = os.path.join(self.output_dir, f"{name}.mosaic.tif")
+        report = mosaic_members(zip_file, file_list, mosaic_path)
+        print_mosaic_report(mosaic_path, report)
+        if report['anomalies'] or report['failures']:
+            save_mosaic_report(report, os.path.join(self.output_dir, f"{name}.mosaic.json"))
+        if not report['written']:
+            print(f"Falling back to a VRT for {name}")
+            return None
+        return mosaic_path
+
     def create_virtual_raster(self, zip_file, file_list, folder_name):
         vrt_options = gdal.BuildVRTOptions()
         vrt_path = os.path.join(self.output_dir, f"{os.path.basename(zip_file.filename).replace('.zip', '')}_{folder_name}.vrt")
@@ -74,8 +118,116 @@ class ZipRasterProcessor:
         translate_options = gdal.TranslateOptions(format='COG', creationOptions=["COMPRESS=DEFLATE", "BIGTIFF=YES", "NUM_THREADS=ALL_CPUS"],
                                                   outputSRS=self.projection)
         
-        gdal.Translate(cog_path, vrt_path, options=translate_options)
-        print(f"Converted to COG: {cog_path}")
+        if self.validate_before_publish:
+            if not self.convert_and_publish(vrt_path, cog_path, translate_options):
+                return
+        else:
+            gdal.Translate(cog_path, vrt_path, options=translate_options)
+            print(f"Converted to COG: {cog_path}")
+
+        if self.verify_output:
+            result = verify_rasters(vrt_path, cog_path)
+            print_report(vrt_path, cog_path, result)
+
+        for dst_srs in self.extra_projections:
+            self.convert_to_projection(vrt_path, cog_path, dst_srs)
+
+    def convert_to_projection(self, vrt_path, cog_path, dst_srs):
+        """
+        Writes a copy of the COG warped to dst_srs and aligned to its tile matrix.
+        """
+        projected_path = projected_output_path(self.output_dir, os.path.basename(cog_path), dst_srs)
+
+        def convert(output_path):
+            reproject_to_cog(vrt_path, output_path, dst_srs, self.warp_memory_mb, src_srs=self.projection)
+
+        if self.validate_before_publish:
+            self.convert_and_publish(vrt_path, projected_path, convert=convert)
+        else:
+            convert(projected_path)
+            print(f"Converted to {dst_srs} COG: {projected_path}")
+
+    def staging_path(self, vrt_path, cog_path):
+        ds = gdal.Open(vrt_path)
+        band = ds.GetRasterBand(1)
+        raw_size = ds.RasterXSize * ds.RasterYSize * ds.RasterCount * gdal.GetDataTypeSize(band.DataType) // 8
+        ds = None
+        if raw_size <= self.staging_memory_limit:
+            return f"/vsimem/staging/{os.path.basename(cog_path)}"
+        # Stage on the same filesystem so publishing is an atomic rename
+        staging_dir = os.path.join(self.output_dir, '.staging')
+        os.makedirs(staging_dir, exist_ok=True)
+        return os.path.join(staging_dir, os.path.basename(cog_path))
+
+    def move_file(self, src_path, dst_path):
+        if not src_path.startswith('/vsimem/'):
+            os.replace(src_path, dst_path)
+            return
+        f = gdal.VSIFOpenL(src_path, 'rb')
+        try:
+            with open(dst_path, 'wb') as out:
+                while True:
+                    chunk = gdal.VSIFReadL(1, 16 * 1024 * 1024, f)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+        finally:
+            gdal.VSIFCloseL(f)
+        gdal.Unlink(src_path)
+
+    def convert_and_publish(self, vrt_path, cog_path, translate_options=None, convert=None):
+        """
+        Converts to a staging path, validates the result and only then moves it
+        into the output directory. Invalid COGs go to the quarantine directory
+        with a JSON report. Returns True if the COG was published.
+
+        convert, if given, is called with the staging path instead of translating
+        with translate_options.
+        """
+        staging_path = self.staging_path(vrt_path, cog_path)
+        error = None
+        try:
+            if convert is not None:
+                convert(staging_path)
+            elif gdal.Translate(staging_path, vrt_path, options=translate_options) is None:
+                error = gdal.GetLastErrorMsg() or "gdal.Translate failed"
+        except Exception as e:
+            error = str(e)
+        if error is None and gdal.VSIStatL(staging_path) is None:
+            error = "Conversion did not write the staging file"
+
+        if error is not None:
+            # Nothing to quarantine, only the report of the failure
+            if gdal.VSIStatL(staging_path) is not None:
+                gdal.Unlink(staging_path)
+            os.makedirs(self.quarantine_dir, exist_ok=True)
+            result = {'filename': os.path.basename(cog_path), 'path': None, 'valid': False, 'warnings': [],
+                      'errors': [], 'details': {}, 'headers_size': None, 'exception': error}
+            with open(os.path.join(self.quarantine_dir, os.path.basename(cog_path) + '.validation.json'), 'w') as f:
+                json.dump(result, f, indent=2)
+            print(f"Error processing {os.path.basename(cog_path)}: {error}")
+            return False
+        result = validate_file(staging_path, full_check=True)
+
+        if not result['valid']:
+            os.makedirs(self.quarantine_dir, exist_ok=True)
+            quarantine_path = os.path.join(self.quarantine_dir, os.path.basename(cog_path))
+            self.move_file(staging_path, quarantine_path)
+            result.update({'filename': os.path.basename(cog_path), 'path': quarantine_path})
+            with open(quarantine_path + '.validation.json', 'w') as f:
+                json.dump(result, f, indent=2)
+            print(f"Invalid COG quarantined: {quarantine_path}")
+            for error in result['errors'] + ([result['exception']] if result['exception'] else []):
+                print(f" - {error}")
+            return False
+
+        self.move_file(staging_path, cog_path)
+        # Record the result against the published file so validate_cogs.py does not re-read it
+        result.update({'filename': os.path.basename(cog_path), 'path': cog_path})
+        if self.validation_cache_dir:
+            JsonCache(self.validation_cache_dir, version=VALIDATOR_VERSION).put(cog_path, result)
+        print(f"Converted to COG: {cog_path} (validated)")
+        return True
 
     def run(self):
         for url in self.url_list:
@@ -93,131 +245,133 @@ class ZipRasterProcessor:
 
 
 
-url_list = [
-'https://opendatani.blob.core.windows.net/lpslidar/Castlederg_23_05_2004.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Foyle_23_05_2004.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Limavady_23_05_2004.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Newtownstewart_23_05_2004.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Omagh_23_05_2004.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Strabane_23_05_2004.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Ballynavally_04_04_2007.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Bangor_04_04_2007.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Carrickfergus_04_04_2007.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Castlereagh_04_04_2007.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Dunmurry_04_04_2007.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Newtownards_10_06_2008.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Ballyclare_23_04_2009.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Ballymena_23_04_2009.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Clady_10_03_2009.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Downpatrick_05_05_2009.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Londonderry_30_04_2009.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Maghera_20_04_2009.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Portadown_27_04_2009.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Ballycastle_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Ballygalley_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Ballygowan_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Ballynahinch_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Banbridge_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Bushmills_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Carryduff_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Cullybackey_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Cushendall_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Killyleagh__15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Larne_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Lisburn_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Magherafelt_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Newcastle_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Newry_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Newtownabbey_15_03_2010.zip  ',
-'https://opendatani.blob.core.windows.net/lpslidar/Randalstown_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Tandragee_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Ardstraw_02_02_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Ballinamallard_05_03_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Belleek_05_03_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Beragh_02_02_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Burren_03_03_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Dougary_02_02_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Eglinton_11_12_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Enniskillen_05_03_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Fintona_02_02_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Glenavy_02_02_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Keady_02_02_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Lisbellaw_05_03_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Lurgan_05_03_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Maguiresbridge_05_03_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Moneymore_05_03_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Mossley_05_03_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Omagh_Town_11_12_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Saintfield_02_02_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Sion Mills_02_02_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Cookstown_06_06_2013.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/East Belfast_29_05_2013.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Blackwater_16_06_2014.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Camowen_16_06_2014.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Cloghmills_16_06_2014.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/LowerBann_16_06_2014.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Stonyford_16_06_2014.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Armagh-Dungannon-Coalisland_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Coleraine-Portstewart_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/BangorExtension_05_03_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Folk Park Newtownstewart_02_02_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/PortadownExtension_02_02_2012.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Ardquin.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Ardtole.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Black%20Pigs%20Dyke.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Bonamargy.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Cahery.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Cave%20Hill.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Charlemont.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Clandeboye.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Clogher.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Cornashee.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Crossmurrin.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Devenish.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Dohertys%20Tower.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Donegore.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Dundrum.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Dunluce.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Dunmull.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Dunseverick.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Garron.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Giants%20Sconce.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Glynn.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Greyabbey%20%26%20Ballywalter.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Inch%20Abbey.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Kiltierney.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Linford.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Lyles%20Hill.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Magheramore.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Mobuoy.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Mount%20Stewart.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Navan.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Raholp.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Ringreagh.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Saul.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Scrabo.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Slemish.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Struell.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/The%20Dorsey.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Tirgoland.zip',
-'https://opendatani.blob.core.windows.net/archaeologylidar/Tullaghoge.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/BangorExtension_05_03_2012.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Coleraine-Portstewart_15_03_2010.zip',
-'https://opendatani.blob.core.windows.net/lpslidar/Newtownabbey_15_03_2010.zip',
-
-]
-
-
-output_dir = 'processed'
-
-logfile_path = os.path.join(output_dir, 'logfile.txt')
-with open(logfile_path, 'r') as f:
-    log_content = f.read().splitlines()
-
-for url in url_list:
-    if url.strip() not in log_content:
-        print(f"Processing URL: {url}")
-        processor = ZipRasterProcessor([url], output_dir)
-        processor.run()
-    else:
-        print(f"URL already processed: {url}. Skipping download.")
+if __name__ == "__main__":
+    apply_profile('bulk-convert')
+    url_list = [
+    'https://opendatani.blob.core.windows.net/lpslidar/Castlederg_23_05_2004.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Foyle_23_05_2004.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Limavady_23_05_2004.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Newtownstewart_23_05_2004.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Omagh_23_05_2004.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Strabane_23_05_2004.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Ballynavally_04_04_2007.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Bangor_04_04_2007.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Carrickfergus_04_04_2007.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Castlereagh_04_04_2007.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Dunmurry_04_04_2007.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Newtownards_10_06_2008.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Ballyclare_23_04_2009.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Ballymena_23_04_2009.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Clady_10_03_2009.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Downpatrick_05_05_2009.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Londonderry_30_04_2009.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Maghera_20_04_2009.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Portadown_27_04_2009.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Ballycastle_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Ballygalley_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Ballygowan_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Ballynahinch_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Banbridge_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Bushmills_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Carryduff_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Cullybackey_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Cushendall_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Killyleagh__15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Larne_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Lisburn_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Magherafelt_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Newcastle_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Newry_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Newtownabbey_15_03_2010.zip  ',
+    'https://opendatani.blob.core.windows.net/lpslidar/Randalstown_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Tandragee_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Ardstraw_02_02_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Ballinamallard_05_03_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Belleek_05_03_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Beragh_02_02_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Burren_03_03_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Dougary_02_02_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Eglinton_11_12_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Enniskillen_05_03_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Fintona_02_02_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Glenavy_02_02_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Keady_02_02_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Lisbellaw_05_03_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Lurgan_05_03_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Maguiresbridge_05_03_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Moneymore_05_03_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Mossley_05_03_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Omagh_Town_11_12_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Saintfield_02_02_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Sion Mills_02_02_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Cookstown_06_06_2013.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/East Belfast_29_05_2013.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Blackwater_16_06_2014.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Camowen_16_06_2014.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Cloghmills_16_06_2014.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/LowerBann_16_06_2014.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Stonyford_16_06_2014.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Armagh-Dungannon-Coalisland_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Coleraine-Portstewart_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/BangorExtension_05_03_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Folk Park Newtownstewart_02_02_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/PortadownExtension_02_02_2012.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Ardquin.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Ardtole.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Black%20Pigs%20Dyke.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Bonamargy.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Cahery.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Cave%20Hill.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Charlemont.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Clandeboye.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Clogher.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Cornashee.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Crossmurrin.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Devenish.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Dohertys%20Tower.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Donegore.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Dundrum.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Dunluce.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Dunmull.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Dunseverick.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Garron.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Giants%20Sconce.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Glynn.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Greyabbey%20%26%20Ballywalter.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Inch%20Abbey.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Kiltierney.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Linford.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Lyles%20Hill.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Magheramore.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Mobuoy.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Mount%20Stewart.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Navan.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Raholp.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Ringreagh.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Saul.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Scrabo.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Slemish.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Struell.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/The%20Dorsey.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Tirgoland.zip',
+    'https://opendatani.blob.core.windows.net/archaeologylidar/Tullaghoge.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/BangorExtension_05_03_2012.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Coleraine-Portstewart_15_03_2010.zip',
+    'https://opendatani.blob.core.windows.net/lpslidar/Newtownabbey_15_03_2010.zip',
+
+    ]
+
+
+    output_dir = 'processed'
+
+    logfile_path = os.path.join(output_dir, 'logfile.txt')
+    with open(logfile_path, 'r') as f:
+        log_content = f.read().splitlines()
+
+    for url in url_list:
+        if url.strip() not in log_content:
+            print(f"Processing URL: {url}")
+            processor = ZipRasterProcessor([url], output_dir)
+            processor.run()
+        else:
+            print(f"URL already processed: {url}. Skipping download.")
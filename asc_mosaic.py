@@ -0,0 +1,335 @@
+'''
+Mosaics the zipped ESRI ASCII grid members of a LiDAR download directly into
+a tiled GeoTIFF, instead of going through gdal.BuildVRT.
+The headers (ncols/nrows/xllcorner/yllcorner/cellsize/NODATA_value) are read
+up front to build an index of member extents on a common grid. Members with a
+different cell size or off the grid, overlapping members and gaps inside the
+mosaic are reported. Members are parsed in parallel and written pixel-aligned
+into a pre-allocated tiled output, so the COG writer reads a plain raster
+rather than resampling through a VRT.
+'''
+import os
+import json
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from osgeo import gdal
+from shapely import STRtree
+from shapely.geometry import box
+from shapely.ops import unary_union
+
+from gdal_profiles import apply_profile, add_profile_argument
+
+DEFAULT_NODATA = -9999.0
+BLOCK_SIZE = 512
+# Offsets within this fraction of a pixel count as on the grid
+ALIGNMENT_TOLERANCE = 1e-3
+HEADER_KEYS = {'ncols', 'nrows', 'xllcorner', 'yllcorner', 'xllcenter', 'yllcenter', 'cellsize', 'dx', 'dy',
+               'nodata_value'}
+
+
+def read_ascii_header(f):
+    """
+    Reads the header of an ESRI ASCII grid from an open binary file.
+
+    Returns:
+        dict: ncols, nrows, cellsize, bounds (minx, miny, maxx, maxy), nodata
+            and header_lines
+    """
+    values = {}
+    header_lines = 0
+    while True:
+        line = f.readline()
+        parts = line.split()
+        if len(parts) != 2 or parts[0].decode('ascii', 'replace').lower() not in HEADER_KEYS:
+            break
+        values[parts[0].decode('ascii').lower()] = float(parts[1])
+        header_lines += 1
+
+    cellsize = values.get('cellsize', values.get('dx'))
+    if cellsize is None or 'ncols' not in values or 'nrows' not in values:
+        raise ValueError("Missing ncols, nrows or cellsize in the ASCII header")
+    if values.get('dy', cellsize) != cellsize:
+        raise ValueError("Non-square cells (dx != dy) are not supported")
+    ncols, nrows = int(values['ncols']), int(values['nrows'])
+    if 'xllcenter' in values:
+        minx, miny = values['xllcenter'] - cellsize / 2, values['yllcenter'] - cellsize / 2
+    else:
+        minx, miny = values['xllcorner'], values['yllcorner']
+    return {
+        'ncols': ncols,
+        'nrows': nrows,
+        'cellsize': cellsize,
+        'bounds': (minx, miny, minx + ncols * cellsize, miny + nrows * cellsize),
+        'nodata': values.get('nodata_value'),
+        'header_lines': header_lines
+    }
+
+
+def index_members(zip_file, members):
+    """
+    Reads the header of each member without decompressing the grids.
+
+    Returns:
+        tuple: (list of header dicts with a 'name', list of (name, error) for unreadable members)
+    """
+    index, failures = [], []
+    for name in sorted(members):
+        try:
+            with zip_file.open(name) as f:
+                header = read_ascii_header(f)
+            header['name'] = name
+            index.append(header)
+        except (ValueError, KeyError, zipfile.BadZipFile) as e:
+            failures.append((name, str(e)))
+    return index, failures
+
+
+def _grid_phase(member, cellsize):
+    # Top-left corner as a fraction of a pixel, rounded finer than the alignment tolerance
+    phase = []
+    for coordinate in (member['bounds'][0], member['bounds'][3]):
+        fraction = round((coordinate / cellsize) % 1.0, 4)
+        phase.append(0.0 if fraction == 1.0 else fraction)
+    return tuple(phase)
+
+
+def plan_mosaic(index):
+    """
+    Places the members on a common grid and checks them for anomalies.
+
+    The grid uses the most common cell size and the most common grid phase
+    (corner position modulo the cell size), so one odd member can not shift
+    the grid for the others. Members with another cell size or not on the grid can not be
+    written pixel-aligned and are reported as 'cellsize' or 'misaligned'.
+    Overlapping members and gaps inside the mosaic (holes in the union of the
+    member extents) are reported as 'overlap' and 'gap'.
+
+    Returns:
+        dict: grid (cellsize, geotransform, width, height), placements
+            (name -> (col, row)) and anomalies
+    """
+    anomalies = []
+    if not index:
+        return {'grid': None, 'placements': {}, 'anomalies': anomalies}
+
+    cellsize = Counter(round(member['cellsize'], 9) for member in index).most_common(1)[0][0]
+    same_size = [member for member in index if abs(member['cellsize'] - cellsize) <= cellsize * 1e-6]
+    phases = Counter(_grid_phase(member, cellsize) for member in same_size)
+    phase = phases.most_common(1)[0][0]
+    origin = next(member for member in same_size if _grid_phase(member, cellsize) == phase)
+    origin_x, origin_y = origin['bounds'][0], origin['bounds'][3]
+    aligned = []
+    for member in index:
+        if abs(member['cellsize'] - cellsize) > cellsize * 1e-6:
+            anomalies.append({'type': 'cellsize', 'members': [member['name']],
+                              'detail': f"cell size {member['cellsize']} instead of {cellsize}"})
+            continue
+        col = (member['bounds'][0] - origin_x) / cellsize
+        row = (origin_y - member['bounds'][3]) / cellsize
+        if abs(col - round(col)) > ALIGNMENT_TOLERANCE or abs(row - round(row)) > ALIGNMENT_TOLERANCE:
+            anomalies.append({'type': 'misaligned', 'members': [member['name']],
+                              'detail': f"offset by ({col - round(col):.3f}, {row - round(row):.3f}) pixels"})
+            continue
+        aligned.append((member, int(round(col)), int(round(row))))
+
+    if not aligned:
+        return {'grid': None, 'placements': {}, 'anomalies': anomalies}
+
+    min_col = min(col for _, col, _ in aligned)
+    min_row = min(row for _, _, row in aligned)
+    width = max(col + member['ncols'] for member, col, _ in aligned) - min_col
+    height = max(row + member['nrows'] for member, _, row in aligned) - min_row
+    placements = {member['name']: (col - min_col, row - min_row) for member, col, row in aligned}
+    geotransform = (origin_x + min_col * cellsize, cellsize, 0.0, origin_y - min_row * cellsize, 0.0, -cellsize)
+
+    # Overlaps, in pixels of the common grid
+    boxes = [box(col - min_col, row - min_row, col - min_col + member['ncols'], row - min_row + member['nrows'])
+             for member, col, row in aligned]
+    tree = STRtree(boxes)
+    for i, j in zip(*tree.query(boxes, predicate='intersects')):
+        if i < j:
+            area = boxes[i].intersection(boxes[j]).area
+            if area > 0:
+                anomalies.append({'type': 'overlap', 'members': [aligned[i][0]['name'], aligned[j][0]['name']],
+                                  'detail': f"{int(area)} pixels overlap"})
+
+    # Gaps: holes inside the covered area, not the ragged outline of the survey
+    union = unary_union(boxes)
+    for polygon in getattr(union, 'geoms', [union]):
+        for ring in polygon.interiors:
+            minx, miny, maxx, maxy = ring.bounds
+            anomalies.append({'type': 'gap', 'members': [],
+                              'detail': f"{int(box(minx, miny, maxx, maxy).area)} pixel hole at "
+                                        f"col {int(minx)}-{int(maxx)}, row {int(miny)}-{int(maxy)}"})
+
+    return {
+        'grid': {'cellsize': cellsize, 'geotransform': geotransform, 'width': width, 'height': height},
+        'placements': placements,
+        'anomalies': anomalies
+    }
+
+
+def read_member(zip_file, member, nodata):
+    """
+    Parses the values of one member, with its nodata value replaced by the mosaic's.
+    """
+    with zip_file.open(member['name']) as f:
+        for _ in range(member['header_lines']):
+            f.readline()
+        values = np.array(f.read().split(), dtype=np.float32)
+    expected = member['ncols'] * member['nrows']
+    if values.size != expected:
+        raise ValueError(f"{member['name']} has {values.size} values, expected {expected}")
+    data = values.reshape(member['nrows'], member['ncols'])
+    if member['nodata'] is not None and member['nodata'] != nodata:
+        data[data == member['nodata']] = nodata
+    return data
+
+
+def write_mosaic(zip_file, index, plan, output_path, nodata=DEFAULT_NODATA, workers=None):
+    """
+    Writes the aligned members into a pre-allocated tiled GeoTIFF.
+
+    Members are parsed in parallel and written in name order. Where members
+    overlap, the first valid value is kept and pixels where valid values differ
+    are counted in the overlap anomaly.
+
+    Returns:
+        str: output_path
+    """
+    grid = plan['grid']
+    members = [member for member in index if member['name'] in plan['placements']]
+    driver = gdal.GetDriverByName('GTiff')
+    ds = driver.Create(output_path, grid['width'], grid['height'], 1, gdal.GDT_Float32,
+                       ['TILED=YES', f'BLOCKXSIZE={BLOCK_SIZE}', f'BLOCKYSIZE={BLOCK_SIZE}', 'SPARSE_OK=TRUE',
+                        'BIGTIFF=IF_SAFER'])
+    ds.SetGeoTransform(grid['geotransform'])
+    band = ds.GetRasterBand(1)
+    band.SetNoDataValue(nodata)
+
+    overlaps = {tuple(a['members']): a for a in plan['anomalies'] if a['type'] == 'overlap'}
+    by_name = {member['name']: member for member in members}
+    written = []
+    workers = workers or os.cpu_count()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded number of parsed members in flight, written in order
+            pending = []
+            members_iter = iter(members)
+            for member in members_iter:
+                pending.append((member, executor.submit(read_member, zip_file, member, nodata)))
+                if len(pending) >= workers * 2:
+                    break
+            while pending:
+                member, future = pending.pop(0)
+                next_member = next(members_iter, None)
+                if next_member is not None:
+                    pending.append((next_member, executor.submit(read_member, zip_file, next_member, nodata)))
+
+                data = future.result()
+                col, row = plan['placements'][member['name']]
+                overlapping = [name for name in written if (name, member['name']) in overlaps]
+                if overlapping:
+                    existing = band.ReadAsArray(col, row, member['ncols'], member['nrows'])
+                    differs = (existing != nodata) & (data != nodata) & (existing != data)
+                    for name in overlapping:
+                        # Count within the intersection with that member only
+                        other = by_name[name]
+                        other_col, other_row = plan['placements'][name]
+                        x0, y0 = max(col, other_col) - col, max(row, other_row) - row
+                        x1 = min(col + member['ncols'], other_col + other['ncols']) - col
+                        y1 = min(row + member['nrows'], other_row + other['nrows']) - row
+                        differing = int(np.count_nonzero(differs[y0:y1, x0:x1]))
+                        overlaps[(name, member['name'])]['differing_pixels'] = differing
+                    data = np.where(existing != nodata, existing, data)
+                band.WriteArray(data, col, row)
+                written.append(member['name'])
+        band.FlushCache()
+    except Exception:
+        # Do not leave a partial mosaic behind
+        band = ds = None
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    band = ds = None
+    return output_path
+
+
+def mosaic_members(zip_file, members, output_path, nodata=DEFAULT_NODATA, workers=None):
+    """
+    Indexes, checks and writes a mosaic of zipped ASCII grid members.
+
+    Args:
+        zip_file (zipfile.ZipFile): Open zip
+        members (list): Member names of the .asc grids
+        output_path (str): Tiled GeoTIFF to write
+        nodata (float): Nodata value of the mosaic
+        workers (int): Parsing threads
+
+    Returns:
+        dict: report with 'members', 'grid', 'anomalies', 'failures' and
+            'written' (False if some members could not be placed or read, in
+            which case nothing is written)
+    """
+    index, failures = index_members(zip_file, members)
+    plan = plan_mosaic(index)
+    report = {'members': len(members), 'grid': plan['grid'], 'anomalies': plan['anomalies'],
+              'failures': [{'member': name, 'error': error} for name, error in failures], 'written': False}
+    if plan['grid'] is None or failures or len(plan['placements']) != len(index):
+        return report
+    try:
+        write_mosaic(zip_file, index, plan, output_path, nodata, workers)
+    except Exception as e:
+        # A grid body that does not match its header only shows up while writing;
+        # write_mosaic has removed the partial output
+        report['failures'].append({'member': os.path.basename(output_path), 'error': str(e)})
+        return report
+    report['written'] = True
+    return report
+
+
+def print_mosaic_report(output_path, report):
+    grid = report['grid']
+    if grid:
+        print(f"Mosaic {output_path}: {report['members']} members, {grid['width']} x {grid['height']} pixels "
+              f"at {grid['cellsize']} m")
+    for failure in report['failures']:
+        print(f"Error processing {failure['member']}: {failure['error']}")
+    counts = Counter(anomaly['type'] for anomaly in report['anomalies'])
+    if counts:
+        print("Anomalies: " + ", ".join(f"{count} {kind}" for kind, count in sorted(counts.items())))
+    for anomaly in report['anomalies']:
+        differing = f", {anomaly['differing_pixels']} differing pixels" if anomaly.get('differing_pixels') else ""
+        members = f"{', '.join(anomaly['members'])} " if anomaly['members'] else ""
+        print(f" - {anomaly['type']}: {members}{anomaly['detail']}{differing}")
+
+
+def save_mosaic_report(report, output_file):
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mosaic the ASCII grids in a LiDAR zip into a tiled GeoTIFF.")
+    parser.add_argument("zip", help="Downloaded zip file.")
+    parser.add_argument("output", help="Output tiled GeoTIFF.")
+    parser.add_argument("--product", choices=("DSM", "DTM"), default="DTM")
+    parser.add_argument("--workers", type=int, default=None, help="Parsing threads.")
+    parser.add_argument("--report", default=None, help="Also write the report as JSON.")
+    add_profile_argument(parser, "bulk-convert")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    with zipfile.ZipFile(args.zip, 'r') as z:
+        members = [f for f in z.namelist() if args.product in f and f.endswith('.asc') and 'ITM' not in f]
+        report = mosaic_members(z, members, args.output, workers=args.workers)
+    print_mosaic_report(args.output, report)
+    if args.report:
+        save_mosaic_report(report, args.report)
+    if not report['written']:
+        print(f"Error processing {args.zip}: members could not be placed on a common grid, no mosaic written")
@@ -4,18 +4,49 @@ simple scriot to convert files with deflate compression and statistics
 import os
 from osgeo import gdal
 
-input_dir = r'lidar/'
-output_dir = r'newlidar/'
-
-for f in os.listdir(input_dir):
-    if f.endswith('.tif'):
-        input_file = os.path.join(input_dir, f)
-        output_file = os.path.join(output_dir, f)
-        
-        translate_options = gdal.TranslateOptions(
-            format='COG',
-            creationOptions=["COMPRESS=ZSTD", "PREDICTOR=2", "NUM_THREADS=ALL_CPUS", "STATISTICS=Yes"],
-            outputSRS='EPSG:29902'
-        )
-        
-        gdal.Translate(output_file, input_file, options=translate_options)
+from reproject_cog import reproject_to_cog, projected_output_path
+from verify_recompression import verify_rasters, print_report
+from gdal_profiles import apply_profile
+
+CREATION_OPTIONS = ["COMPRESS=ZSTD", "PREDICTOR=2", "NUM_THREADS=ALL_CPUS", "STATISTICS=Yes"]
+
+
+def convert_file(input_file, output_file, creation_options=CREATION_OPTIONS, extra_projections=(), warp_memory_mb=512):
+    """
+    Converts one file to a COG, checks it against the source and writes any
+    reprojected copies. Returns the verification result.
+    """
+    translate_options = gdal.TranslateOptions(
+        format='COG',
+        creationOptions=list(creation_options),
+        outputSRS='EPSG:29902'
+    )
+
+    gdal.Translate(output_file, input_file, options=translate_options)
+
+    # ZSTD with PREDICTOR=2 is lossless, so every block should match the source
+    result = verify_rasters(input_file, output_file)
+    if not result['identical'] or result['errors']:
+        print_report(input_file, output_file, result)
+
+    output_dir = os.path.dirname(output_file)
+    for dst_srs in extra_projections:
+        projected_file = projected_output_path(output_dir, os.path.basename(output_file), dst_srs)
+        reproject_to_cog(output_file, projected_file, dst_srs, warp_memory_mb,
+                         creation_options=[o for o in creation_options if not o.startswith("NUM_THREADS=")])
+    return result
+
+
+if __name__ == "__main__":
+    apply_profile('bulk-convert')
+    input_dir = r'lidar/'
+    output_dir = r'newlidar/'
+    # Also write tile-matrix-aligned copies in these CRSs, e.g. ['EPSG:3857', 'EPSG:2157']
+    extra_projections = []
+    warp_memory_mb = 512
+
+    for f in os.listdir(input_dir):
+        if f.endswith('.tif'):
+            input_file = os.path.join(input_dir, f)
+            output_file = os.path.join(output_dir, f)
+            convert_file(input_file, output_file, extra_projections=extra_projections, warp_memory_mb=warp_memory_mb)
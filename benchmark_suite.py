@@ -0,0 +1,411 @@
+'''
+Offline end-to-end benchmark of the processing workflow.
+Synthetic LiDAR archives with the same layout as the opendatani downloads
+(<survey>/DSM and <survey>/DTM folders of .asc tiles, plus ITM variants that
+the processor must skip) are generated at a configurable size and served from
+a local HTTP server. The full ZipRasterProcessor flow (download, mosaic, COG)
+is run against them, followed by recompression, validation and analysis.
+Per-stage wall time, peak memory and throughput are compared against a stored
+baseline, and stages that got slower or bigger than the tolerance are flagged.
+'''
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import zipfile
+import platform
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from osgeo import gdal
+
+from DownloadProcessCOGS import ZipRasterProcessor
+from batchconvert import convert_file
+from validate_cogs import validate_files
+from AnalyseCogs import analyze_geotiff_files
+from raster_stats import analyze_collection
+from local_http import serve_directory
+from gdal_profiles import apply_profile, add_profile_argument
+
+BASELINE_VERSION = 1
+DEFAULT_BASELINE = "benchmark_baseline.json"
+ASC_NODATA = -9999
+# (archives, tiles per side, tile size in pixels)
+PRESETS = {
+    'small': (1, 2, 250),
+    'medium': (2, 4, 500),
+    'large': (2, 8, 1000),
+}
+
+
+def current_rss():
+    """
+    Resident set size of this process in bytes. Where /proc is not available
+    this is the peak so far rather than the current size.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+
+class MemorySampler:
+    """
+    Samples the RSS on a background thread and keeps the highest value seen.
+    """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+        return self.peak
+
+
+class StageRecorder:
+    """
+    Accumulates wall time, peak RSS and pixel counts per named stage.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name, pixels=0):
+        sampler = MemorySampler().start()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = sampler.stop()
+            record = self.stages.setdefault(name, {'seconds': 0.0, 'peak_rss_mb': 0.0, 'pixels': 0})
+            record['seconds'] += elapsed
+            record['peak_rss_mb'] = max(record['peak_rss_mb'], peak / 1024 ** 2)
+            record['pixels'] += pixels
+
+    def results(self):
+        results = {}
+        for name, record in self.stages.items():
+            result = dict(record)
+            result['megapixels_per_second'] = (record['pixels'] / 1e6 / record['seconds']
+                                               if record['pixels'] and record['seconds'] else None)
+            results[name] = result
+        return results
+
+
+class TimedZipRasterProcessor(ZipRasterProcessor):
+    """
+    ZipRasterProcessor that records its download, mosaic and COG steps.
+    """
+
+    def __init__(self, url_list, output_dir, recorder, pixels_per_product, **kwargs):
+        super().__init__(url_list, output_dir, **kwargs)
+        self.recorder = recorder
+        self.pixels_per_product = pixels_per_product
+
+    def download_zip(self, url, output_path):
+        with self.recorder.stage('download'):
+            super().download_zip(url, output_path)
+
+    def create_mosaic(self, zip_file, file_list, folder_name):
+        with self.recorder.stage('mosaic', self.pixels_per_product):
+            return super().create_mosaic(zip_file, file_list, folder_name)
+
+    def create_virtual_raster(self, zip_file, file_list, folder_name):
+        with self.recorder.stage('mosaic', self.pixels_per_product):
+            return super().create_virtual_raster(zip_file, file_list, folder_name)
+
+    def convert_to_cog(self, vrt_path, folder_name, zip_path):
+        with self.recorder.stage('cog', self.pixels_per_product):
+            super().convert_to_cog(vrt_path, folder_name, zip_path)
+
+
+def synthetic_surface(rows, cols, x0, y0, cellsize, seed):
+    """
+    Smooth terrain with some noise, in metres, sampled on a grid whose top-left
+    corner is (x0, y0). Neighbouring tiles join up because the surface is a
+    function of the map coordinates.
+    """
+    x = x0 + (np.arange(cols) + 0.5) * cellsize
+    y = y0 - (np.arange(rows) + 0.5) * cellsize
+    xx, yy = np.meshgrid(x, y)
+    surface = (120 + 40 * np.sin(xx / 700.0) * np.cos(yy / 900.0) + 15 * np.sin((xx + yy) / 230.0))
+    rng = np.random.default_rng(seed)
+    return surface + rng.normal(0, 0.05, surface.shape)
+
+
+def ascii_grid(data, xll, yll, cellsize):
+    buffer = io.BytesIO()
+    header = (f"ncols {data.shape[1]}\nnrows {data.shape[0]}\nxllcorner {xll}\nyllcorner {yll}\n"
+              f"cellsize {cellsize}\nNODATA_value {ASC_NODATA}\n")
+    buffer.write(header.encode('ascii'))
+    np.savetxt(buffer, data, fmt='%.2f')
+    return buffer.getvalue()
+
+
+def make_synthetic_zip(path, survey, tiles, tile_size, cellsize=1.0, include_itm=True, seed=0,
+                       origin=(230000.0, 380000.0)):
+    """
+    Writes a zip laid out like the opendatani LiDAR downloads.
+
+    Args:
+        path (str): Zip file to write
+        survey (str): Survey folder name, e.g. Synthetic_01_01_2020
+        tiles (int): Tiles per side in each product
+        tile_size (int): Tile width and height in pixels
+        cellsize (float): Pixel size in metres
+        include_itm (bool): Also add ITM copies of the tiles, which should be skipped
+        seed (int): Random seed for the surface noise
+        origin (tuple): Lower-left corner of the survey in EPSG:29902
+
+    Returns:
+        int: Pixels in each product
+    """
+    span = tile_size * cellsize
+    folders = ['DSM', 'DTM'] + (['DSM_ITM', 'DTM_ITM'] if include_itm else [])
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as z:
+        # Directory entries are part of the real layout and the processor relies on them
+        z.writestr(f"{survey}/", b"")
+        for folder in folders:
+            z.writestr(f"{survey}/{folder}/", b"")
+        for i in range(tiles):
+            for j in range(tiles):
+                xll, yll = origin[0] + i * span, origin[1] + j * span
+                terrain = synthetic_surface(tile_size, tile_size, xll, yll + span, cellsize, seed + i * tiles + j)
+                for folder in folders:
+                    data = terrain + (8.0 if folder.startswith('DSM') else 0.0)
+                    if folder == 'DTM' and i == 0 and j == 0:
+                        # Some nodata, as over water
+                        data[:tile_size // 4, :tile_size // 4] = ASC_NODATA
+                    # The ITM copies sit on a shifted grid, as a different CRS would
+                    shift = 0.37 * cellsize if folder.endswith('ITM') else 0.0
+                    z.writestr(f"{survey}/{folder}/{survey}_{folder}_{i}_{j}.asc",
+                               ascii_grid(data, xll + shift, yll + shift, cellsize))
+    return tiles * tiles * tile_size * tile_size
+
+
+def run_benchmark(workdir, archives, tiles, tile_size, include_itm=True, direct_mosaic=True):
+    """
+    Runs every stage once against freshly served synthetic archives.
+
+    Returns:
+        dict: scenario, environment, stages and total seconds
+    """
+    archive_dir = os.path.join(workdir, 'archives')
+    output_dir = os.path.join(workdir, 'processed')
+    recompressed_dir = os.path.join(workdir, 'recompressed')
+    shutil.rmtree(output_dir, ignore_errors=True)
+    shutil.rmtree(recompressed_dir, ignore_errors=True)
+    os.makedirs(archive_dir, exist_ok=True)
+    os.makedirs(output_dir)
+    os.makedirs(recompressed_dir)
+
+    names = []
+    pixels_per_product = tiles * tiles * tile_size * tile_size
+    for k in range(archives):
+        survey = f"Synthetic{k}_01_01_2020"
+        zip_path = os.path.join(archive_dir, f"{survey}_{tiles}x{tile_size}{'_itm' if include_itm else ''}.zip")
+        if not os.path.exists(zip_path):
+            # Generating is slow, so archives are kept between runs
+            make_synthetic_zip(zip_path + '.tmp', survey, tiles, tile_size, include_itm=include_itm, seed=k,
+                               origin=(230000.0 + k * 50000.0, 380000.0))
+            os.replace(zip_path + '.tmp', zip_path)
+        names.append(os.path.basename(zip_path))
+
+    recorder = StageRecorder()
+    server, base_url = serve_directory(archive_dir)
+    start = time.perf_counter()
+    try:
+        processor = TimedZipRasterProcessor([f"{base_url}/{name}" for name in names], output_dir, recorder,
+                                            pixels_per_product, direct_mosaic=direct_mosaic)
+        processor.run()
+    finally:
+        server.shutdown()
+
+    cogs = sorted(os.path.join(output_dir, f"{name.replace('.zip', '')}_{product}.tif")
+                  for name in names for product in ('DSM', 'DTM'))
+    missing = [path for path in cogs if not os.path.exists(path)]
+    if missing:
+        raise RuntimeError(f"No output for {', '.join(os.path.basename(path) for path in missing)}")
+    for path in cogs:
+        ds = gdal.Open(path)
+        size = (ds.RasterXSize, ds.RasterYSize)
+        ds = None
+        # An ITM tile slipping in would widen the grid
+        if size != (tiles * tile_size, tiles * tile_size):
+            raise RuntimeError(f"{os.path.basename(path)} is {size[0]} x {size[1]}, expected "
+                               f"{tiles * tile_size} x {tiles * tile_size}")
+
+    recompressed = []
+    for path in cogs:
+        output_file = os.path.join(recompressed_dir, os.path.basename(path))
+        with recorder.stage('recompress', pixels_per_product):
+            result = convert_file(path, output_file)
+        if not result['identical']:
+            raise RuntimeError(f"{output_file} does not match {path}")
+        recompressed.append(output_file)
+
+    with recorder.stage('validate', pixels_per_product * len(recompressed)):
+        results = validate_files(recompressed)
+    invalid = [result['filename'] for result in results if not result['valid']]
+    if invalid:
+        raise RuntimeError(f"Not valid COGs: {', '.join(invalid)}")
+
+    with recorder.stage('analyse', pixels_per_product * len(recompressed)):
+        analyze_geotiff_files(recompressed)
+    with recorder.stage('distribution', pixels_per_product * len(recompressed)):
+        analyze_collection(recompressed)
+
+    return {
+        'scenario': scenario_key(archives, tiles, tile_size, include_itm, direct_mosaic),
+        'environment': {
+            'machine': platform.node(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'python': platform.python_version(),
+            'gdal': gdal.__version__
+        },
+        'total_seconds': time.perf_counter() - start,
+        'stages': recorder.results()
+    }
+
+
+def scenario_key(archives, tiles, tile_size, include_itm, direct_mosaic):
+    return (f"{archives}x{tiles}x{tiles}x{tile_size}px" + ("-itm" if include_itm else "") +
+            ("" if direct_mosaic else "-vrt"))
+
+
+def best_of(runs):
+    """
+    Combines repeated runs, keeping the fastest time and lowest peak of each stage.
+    """
+    best = dict(runs[0])
+    best['total_seconds'] = min(run['total_seconds'] for run in runs)
+    best['stages'] = {}
+    for name in runs[0]['stages']:
+        stages = [run['stages'][name] for run in runs]
+        fastest = dict(min(stages, key=lambda stage: stage['seconds']))
+        fastest['peak_rss_mb'] = min(stage['peak_rss_mb'] for stage in stages)
+        best['stages'][name] = fastest
+    best['runs'] = len(runs)
+    return best
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        data = json.load(f)
+    if data.get('version') != BASELINE_VERSION:
+        return {}
+    return data['scenarios']
+
+
+def save_baseline(path, result):
+    scenarios = load_baseline(path)
+    scenarios[result['scenario']] = result
+    with open(path, 'w') as f:
+        json.dump({'version': BASELINE_VERSION, 'scenarios': scenarios}, f, indent=2)
+
+
+def compare_to_baseline(result, baseline, time_tolerance=0.25, memory_tolerance=0.25, min_seconds=0.05):
+    """
+    Flags stages slower or bigger than the baseline by more than the tolerance.
+    Differences under min_seconds are treated as noise.
+
+    Returns:
+        list: (stage, metric, baseline value, current value) for each regression
+    """
+    regressions = []
+    for name, stage in result['stages'].items():
+        base = baseline.get('stages', {}).get(name)
+        if base is None:
+            continue
+        if stage['seconds'] > base['seconds'] * (1 + time_tolerance) and stage['seconds'] - base['seconds'] > min_seconds:
+            regressions.append((name, 'seconds', base['seconds'], stage['seconds']))
+        if stage['peak_rss_mb'] > base['peak_rss_mb'] * (1 + memory_tolerance):
+            regressions.append((name, 'peak_rss_mb', base['peak_rss_mb'], stage['peak_rss_mb']))
+    return regressions
+
+
+def print_report(result, baseline=None, regressions=()):
+    flagged = {(name, metric) for name, metric, _, _ in regressions}
+    print(f"\nScenario {result['scenario']} ({result.get('runs', 1)} runs, best of)")
+    print(f"{'Stage':<14} {'Seconds':>9} {'Baseline':>9} {'Change':>8} {'Peak MB':>9} {'Mpx/s':>8}")
+    print("-" * 62)
+    for name, stage in result['stages'].items():
+        base = (baseline or {}).get('stages', {}).get(name)
+        base_seconds = f"{base['seconds']:.3f}" if base else "-"
+        change = f"{(stage['seconds'] / base['seconds'] - 1) * 100:+.0f}%" if base and base['seconds'] else "-"
+        throughput = f"{stage['megapixels_per_second']:.1f}" if stage['megapixels_per_second'] else "-"
+        flag = "  SLOWER" if (name, 'seconds') in flagged else ""
+        flag += "  MORE MEMORY" if (name, 'peak_rss_mb') in flagged else ""
+        print(f"{name:<14} {stage['seconds']:>9.3f} {base_seconds:>9} {change:>8} {stage['peak_rss_mb']:>9.1f} "
+              f"{throughput:>8}{flag}")
+    print(f"Total: {result['total_seconds']:.3f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline benchmark of the processing workflow on synthetic archives.")
+    parser.add_argument("--size", choices=sorted(PRESETS), default="small", help="Preset scenario size.")
+    parser.add_argument("--archives", type=int, default=None, help="Number of zip archives (overrides the preset).")
+    parser.add_argument("--tiles", type=int, default=None, help="Tiles per side (overrides the preset).")
+    parser.add_argument("--tile-size", type=int, default=None, help="Tile size in pixels (overrides the preset).")
+    parser.add_argument("--no-itm", action="store_true", help="Leave the ITM variants out of the archives.")
+    parser.add_argument("--vrt", action="store_true", help="Mosaic through BuildVRT instead of the direct writer.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs to take the best of.")
+    parser.add_argument("--workdir", default=".benchmark", help="Directory for archives and outputs.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file.")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this result as the baseline.")
+    parser.add_argument("--time-tolerance", type=float, default=0.25, help="Allowed slowdown, e.g. 0.25 for 25%%.")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="Allowed growth in peak memory.")
+    parser.add_argument("--output", default=None, help="Also write the result as JSON.")
+    add_profile_argument(parser, "bulk-convert")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    archives, tiles, tile_size = PRESETS[args.size]
+    archives = args.archives or archives
+    tiles = args.tiles or tiles
+    tile_size = args.tile_size or tile_size
+
+    runs = [run_benchmark(args.workdir, archives, tiles, tile_size, not args.no_itm, not args.vrt)
+            for _ in range(args.repeat)]
+    result = best_of(runs)
+    baseline = load_baseline(args.baseline).get(result['scenario'])
+    regressions = compare_to_baseline(result, baseline, args.time_tolerance, args.memory_tolerance) if baseline else []
+    print_report(result, baseline, regressions)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.update_baseline:
+        save_baseline(args.baseline, result)
+        print(f"Baseline for {result['scenario']} saved to {args.baseline}")
+    elif baseline is None:
+        print(f"No baseline for {result['scenario']} in {args.baseline}; run with --update-baseline to store one")
+    if regressions:
+        print(f"{len(regressions)} regressions against the baseline")
+        sys.exit(1)
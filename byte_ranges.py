@@ -0,0 +1,40 @@
+'''
+Helpers for planning byte-range reads against (remote) files.
+'''
+
+
+def merge_ranges(ranges, max_gap=0):
+    """
+    Merges byte ranges that overlap or are separated by at most max_gap bytes.
+
+    Args:
+        ranges (list): (offset, size) tuples, in any order
+        max_gap (int): Largest gap in bytes to read through when merging
+
+    Returns:
+        list: (offset, size, members) tuples sorted by offset, where members lists
+            the input ranges covered by each merged range
+    """
+    merged = []
+    for offset, size in sorted(r for r in ranges if r[1] > 0):
+        if merged and offset <= merged[-1][0] + merged[-1][1] + max_gap:
+            start, length, members = merged[-1]
+            end = max(start + length, offset + size)
+            merged[-1] = (start, end - start, members + [(offset, size)])
+        else:
+            merged.append((offset, size, [(offset, size)]))
+    return merged
+
+
+def summarise_ranges(ranges, merged):
+    """
+    Returns request count, bytes fetched and bytes fetched but not needed.
+    """
+    needed = sum(size for _, size in ranges if size > 0)
+    fetched = sum(size for _, size, _ in merged)
+    return {
+        'requests': len(merged),
+        'bytes_fetched': fetched,
+        'bytes_needed': needed,
+        'bytes_wasted': fetched - needed
+    }
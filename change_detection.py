@@ -0,0 +1,365 @@
+'''
+Elevation change between survey epochs that overlap, e.g. Omagh 2004 and
+Omagh_Town 2012. Pairs of COGs from different dates are found through the
+footprint index, and their overlap is put on a common grid: the coarser of the
+two source grids, clipped to the overlap. The difference (newer - older) is
+computed block by block across a process pool, reading only the source
+windows under each block, and written as a COG alongside mergeable change
+statistics. Only a bounded number of blocks is in flight, so memory use does
+not grow with the size of the overlap.
+'''
+import os
+import re
+import sys
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.shutil import copy as rio_copy
+from rasterio.warp import reproject
+from rasterio.windows import Window, from_bounds
+from rasterio import windows as rio_windows
+from shapely.geometry import box
+
+from cog_index import CogIndex, DEFAULT_INDEX_PATH, INDEX_EPSG
+from raster_stats import StreamingStats
+from gdal_profiles import apply_profile, add_profile_argument
+
+# Survey dates are in the filenames, e.g. Omagh_23_05_2004_DTM.tif
+EPOCH_PATTERN = re.compile(r'^(?P<survey>.+?)_(?P<day>\d{2})_(?P<month>\d{2})_(?P<year>\d{4})')
+FLOAT_NODATA = -9999.0
+DEFAULT_BLOCK_SIZE = 512
+
+
+def survey_epoch(filename):
+    """
+    Returns (survey name, 'YYYY-MM-DD') from a filename, or (None, None).
+    """
+    match = EPOCH_PATTERN.match(os.path.basename(filename))
+    if not match:
+        return None, None
+    return match['survey'], f"{match['year']}-{match['month']}-{match['day']}"
+
+
+def find_epoch_pairs(index, name_contains="DTM", min_overlap=10000.0):
+    """
+    Finds pairs of COGs from different survey dates whose footprints overlap.
+
+    Args:
+        index (CogIndex): Index over the COG collection
+        name_contains (str): Only use COGs whose filename contains this
+        min_overlap (float): Smallest overlap area in square metres
+
+    Returns:
+        list: dicts with 'older' and 'newer' index entries, their dates,
+            the 'overlap' geometry and its 'area', largest overlap first
+    """
+    pairs = []
+    for i, entry in enumerate(index.entries):
+        _, date = survey_epoch(entry['filename'])
+        if date is None or (name_contains and name_contains not in entry['filename']):
+            continue
+        for j in index.tree.query(index.geometries[i], predicate='intersects'):
+            other = index.entries[j]
+            _, other_date = survey_epoch(other['filename'])
+            if j <= i or other_date is None or other_date == date:
+                continue
+            if name_contains and name_contains not in other['filename']:
+                continue
+            overlap = index.geometries[i].intersection(index.geometries[j])
+            if overlap.area < min_overlap:
+                continue
+            older, newer = (entry, other) if date < other_date else (other, entry)
+            pairs.append({
+                'older': older,
+                'newer': newer,
+                'older_date': min(date, other_date),
+                'newer_date': max(date, other_date),
+                'overlap': overlap,
+                'area': overlap.area
+            })
+    pairs.sort(key=lambda pair: -pair['area'])
+    return pairs
+
+
+def change_grid(older_path, newer_path, overlap_bounds, block_size=DEFAULT_BLOCK_SIZE):
+    """
+    The output grid: the coarser source grid (the older one on a tie) clipped
+    to the overlap bounds, so neither epoch is upsampled beyond its resolution.
+
+    Returns:
+        dict: transform, width, height, crs and block_size
+    """
+    with rasterio.open(older_path) as older, rasterio.open(newer_path) as newer:
+        reference = older if abs(older.res[0]) >= abs(newer.res[0]) else newer
+        window = from_bounds(*overlap_bounds, transform=reference.transform)
+        col0 = max(0, int(math.floor(window.col_off + 1e-6)))
+        row0 = max(0, int(math.floor(window.row_off + 1e-6)))
+        col1 = min(reference.width, int(math.ceil(window.col_off + window.width - 1e-6)))
+        row1 = min(reference.height, int(math.ceil(window.row_off + window.height - 1e-6)))
+        window = Window(col0, row0, max(0, col1 - col0), max(0, row1 - row0))
+        return {
+            'transform': rio_windows.transform(window, reference.transform),
+            'width': int(window.width),
+            'height': int(window.height),
+            'crs': reference.crs or f"EPSG:{INDEX_EPSG}",
+            'block_size': block_size
+        }
+
+
+def read_on_grid(src, transform, shape, crs):
+    """
+    Reads the part of src under a block of the output grid as float64 with NaN
+    for nodata. Sources on the same grid are read directly; others are read
+    with a one-pixel margin and resampled.
+    """
+    height, width = shape
+    out = np.full(shape, np.nan)
+    col, row = ~src.transform * (transform.c, transform.f)
+    same_grid = (abs(src.transform.a - transform.a) < 1e-9 * abs(transform.a)
+                 and abs(src.transform.e - transform.e) < 1e-9 * abs(transform.e)
+                 and abs(col - round(col)) < 1e-6 and abs(row - round(row)) < 1e-6)
+
+    if same_grid:
+        col, row = int(round(col)), int(round(row))
+        col0, row0 = max(0, col), max(0, row)
+        col1, row1 = min(src.width, col + width), min(src.height, row + height)
+        if col1 <= col0 or row1 <= row0:
+            return out
+        data = src.read(1, window=Window(col0, row0, col1 - col0, row1 - row0)).astype(np.float64)
+        if src.nodata is not None:
+            data[data == src.nodata] = np.nan
+        out[row0 - row:row1 - row, col0 - col:col1 - col] = data
+        return out
+
+    bounds = rio_windows.bounds(Window(0, 0, width, height), transform)
+    window = from_bounds(*bounds, transform=src.transform)
+    col0 = max(0, int(math.floor(window.col_off)) - 1)
+    row0 = max(0, int(math.floor(window.row_off)) - 1)
+    col1 = min(src.width, int(math.ceil(window.col_off + window.width)) + 1)
+    row1 = min(src.height, int(math.ceil(window.row_off + window.height)) + 1)
+    if col1 <= col0 or row1 <= row0:
+        return out
+    window = Window(col0, row0, col1 - col0, row1 - row0)
+    data = src.read(1, window=window).astype(np.float64)
+    if src.nodata is not None:
+        data[data == src.nodata] = np.nan
+    # Average finer sources down to the grid, interpolate the rest
+    resampling = Resampling.average if abs(src.transform.a) < abs(transform.a) * 0.75 else Resampling.bilinear
+    reproject(data, out, src_transform=src.window_transform(window), src_crs=src.crs or crs, src_nodata=np.nan,
+              dst_transform=transform, dst_crs=crs, dst_nodata=np.nan, resampling=resampling)
+    return out
+
+
+class ChangeStats:
+    """
+    Mergeable summary of elevation differences: distribution statistics plus
+    the pixels and volumes of gain and loss beyond a threshold.
+    """
+
+    def __init__(self, threshold=0.5, pixel_area=1.0):
+        self.threshold = threshold
+        self.pixel_area = pixel_area
+        self.stats = StreamingStats(hist_lower=-50.0, hist_upper=50.0, bin_width=0.1)
+        self.gain_pixels = 0
+        self.loss_pixels = 0
+        self.gain_volume = 0.0
+        self.loss_volume = 0.0
+
+    def update(self, difference):
+        self.stats.update(difference)
+        valid = difference[~np.isnan(difference)]
+        gain = valid[valid > self.threshold]
+        loss = valid[valid < -self.threshold]
+        self.gain_pixels += gain.size
+        self.loss_pixels += loss.size
+        self.gain_volume += float(gain.sum()) * self.pixel_area
+        self.loss_volume += float(-loss.sum()) * self.pixel_area
+
+    def merge(self, other):
+        self.stats.merge(other.stats)
+        self.gain_pixels += other.gain_pixels
+        self.loss_pixels += other.loss_pixels
+        self.gain_volume += other.gain_volume
+        self.loss_volume += other.loss_volume
+        return self
+
+    def summary(self):
+        result = self.stats.summary()
+        result.update({
+            'threshold': self.threshold,
+            'gain_pixels': self.gain_pixels,
+            'loss_pixels': self.loss_pixels,
+            'gain_area': self.gain_pixels * self.pixel_area,
+            'loss_area': self.loss_pixels * self.pixel_area,
+            'gain_volume': self.gain_volume,
+            'loss_volume': self.loss_volume,
+            'net_volume': self.gain_volume - self.loss_volume
+        })
+        return result
+
+
+def block_windows(grid):
+    size = grid['block_size']
+    return {(row, col): Window(col * size, row * size,
+                               min(size, grid['width'] - col * size), min(size, grid['height'] - row * size))
+            for row in range((grid['height'] + size - 1) // size)
+            for col in range((grid['width'] + size - 1) // size)}
+
+
+def _difference_blocks(older_path, newer_path, grid, blocks, overlap, threshold):
+    # blocks: list of ((row, col), Window) on the output grid
+    stats = ChangeStats(threshold, abs(grid['transform'].a * grid['transform'].e))
+    results = []
+    with rasterio.open(older_path) as older, rasterio.open(newer_path) as newer:
+        for key, window in blocks:
+            transform = rio_windows.transform(window, grid['transform'])
+            if not overlap.intersects(box(*rio_windows.bounds(window, grid['transform']))):
+                continue
+            shape = (int(window.height), int(window.width))
+            before = read_on_grid(older, transform, shape, grid['crs'])
+            if np.isnan(before).all():
+                continue
+            difference = read_on_grid(newer, transform, shape, grid['crs']) - before
+            if np.isnan(difference).all():
+                continue
+            stats.update(difference)
+            results.append((key, np.where(np.isnan(difference), FLOAT_NODATA, difference).astype(np.float32)))
+    return stats, results
+
+
+def detect_change(older_path, newer_path, overlap, output_path, workers=None, blocks_per_task=16, threshold=0.5,
+                  block_size=DEFAULT_BLOCK_SIZE):
+    """
+    Writes the elevation difference (newer - older) over an overlap as a COG.
+
+    Args:
+        older_path (str): Earlier epoch
+        newer_path (str): Later epoch
+        overlap (shapely geometry): Area to compare, in the COGs' CRS
+        output_path (str): Output COG
+        workers (int): Process pool size (defaults to the CPU count)
+        blocks_per_task (int): Blocks handed to a worker at a time
+        threshold (float): Differences beyond this (in metres) count as gain or loss
+        block_size (int): Block size of the output
+
+    Returns:
+        dict: Change statistics, or None if the epochs share no valid pixels
+    """
+    grid = change_grid(older_path, newer_path, overlap.bounds, block_size)
+    if grid['width'] == 0 or grid['height'] == 0:
+        return None
+    windows = block_windows(grid)
+    items = sorted(windows.items())
+    tasks = [items[i:i + blocks_per_task] for i in range(0, len(items), blocks_per_task)]
+    stats = ChangeStats(threshold, abs(grid['transform'].a * grid['transform'].e))
+
+    profile = {
+        'driver': 'GTiff', 'width': grid['width'], 'height': grid['height'], 'count': 1, 'dtype': 'float32',
+        'nodata': FLOAT_NODATA, 'crs': grid['crs'], 'transform': grid['transform'],
+        'tiled': True, 'blockxsize': block_size, 'blockysize': block_size, 'sparse_ok': True
+    }
+    temp_path = output_path + ".tmp.tif"
+    workers = workers or os.cpu_count()
+    with rasterio.open(temp_path, 'w', **profile) as dst:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Keep a bounded number of tasks in flight so finished blocks are written as they come
+            pending = []
+            tasks_iter = iter(tasks)
+            for task in tasks_iter:
+                pending.append(executor.submit(_difference_blocks, older_path, newer_path, grid, task, overlap,
+                                               threshold))
+                if len(pending) >= workers * 2:
+                    break
+            while pending:
+                task_stats, results = pending.pop(0).result()
+                task = next(tasks_iter, None)
+                if task is not None:
+                    pending.append(executor.submit(_difference_blocks, older_path, newer_path, grid, task, overlap,
+                                                   threshold))
+                stats.merge(task_stats)
+                for key, data in results:
+                    dst.write(data, 1, window=windows[key])
+
+    if stats.stats.valid_pixels == 0:
+        os.remove(temp_path)
+        return None
+    rio_copy(temp_path, output_path, driver='COG', BLOCKSIZE=block_size, COMPRESS='DEFLATE', PREDICTOR=3,
+             OVERVIEW_RESAMPLING='AVERAGE')
+    os.remove(temp_path)
+    return stats.summary()
+
+
+def detect_collection_changes(index, output_dir, name_contains="DTM", min_overlap=10000.0, workers=None,
+                              threshold=0.5):
+    """
+    Runs detect_change for every overlapping pair of epochs in the index.
+
+    Returns:
+        list: One result dict per pair
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    results = []
+    for pair in find_epoch_pairs(index, name_contains, min_overlap):
+        older, newer = pair['older'], pair['newer']
+        stem = f"{os.path.splitext(older['filename'])[0]}__{os.path.splitext(newer['filename'])[0]}"
+        output_path = os.path.join(output_dir, f"{stem}_change.tif")
+        result = {
+            'older': older['filename'],
+            'newer': newer['filename'],
+            'older_date': pair['older_date'],
+            'newer_date': pair['newer_date'],
+            'overlap_area': pair['area'],
+            'output': None,
+            'stats': None
+        }
+        try:
+            stats = detect_change(older['path'], newer['path'], pair['overlap'], output_path, workers,
+                                  threshold=threshold)
+            if stats is not None:
+                result.update({'output': output_path, 'stats': stats})
+                print(f"Change: {older['filename']} -> {newer['filename']}: mean {stats['mean']:.3f} m, "
+                      f"net volume {stats['net_volume']:.0f} m3")
+            else:
+                print(f"No shared valid pixels: {older['filename']} and {newer['filename']}")
+        except Exception as e:
+            print(f"Error processing {older['filename']} and {newer['filename']}: {str(e)}")
+        results.append(result)
+    return results
+
+
+def save_json_results(results, output_file):
+    with open(output_file, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Elevation change between overlapping survey epochs.")
+    parser.add_argument("output_dir", help="Folder for the difference COGs.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Index built with cog_index.py.")
+    parser.add_argument("--name-contains", default="DTM", help="Only use COGs whose filename contains this.")
+    parser.add_argument("--min-overlap", type=float, default=10000.0, help="Smallest overlap in square metres.")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Change in metres counted as gain or loss.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    parser.add_argument("--pairs-only", action="store_true", help="Only list the overlapping epochs.")
+    parser.add_argument("--output", default="change_results.json", help="JSON file for the change statistics.")
+    add_profile_argument(parser, "analysis")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    index = CogIndex.load(args.index)
+    if args.pairs_only:
+        for pair in find_epoch_pairs(index, args.name_contains, args.min_overlap):
+            print(f"{pair['older']['filename']} ({pair['older_date']}) -> {pair['newer']['filename']} "
+                  f"({pair['newer_date']}): {pair['area'] / 1e6:.2f} km2")
+        sys.exit(0)
+
+    results = detect_collection_changes(index, args.output_dir, args.name_contains, args.min_overlap, args.workers,
+                                        args.threshold)
+    save_json_results(results, args.output)
+    print(f"{len(results)} overlapping epochs compared, results saved to {args.output}")
@@ -0,0 +1,93 @@
+'''
+Sizes and checksums of published files, for the STAC file extension and the
+download JSON. Files are hashed with large sequential reads across a thread pool
+(hashlib releases the GIL), and digests are cached by file fingerprint so only
+new or changed files are read again.
+'''
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fingerprint import JsonCache, file_fingerprint, sha256_file
+
+CHECKSUM_CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = ".checksum-cache"
+# Multihash prefix for sha2-256: function code 0x12, digest length 0x20
+SHA256_MULTIHASH_PREFIX = "1220"
+
+
+def sha256_multihash(hex_digest):
+    """
+    Returns a hex sha256 digest as a multihash, as used by STAC file:checksum.
+    """
+    return SHA256_MULTIHASH_PREFIX + hex_digest
+
+
+def file_digest(file_path, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Returns the size and sha256 of a file, using the fingerprint cache when possible.
+
+    Returns:
+        dict: size (bytes), sha256 (hex) and checksum (multihash hex)
+    """
+    fingerprint = file_fingerprint(file_path)
+    cache = JsonCache(cache_dir, version=CHECKSUM_CACHE_VERSION) if cache_dir else None
+    if cache is not None:
+        cached = cache.get(file_path, fingerprint)
+        if cached is not None:
+            return cached
+
+    sha256 = sha256_file(file_path)
+    digest = {
+        'size': fingerprint['size'],
+        'sha256': sha256,
+        'checksum': sha256_multihash(sha256)
+    }
+    if cache is not None:
+        cache.put(file_path, digest, fingerprint)
+    return digest
+
+
+def file_digests(file_paths, workers=4, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Computes file_digest() for many files in parallel.
+
+    Returns:
+        dict: file path -> digest, for the files that could be read
+    """
+    file_paths = list(file_paths)
+    digests = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(file_digest, file_path, cache_dir) for file_path in file_paths]
+    for file_path, future in zip(file_paths, futures):
+        try:
+            digests[file_path] = future.result()
+        except OSError as e:
+            print(f"Error hashing {file_path}: {str(e)}")
+    return digests
+
+
+def update_download_entries(entries, digests_by_name, key=None):
+    """
+    Sets fileSize and sha256 on download JSON entries whose downloadUrl ends in
+    a file name found in digests_by_name.
+
+    Args:
+        entries (list): Download JSON entries
+        digests_by_name (dict): Lookup key -> {'size', 'sha256'}
+        key (callable): Turns a downloadUrl into the lookup key. Defaults to
+            the file name at the end of the URL.
+
+    Returns:
+        int: Number of entries updated
+    """
+    key = key or (lambda url: os.path.basename(url.rstrip('/')))
+    updated = 0
+    for entry in entries:
+        digest = digests_by_name.get(key(entry.get('downloadUrl', '')))
+        if digest is None:
+            continue
+        # Sizes have always been written as strings in the download JSON
+        entry['fileSize'] = str(digest['size'])
+        entry['sha256'] = digest['sha256']
+        updated += 1
+    return updated
@@ -0,0 +1,230 @@
+'''
+Simulates how map clients read a COG, to tune block size and overview settings.
+For each viewport (bbox in EPSG:29902 plus a web map zoom level) it works out the
+overview level a client would pick and the tiles it needs, then merges their byte
+ranges under a given merge distance. Request counts, bytes fetched and wasted bytes
+are reported, and several layouts of one sample file can be compared side by side.
+'''
+import os
+import json
+import math
+import random
+import tempfile
+
+import numpy as np
+import rasterio
+from rasterio.shutil import copy as rio_copy
+
+from byte_ranges import merge_ranges, summarise_ranges
+from gdal_profiles import apply_profile, add_profile_argument
+
+# Ground resolution of web mercator zoom 0 at the equator, in metres per pixel
+ZOOM0_RESOLUTION = 156543.03392804097
+# Latitude of Northern Ireland, used to scale web mercator resolutions
+DEFAULT_LATITUDE = 54.6
+
+
+def zoom_resolution(zoom, latitude=DEFAULT_LATITUDE):
+    """
+    Returns the ground resolution in metres per pixel of a web map zoom level.
+    """
+    return ZOOM0_RESOLUTION * math.cos(math.radians(latitude)) / (2 ** zoom)
+
+
+class CogLayout:
+    """
+    Block grids and byte ranges of every resolution level of a COG.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file_size = os.path.getsize(path)
+        self.levels = []
+        with rasterio.open(path) as src:
+            self.resolution = abs(src.transform.a)
+            self.overviews = src.overviews(1)
+            for level in [None] + list(range(len(self.overviews))):
+                with rasterio.open(path, overview_level=level) as ovr:
+                    block_y, block_x = ovr.block_shapes[0]
+                    xblocks = (ovr.width + block_x - 1) // block_x
+                    yblocks = (ovr.height + block_y - 1) // block_y
+                    transform = ovr.transform
+                offsets = np.zeros((yblocks, xblocks), dtype=np.int64)
+                sizes = np.zeros((yblocks, xblocks), dtype=np.int64)
+                for row in range(yblocks):
+                    for col in range(xblocks):
+                        offset = src.get_tag_item(f"BLOCK_OFFSET_{col}_{row}", 'TIFF', bidx=1, ovr=level)
+                        size = src.get_tag_item(f"BLOCK_SIZE_{col}_{row}", 'TIFF', bidx=1, ovr=level)
+                        offsets[row, col] = int(offset) if offset else 0
+                        sizes[row, col] = int(size) if size else 0
+                self.levels.append({
+                    'level': level,
+                    'transform': transform,
+                    'block_size': (block_x, block_y),
+                    'offsets': offsets,
+                    'sizes': sizes
+                })
+            self._level_resolutions = [self.resolution] + [self.resolution * f for f in self.overviews]
+
+        data_offsets = [int(lvl['offsets'][lvl['offsets'] > 0].min()) for lvl in self.levels if (lvl['offsets'] > 0).any()]
+        self.headers_size = min(data_offsets) if data_offsets else self.file_size
+
+    def level_for_resolution(self, resolution):
+        """
+        Index into self.levels of the coarsest level not coarser than resolution.
+        """
+        index = 0
+        for i, level_resolution in enumerate(self._level_resolutions):
+            if level_resolution <= resolution * (1 + 1e-9):
+                index = i
+        return index
+
+    def blocks_for_bbox(self, level_index, bbox):
+        """
+        Returns the (offset, size) ranges of non-empty blocks intersecting bbox.
+        """
+        level = self.levels[level_index]
+        block_x, block_y = level['block_size']
+        offsets, sizes = level['offsets'], level['sizes']
+        inverse = ~level['transform']
+        col0, row0 = inverse * (bbox[0], bbox[3])
+        col1, row1 = inverse * (bbox[2], bbox[1])
+        bcol0 = max(0, int(math.floor(col0)) // block_x)
+        brow0 = max(0, int(math.floor(row0)) // block_y)
+        bcol1 = min(offsets.shape[1] - 1, int(math.ceil(col1) - 1) // block_x)
+        brow1 = min(offsets.shape[0] - 1, int(math.ceil(row1) - 1) // block_y)
+        if bcol1 < bcol0 or brow1 < brow0:
+            return []
+        window_offsets = offsets[brow0:brow1 + 1, bcol0:bcol1 + 1].ravel()
+        window_sizes = sizes[brow0:brow1 + 1, bcol0:bcol1 + 1].ravel()
+        keep = window_offsets > 0
+        return list(zip(window_offsets[keep].tolist(), window_sizes[keep].tolist()))
+
+
+def simulate(layout, viewports, merge_distance=16384, header_fetch=16384, latitude=DEFAULT_LATITUDE):
+    """
+    Simulates independent clients each rendering one viewport.
+
+    Args:
+        layout (CogLayout): File to simulate
+        viewports (list): Dictionaries with 'bbox' (EPSG:29902) and 'zoom'
+        merge_distance (int): Ranges closer than this are fetched in one request
+        header_fetch (int): Bytes a client reads up front for the IFDs
+        latitude (float): Latitude used to convert zoom levels to metres
+
+    Returns:
+        dict: Totals and per-viewport results
+    """
+    header_requests = 1 if layout.headers_size <= header_fetch else 2
+    header_bytes = max(header_fetch, layout.headers_size)
+    totals = {'requests': 0, 'bytes_fetched': 0, 'bytes_needed': 0, 'bytes_wasted': 0, 'blocks': 0}
+    per_viewport = []
+    for viewport in viewports:
+        resolution = zoom_resolution(viewport['zoom'], latitude)
+        level_index = layout.level_for_resolution(resolution)
+        ranges = layout.blocks_for_bbox(level_index, viewport['bbox'])
+        summary = summarise_ranges(ranges, merge_ranges(ranges, merge_distance))
+        summary['requests'] += header_requests
+        summary['bytes_fetched'] += header_bytes
+        summary['bytes_needed'] += layout.headers_size
+        summary['bytes_wasted'] += header_bytes - layout.headers_size
+        summary['blocks'] = len(ranges)
+        summary['overview_level'] = layout.levels[level_index]['level']
+        per_viewport.append(summary)
+        for key in totals:
+            totals[key] += summary[key]
+    return {'totals': totals, 'viewports': per_viewport}
+
+
+def random_viewports(bounds, zooms, count=100, size_px=(1024, 768), latitude=DEFAULT_LATITUDE, seed=0):
+    """
+    Generates viewports of size_px screen pixels centred inside bounds.
+    """
+    rng = random.Random(seed)
+    viewports = []
+    for _ in range(count):
+        zoom = rng.choice(list(zooms))
+        resolution = zoom_resolution(zoom, latitude)
+        cx = rng.uniform(bounds[0], bounds[2])
+        cy = rng.uniform(bounds[1], bounds[3])
+        half_w = size_px[0] * resolution / 2
+        half_h = size_px[1] * resolution / 2
+        viewports.append({'bbox': [cx - half_w, cy - half_h, cx + half_w, cy + half_h], 'zoom': zoom})
+    return viewports
+
+
+def build_layout_variant(source_path, output_path, creation_options):
+    """
+    Writes source_path as a COG with the given creation options.
+    """
+    rio_copy(source_path, output_path, driver='COG', **creation_options)
+    return output_path
+
+
+def compare_layouts(source_path, variants, viewports, merge_distance=16384, header_fetch=16384):
+    """
+    Converts a sample file once per variant and simulates the same viewports on each.
+
+    Args:
+        source_path (str): Sample raster
+        variants (dict): Name -> COG creation options, e.g. {'BLOCKSIZE': 256}
+        viewports (list): Viewports as accepted by simulate()
+
+    Returns:
+        list: One dictionary per variant with the file size and totals
+    """
+    rows = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, options in variants.items():
+            path = build_layout_variant(source_path, os.path.join(temp_dir, f"{name}.tif"), options)
+            layout = CogLayout(path)
+            result = simulate(layout, viewports, merge_distance, header_fetch)
+            row = {'variant': name, 'file_size': layout.file_size, 'headers_size': layout.headers_size}
+            row.update(result['totals'])
+            rows.append(row)
+    return rows
+
+
+def print_rows(rows, viewport_count):
+    print(f"{'Variant':<20} {'File (MB)':<10} {'Requests':<10} {'Req/view':<10} {'Fetched (MB)':<13} {'Wasted (MB)':<12}")
+    print("-" * 80)
+    for row in rows:
+        print(f"{row['variant']:<20} {row['file_size'] / 1048576:<10.2f} {row['requests']:<10} "
+              f"{row['requests'] / max(1, viewport_count):<10.2f} {row['bytes_fetched'] / 1048576:<13.2f} "
+              f"{row['bytes_wasted'] / 1048576:<12.2f}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate map client access patterns against a COG.")
+    parser.add_argument("cog", help="COG (or sample raster when comparing layouts).")
+    parser.add_argument("--viewports", default=None, help="JSON list of {'bbox': [...], 'zoom': z}.")
+    parser.add_argument("--random", type=int, default=100, help="Number of random viewports if none are given.")
+    parser.add_argument("--zooms", type=int, nargs="+", default=[12, 13, 14, 15, 16, 17])
+    parser.add_argument("--merge-distance", type=int, default=16384, help="Gap in bytes merged into one request.")
+    parser.add_argument("--header-fetch", type=int, default=16384, help="Bytes a client reads up front.")
+    parser.add_argument("--compare", default=None,
+                        help="JSON object of variant name -> COG creation options to compare.")
+    add_profile_argument(parser, "analysis")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    if args.viewports:
+        with open(args.viewports, 'r') as f:
+            viewports = json.load(f)
+    else:
+        with rasterio.open(args.cog) as src:
+            viewports = random_viewports(list(src.bounds), args.zooms, args.random)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            variants = json.load(f)
+        rows = compare_layouts(args.cog, variants, viewports, args.merge_distance, args.header_fetch)
+    else:
+        layout = CogLayout(args.cog)
+        result = simulate(layout, viewports, args.merge_distance, args.header_fetch)
+        row = {'variant': os.path.basename(args.cog), 'file_size': layout.file_size}
+        row.update(result['totals'])
+        rows = [row]
+    print_rows(rows, len(viewports))
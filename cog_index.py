@@ -0,0 +1,325 @@
+'''
+Spatial index over the output COGs and a bounding-box extraction API.
+The index is a JSON file holding each COG's bounds, valid-data footprint and
+fingerprint in EPSG:29902; it is loaded into a packed STR tree for queries.
+Extraction reads only the intersecting windows of each COG, at the overview
+level that suits the requested resolution, and mosaics them into one array.
+'''
+import os
+import sys
+import glob
+import json
+import math
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.transform import from_origin
+from rasterio.warp import reproject
+from rasterio.windows import Window, from_bounds
+from shapely import STRtree
+from shapely.geometry import box, shape
+
+from byte_ranges import merge_ranges, summarise_ranges
+from fingerprint import file_fingerprint, fingerprints_match
+from footprints import get_footprint
+from gdal_profiles import PROFILES, apply_profile
+
+INDEX_VERSION = 1
+INDEX_EPSG = 29902
+DEFAULT_INDEX_PATH = "cog_index.json"
+
+
+def _index_entry(file_path, base_url=None, use_footprints=True):
+    with rasterio.open(file_path) as src:
+        if src.crs is not None and src.crs.to_epsg() != INDEX_EPSG:
+            raise ValueError(f"CRS is {src.crs}, expected EPSG:{INDEX_EPSG}")
+        bounds = list(src.bounds)
+        resolution = abs(src.transform.a)
+
+    geometry = get_footprint(file_path) if use_footprints else None
+    if geometry is None:
+        geometry = box(*bounds).__geo_interface__
+        geometry = json.loads(json.dumps(geometry))
+
+    filename = os.path.basename(file_path)
+    return {
+        'filename': filename,
+        'path': os.path.abspath(file_path),
+        'href': f"{base_url.rstrip('/')}/{filename}" if base_url else None,
+        'bounds': bounds,
+        'resolution': resolution,
+        'geometry': geometry,
+        'fingerprint': file_fingerprint(file_path)
+    }
+
+
+def build_index(file_list, index_path=DEFAULT_INDEX_PATH, base_url=None, use_footprints=True):
+    """
+    Builds or refreshes the index file. Entries whose file fingerprint has not
+    changed are kept as they are.
+
+    Args:
+        file_list (list): Paths to COG files
+        index_path (str): JSON file to write
+        base_url (str): Public URL the files are served from, used for remote reads
+        use_footprints (bool): Index valid-data footprints instead of bounding boxes
+
+    Returns:
+        CogIndex: The refreshed index
+    """
+    previous = {}
+    if os.path.exists(index_path):
+        with open(index_path, 'r') as f:
+            data = json.load(f)
+        if data.get('version') == INDEX_VERSION:
+            previous = {entry['path']: entry for entry in data['entries']}
+
+    entries = []
+    for file_path in sorted(file_list):
+        try:
+            old = previous.get(os.path.abspath(file_path))
+            if old is not None and fingerprints_match(old['fingerprint'], file_fingerprint(file_path)):
+                entries.append(old)
+                continue
+            entries.append(_index_entry(file_path, base_url, use_footprints))
+            print(f"Indexed: {os.path.basename(file_path)}")
+        except Exception as e:
+            print(f"Error indexing {os.path.basename(file_path)}: {str(e)}")
+
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump({'version': INDEX_VERSION, 'epsg': INDEX_EPSG, 'entries': entries}, f)
+    os.replace(temp_path, index_path)
+    return CogIndex(entries)
+
+
+class CogIndex:
+    """
+    In-memory STR tree over index entries.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.geometries = [shape(entry['geometry']) for entry in entries]
+        self.tree = STRtree(self.geometries)
+
+    @classmethod
+    def load(cls, index_path=DEFAULT_INDEX_PATH):
+        with open(index_path, 'r') as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version in {index_path}")
+        return cls(data['entries'])
+
+    def query(self, bbox):
+        """
+        Returns the entries whose footprint shares interior with bbox
+        (minx, miny, maxx, maxy), sorted by filename. Footprints that only touch
+        the edge of bbox are left out, there is nothing inside it to read.
+        """
+        query = box(*bbox)
+        touching = set(self.tree.query(query, predicate='touches'))
+        hits = [i for i in self.tree.query(query, predicate='intersects') if i not in touching]
+        return sorted((self.entries[i] for i in hits), key=lambda e: e['filename'])
+
+
+def choose_overview_level(src, resolution):
+    """
+    Returns the coarsest overview level whose pixel size does not exceed
+    resolution, or None to read the full resolution image.
+    """
+    native = abs(src.transform.a)
+    level = None
+    for i, factor in enumerate(src.overviews(1)):
+        if native * factor <= resolution * (1 + 1e-9):
+            level = i
+    return level
+
+
+def _entry_source(entry, remote):
+    if remote and entry.get('href'):
+        return entry['href']
+    return entry['path']
+
+
+def output_grid(bbox, resolution):
+    """
+    Returns (transform, width, height) of a grid of pixel size resolution covering bbox.
+    """
+    minx, miny, maxx, maxy = bbox
+    width = max(1, int(math.ceil((maxx - minx) / resolution)))
+    height = max(1, int(math.ceil((maxy - miny) / resolution)))
+    return from_origin(minx, maxy, resolution, resolution), width, height
+
+
+def pixel_window(window, width, height):
+    """
+    Expands a fractional window to whole pixels and clips it to the raster.
+    """
+    col0 = max(0, int(math.floor(window.col_off)))
+    row0 = max(0, int(math.floor(window.row_off)))
+    col1 = min(width, int(math.ceil(window.col_off + window.width)))
+    row1 = min(height, int(math.ceil(window.row_off + window.height)))
+    return Window(col0, row0, max(0, col1 - col0), max(0, row1 - row0))
+
+
+def extract_bbox(index, bbox, resolution=None, max_pixels=4096, nodata=-9999.0, remote=False,
+                 resampling=Resampling.bilinear):
+    """
+    Mosaics the elevations inside bbox from every intersecting COG.
+
+    Args:
+        index (CogIndex): Loaded index
+        bbox (tuple): (minx, miny, maxx, maxy) in EPSG:29902
+        resolution (float): Output pixel size. Defaults to the finest native resolution
+            of the intersecting files, coarsened so neither side exceeds max_pixels.
+        max_pixels (int): Largest output width/height when resolution is not given
+        nodata (float): Output nodata value
+        remote (bool): Read from each entry's public href instead of the local path
+        resampling: Resampling used when the source grid does not match the output
+
+    Returns:
+        tuple: (float32 array, affine transform), or (None, None) if nothing intersects
+    """
+    entries = index.query(bbox)
+    if not entries:
+        return None, None
+
+    if resolution is None:
+        native = min(entry['resolution'] for entry in entries)
+        extent = max(bbox[2] - bbox[0], bbox[3] - bbox[1])
+        resolution = max(native, extent / float(max_pixels))
+
+    transform, width, height = output_grid(bbox, resolution)
+    mosaic = np.full((height, width), nodata, dtype=np.float32)
+    scratch = np.empty_like(mosaic)
+
+    for entry in entries:
+        source = _entry_source(entry, remote)
+        with rasterio.open(source) as base:
+            level = choose_overview_level(base, resolution)
+        with rasterio.open(source, overview_level=level) as src:
+            window = pixel_window(from_bounds(*bbox, transform=src.transform), src.width, src.height)
+            if window.width == 0 or window.height == 0:
+                # Only the footprint edge falls inside bbox
+                continue
+            data = src.read(1, window=window)
+            scratch.fill(nodata)
+            reproject(
+                data, scratch,
+                src_transform=src.window_transform(window), src_crs=src.crs, src_nodata=src.nodata,
+                dst_transform=transform, dst_crs=src.crs, dst_nodata=nodata,
+                resampling=resampling
+            )
+        # First file with valid data wins where surveys overlap
+        fill = (mosaic == nodata) & (scratch != nodata)
+        mosaic[fill] = scratch[fill]
+
+    return mosaic, transform
+
+
+def write_geotiff(output_path, array, transform, nodata=-9999.0):
+    """
+    Writes an extracted array as a ZSTD compressed COG in EPSG:29902.
+    """
+    profile = {
+        'driver': 'COG',
+        'width': array.shape[1],
+        'height': array.shape[0],
+        'count': 1,
+        'dtype': 'float32',
+        'crs': f"EPSG:{INDEX_EPSG}",
+        'transform': transform,
+        'nodata': nodata,
+        'compress': 'ZSTD',
+        'predictor': 2
+    }
+    with rasterio.open(output_path, 'w', **profile) as dst:
+        dst.write(array, 1)
+
+
+def plan_reads(index, bbox, resolution, max_gap=16384, remote=False):
+    """
+    Plans the byte ranges needed to read bbox at resolution from each COG.
+
+    Only blocks of the chosen overview level that intersect bbox are included,
+    and ranges closer than max_gap bytes are merged into one request.
+
+    Returns:
+        list: One dictionary per file with level, blocks, merged ranges and totals
+    """
+    plans = []
+    for entry in index.query(bbox):
+        source = _entry_source(entry, remote)
+        with rasterio.open(source) as src:
+            level = choose_overview_level(src, resolution)
+            with rasterio.open(source, overview_level=level) as ovr_src:
+                width, height, transform = ovr_src.width, ovr_src.height, ovr_src.transform
+                block_y, block_x = ovr_src.block_shapes[0]
+
+            window = from_bounds(*bbox, transform=transform)
+            col0 = max(0, int(math.floor(window.col_off)) // block_x)
+            row0 = max(0, int(math.floor(window.row_off)) // block_y)
+            col1 = min((width - 1) // block_x, int(math.ceil(window.col_off + window.width)) // block_x)
+            row1 = min((height - 1) // block_y, int(math.ceil(window.row_off + window.height)) // block_y)
+
+            ranges = []
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    offset = src.get_tag_item(f"BLOCK_OFFSET_{col}_{row}", 'TIFF', bidx=1, ovr=level)
+                    size = src.get_tag_item(f"BLOCK_SIZE_{col}_{row}", 'TIFF', bidx=1, ovr=level)
+                    if offset and size:
+                        ranges.append((int(offset), int(size)))
+
+        merged = merge_ranges(ranges, max_gap)
+        plan = {'filename': entry['filename'], 'source': source, 'overview_level': level,
+                'blocks': len(ranges), 'ranges': [(offset, size) for offset, size, _ in merged]}
+        plan.update(summarise_ranges(ranges, merged))
+        plans.append(plan)
+    return plans
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Spatial index and bbox extraction over a COG collection.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Index file.")
+    parser.add_argument("--gdal-profile", choices=sorted(PROFILES), default=None,
+                        help="GDAL configuration profile (default remote-read with --remote, otherwise analysis).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build or refresh the index.")
+    build_parser.add_argument("geotiff_folder", help="Path to the folder containing COG files.")
+    build_parser.add_argument("--base-url", default=None, help="Public URL the COGs are served from.")
+    build_parser.add_argument("--bbox-only", action="store_true", help="Index bounding boxes instead of footprints.")
+
+    for name in ("extract", "plan"):
+        sub = subparsers.add_parser(name)
+        sub.add_argument("--bbox", type=float, nargs=4, required=True, metavar=("MINX", "MINY", "MAXX", "MAXY"))
+        sub.add_argument("--resolution", type=float, default=None, help="Output pixel size in metres.")
+        sub.add_argument("--remote", action="store_true", help="Read from the public URLs.")
+    subparsers.choices["extract"].add_argument("--output", required=True, help="Output GeoTIFF.")
+    subparsers.choices["plan"].add_argument("--max-gap", type=int, default=16384, help="Largest gap merged into one request.")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile or ("remote-read" if getattr(args, "remote", False) else "analysis"))
+
+    if args.command == "build":
+        file_list = glob.glob(os.path.join(args.geotiff_folder, "*.tif"))
+        index = build_index(file_list, args.index, args.base_url, not args.bbox_only)
+        print(f"Index written to {args.index} with {len(index.entries)} entries")
+    elif args.command == "extract":
+        index = CogIndex.load(args.index)
+        array, transform = extract_bbox(index, args.bbox, args.resolution, remote=args.remote)
+        if array is None:
+            print("No COGs intersect the requested bbox")
+            sys.exit(1)
+        write_geotiff(args.output, array, transform)
+        print(f"Wrote {array.shape[1]}x{array.shape[0]} mosaic to {args.output}")
+    else:
+        index = CogIndex.load(args.index)
+        resolution = args.resolution or min(e['resolution'] for e in index.query(args.bbox) or index.entries)
+        for plan in plan_reads(index, args.bbox, resolution, args.max_gap, args.remote):
+            print(f"{plan['filename']}: level {plan['overview_level']}, {plan['blocks']} blocks, "
+                  f"{plan['requests']} requests, {plan['bytes_fetched']} bytes "
+                  f"({plan['bytes_wasted']} wasted)")
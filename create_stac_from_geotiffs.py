@@ -1,110 +1,484 @@
 import os
+import json
+import shutil
 import rasterio
+from rasterio.warp import transform_bounds
 import pystac
+from pystac.extensions.file import FileExtension
 from pystac.extensions.projection import ProjectionExtension
-from datetime import datetime
+from datetime import datetime, timezone
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
-def create_stac_catalog(geotiff_dir, base_url, catalog_title="better-open-data.com STAC Catalog", output_dir="stac-catalog"):
+from checksums import file_digest, update_download_entries
+from fingerprint import file_fingerprint, fingerprints_match
+from footprints import get_footprint
+from gdal_profiles import apply_profile, add_profile_argument
+
+COLLECTION_ID = "lidar-collection"
+# Records the fingerprint of the GeoTIFF behind each item, for incremental updates
+MANIFEST_NAME = ".stac-manifest.json"
+MANIFEST_VERSION = 1
+# Every item on one line, so clients can load the collection in one request
+ITEMS_NDJSON = "items.ndjson"
+ITEMS_PARQUET = "items.parquet"
+
+
+def read_geotiff_metadata(geotiff_path, use_footprints=False, footprint_tolerance=None, checksums=False):
+    """
+    Reads the bbox and item geometry of one GeoTIFF, and optionally its size and
+    sha256 (cached by fingerprint, see checksums.py).
+    """
+    fingerprint = file_fingerprint(str(geotiff_path))
+    with rasterio.open(geotiff_path) as dataset:
+        bounds = dataset.bounds
+
+    geometry = {
+        "type": "Polygon",
+        "coordinates": [[
+            [bounds.left, bounds.bottom],
+            [bounds.left, bounds.top],
+            [bounds.right, bounds.top],
+            [bounds.right, bounds.bottom],
+            [bounds.left, bounds.bottom]
+        ]]
+    }
+    if use_footprints:
+        # Valid-data outline from a coarse overview, cached by file fingerprint
+        footprint = get_footprint(str(geotiff_path), tolerance=footprint_tolerance)
+        if footprint is not None:
+            geometry = footprint
+
+    # The file's modification time rather than the build time, so rebuilding
+    # an unchanged file gives an identical item
+    item_datetime = datetime.fromtimestamp(fingerprint["mtime_ns"] / 1e9, tz=timezone.utc)
+
+    metadata = {
+        "bbox": [bounds.left, bounds.bottom, bounds.right, bounds.top],
+        "geometry": geometry,
+        "datetime": item_datetime,
+        "fingerprint": fingerprint
+    }
+    if checksums:
+        metadata["file"] = file_digest(str(geotiff_path))
+    return metadata
+
+
+def build_item(geotiff_path, metadata, base_url):
+    """
+    Builds the STAC item of one GeoTIFF from read_geotiff_metadata() output.
+    """
+    item = pystac.Item(
+        id=geotiff_path.stem,
+        geometry=metadata["geometry"],
+        bbox=metadata["bbox"],
+        datetime=metadata["datetime"],
+        properties={}
+    )
+
+    # Add projection extension with EPSG code
+    ProjectionExtension.add_to(item)
+    proj = ProjectionExtension.ext(item)
+    proj.epsg = 29902
+
+    # Full asset URL using the base URL
+    asset_url = f"{base_url.rstrip('/')}/{geotiff_path.name}"
+
+    asset = pystac.Asset(
+        href=asset_url,
+        media_type=pystac.MediaType.COG,
+        roles=["data"]
+    )
+    item.add_asset(key="cog", asset=asset)
+
+    if metadata.get("file"):
+        FileExtension.add_to(item)
+        file_ext = FileExtension.ext(asset)
+        file_ext.size = metadata["file"]["size"]
+        file_ext.checksum = metadata["file"]["checksum"]
+    return item
+
+
+def read_all_metadata(geotiff_paths, use_footprints=False, footprint_tolerance=None, workers=8, checksums=False):
+    """
+    Reads metadata of GeoTIFFs in parallel.
+
+    Returns:
+        tuple: (list of (path, metadata) in input order, list of (filename, error))
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(read_geotiff_metadata, geotiff_path, use_footprints, footprint_tolerance, checksums)
+            for geotiff_path in geotiff_paths
+        ]
+
+    results = []
+    failures = []
+    for geotiff_path, future in zip(geotiff_paths, futures):
+        try:
+            results.append((geotiff_path, future.result()))
+        except Exception as e:
+            failures.append((geotiff_path.name, str(e)))
+            print(f"Error reading {geotiff_path.name}: {str(e)}")
+    return results, failures
+
+
+def items_extent(entries):
+    """
+    Computes the collection extent from manifest entries (bbox and datetime of each item).
+    The item bboxes are in EPSG:29902; STAC extents are in WGS84 longitude/latitude.
+    """
+    if not entries:
+        return pystac.Extent(
+            spatial=pystac.SpatialExtent([[-180.0, -90.0, 180.0, 90.0]]),
+            temporal=pystac.TemporalExtent([[None, None]])
+        )
+    bboxes = [transform_bounds("EPSG:29902", "EPSG:4326", *entry["bbox"]) for entry in entries]
+    datetimes = sorted(datetime.fromisoformat(entry["datetime"]) for entry in entries)
+    return pystac.Extent(
+        spatial=pystac.SpatialExtent([[
+            min(b[0] for b in bboxes), min(b[1] for b in bboxes),
+            max(b[2] for b in bboxes), max(b[3] for b in bboxes)
+        ]]),
+        temporal=pystac.TemporalExtent([[datetimes[0], datetimes[-1]]])
+    )
+
+
+def manifest_entry(metadata):
+    entry = {
+        "fingerprint": metadata["fingerprint"],
+        "bbox": metadata["bbox"],
+        "datetime": metadata["datetime"].isoformat()
+    }
+    if metadata.get("file"):
+        entry["file"] = metadata["file"]
+    return entry
+
+
+def load_manifest(output_dir):
+    manifest_path = Path(output_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+
+def save_manifest(output_dir, items):
+    manifest_path = Path(output_dir) / MANIFEST_NAME
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "items": items}, f, indent=2, sort_keys=True)
+
+
+def default_catalog_url(base_url, output_dir):
+    """
+    Public URL of the catalog when none is given: the output directory's name
+    next to the GeoTIFF folder, e.g. https://better-open-data.com/stac for
+    https://better-open-data.com/lidar and an output directory called stac.
+    """
+    return f"{base_url.rstrip('/').rsplit('/', 1)[0]}/{Path(output_dir).resolve().name}"
+
+
+def catalog_href(catalog_url, *parts):
+    """
+    Absolute href of a file in the published catalog.
+    """
+    return "/".join([catalog_url.rstrip('/')] + list(parts))
+
+
+def item_href(catalog_url, item_id):
+    return catalog_href(catalog_url, COLLECTION_ID, item_id, f"{item_id}.json")
+
+
+def write_json_if_changed(path, data):
+    """
+    Writes data as JSON only if it differs from what is on disk.
+
+    Returns:
+        bool: True if the file was written
+    """
+    content = json.dumps(data, indent=2)
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            if f.read() == content:
+                return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+    return True
+
+
+def create_stac_catalog(geotiff_dir, base_url, catalog_title="better-open-data.com STAC Catalog", output_dir="stac-catalog",
+                        use_footprints=False, footprint_tolerance=None, workers=8, catalog_url=None, geoparquet=False,
+                        checksums=False, download_json=None):
+    """
+    Builds the STAC catalog of a folder of GeoTIFFs.
+
+    Items are written with absolute hrefs under catalog_url as they are built,
+    and appended to an ndjson item table in the collection directory.
+
+    Args:
+        geotiff_dir (str): Folder containing the GeoTIFF files
+        base_url (str): Base URL where the GeoTIFFs are hosted
+        catalog_title (str): Catalog description
+        output_dir (str): Directory to write the catalog to
+        use_footprints (bool): Use valid-data footprints as item geometries
+        footprint_tolerance (float): Footprint simplification tolerance
+        workers (int): Threads used to read GeoTIFF metadata
+        catalog_url (str): Public URL of output_dir (see default_catalog_url)
+        geoparquet (bool): Also write the item table as stac-geoparquet
+        checksums (bool): Add file:size and file:checksum to the cog assets
+        download_json (str): Download JSON to update with the same sizes and
+            sha256 digests (implies checksums)
+
+    Returns:
+        list: (filename, error) for files that could not be read
+    """
     geotiff_dir = Path(geotiff_dir)
     output_dir = Path(output_dir)
+    catalog_url = catalog_url or default_catalog_url(base_url, output_dir)
+    collection_dir = output_dir / COLLECTION_ID
+    collection_dir.mkdir(parents=True, exist_ok=True)
+
+    # Read bounds (and footprints) in parallel; items are still added in sorted order
+    geotiff_paths = sorted(geotiff_dir.glob("*.tif"))
+    checksums = checksums or download_json is not None
+    results, failures = read_all_metadata(geotiff_paths, use_footprints, footprint_tolerance, workers, checksums)
+
+    manifest_items = {}
+    with open(collection_dir / ITEMS_NDJSON, "w", encoding="utf-8") as table:
+        for geotiff_path, metadata in results:
+            item_dict = item_to_dict(build_item(geotiff_path, metadata, base_url), catalog_url)
+            write_json_if_changed(collection_dir / geotiff_path.stem / f"{geotiff_path.stem}.json", item_dict)
+            table.write(json.dumps(item_dict) + "\n")
+            manifest_items[geotiff_path.stem] = manifest_entry(metadata)
+
+    # Items of GeoTIFFs that are gone (or could not be read) from an earlier build
+    for item_dir in sorted(collection_dir.iterdir()):
+        if item_dir.is_dir() and item_dir.name not in manifest_items and (item_dir / f"{item_dir.name}.json").exists():
+            shutil.rmtree(item_dir, ignore_errors=True)
+            print(f"Removed: {item_dir.name}")
+
+    write_collection(output_dir, catalog_url, manifest_items)
+    write_catalog_root(output_dir, catalog_url, catalog_title)
+    save_manifest(output_dir, manifest_items)
+    if geoparquet:
+        write_geoparquet(output_dir)
+    if download_json:
+        update_download_json(download_json, manifest_items, geotiff_paths, base_url)
+
+    print(f"STAC catalog created at {output_dir.resolve()} with {len(manifest_items)} items")
+    print(f"🔗 Catalog hrefs use {catalog_url.rstrip('/')}, assets use {base_url.rstrip('/')}")
+    if failures:
+        print(f"{len(failures)} GeoTIFF files could not be read:")
+        for name, error in failures:
+            print(f" - {name}: {error}")
+
+    return failures
+
+
+def item_links(catalog_url, item_id):
+    collection_href = catalog_href(catalog_url, COLLECTION_ID, "collection.json")
+    return [
+        {"rel": "root", "href": catalog_href(catalog_url, "catalog.json"), "type": "application/json"},
+        {"rel": "collection", "href": collection_href, "type": "application/json"},
+        {"rel": "parent", "href": collection_href, "type": "application/json"},
+        {"rel": "self", "href": item_href(catalog_url, item_id), "type": "application/json"}
+    ]
+
+
+def collection_links(catalog_url, item_ids):
+    links = [{"rel": "root", "href": catalog_href(catalog_url, "catalog.json"), "type": "application/json"}]
+    links += [
+        {"rel": "item", "href": item_href(catalog_url, item_id), "type": "application/geo+json"}
+        for item_id in sorted(item_ids)
+    ]
+    links += [
+        {"rel": "alternate", "href": catalog_href(catalog_url, COLLECTION_ID, ITEMS_NDJSON),
+         "type": "application/x-ndjson", "title": "All items, one per line"},
+        {"rel": "parent", "href": catalog_href(catalog_url, "catalog.json"), "type": "application/json"},
+        {"rel": "self", "href": catalog_href(catalog_url, COLLECTION_ID, "collection.json"), "type": "application/json"}
+    ]
+    return links
+
+
+def item_to_dict(item, catalog_url):
+    """
+    Serialises an item with absolute links into the published catalog.
+    """
+    item.clear_links()
+    item.collection_id = COLLECTION_ID
+    item_dict = item.to_dict(include_self_link=False, transform_hrefs=False)
+    item_dict["links"] = item_links(catalog_url, item.id)
+    return item_dict
+
+
+def write_catalog_root(output_dir, catalog_url, catalog_title):
     catalog = pystac.Catalog(id="better-open-data.com", description=catalog_title)
+    catalog.clear_links()
+    catalog_dict = catalog.to_dict(include_self_link=False, transform_hrefs=False)
+    catalog_dict["links"] = [
+        {"rel": "root", "href": catalog_href(catalog_url, "catalog.json"), "type": "application/json"},
+        {"rel": "child", "href": catalog_href(catalog_url, COLLECTION_ID, "collection.json"), "type": "application/json"},
+        {"rel": "self", "href": catalog_href(catalog_url, "catalog.json"), "type": "application/json"}
+    ]
+    return write_json_if_changed(output_dir / "catalog.json", catalog_dict)
+
 
+def write_collection(output_dir, catalog_url, manifest_items):
     collection = pystac.Collection(
-        id="lidar-collection",
+        id=COLLECTION_ID,
         description="A collection of LiDAR GeoTIFF files (COGs) with EPSG:29902 CRS",
-        extent=pystac.Extent(
-            spatial=pystac.SpatialExtent([[-180.0, -90.0, 180.0, 90.0]]),
-            temporal=pystac.TemporalExtent([[datetime.utcnow(), None]])
-        ),
+        extent=items_extent(list(manifest_items.values())),
         license="OGL V3"
     )
-    catalog.add_child(collection)
-
-    for geotiff_path in geotiff_dir.glob("*.tif"):
-        with rasterio.open(geotiff_path) as dataset:
-            bounds = dataset.bounds
-            bbox = [bounds.left, bounds.bottom, bounds.right, bounds.top]
-            datetime_str = datetime.utcnow().isoformat() + "Z"
-
-            item_id = geotiff_path.stem
-            item = pystac.Item(
-                id=item_id,
-                geometry={
-                    "type": "Polygon",
-                    "coordinates": [[
-                        [bounds.left, bounds.bottom],
-                        [bounds.left, bounds.top],
-                        [bounds.right, bounds.top],
-                        [bounds.right, bounds.bottom],
-                        [bounds.left, bounds.bottom]
-                    ]]
-                },
-                bbox=bbox,
-                datetime=datetime.utcnow(),
-                properties={}
-            )
-
-            # Add projection extension with EPSG code
-            ProjectionExtension.add_to(item)
-            proj = ProjectionExtension.ext(item)
-            proj.epsg = 29902
-
-            # Full asset URL using the base URL
-            asset_url = f"{base_url.rstrip('/')}/{geotiff_path.name}"
-
-            item.add_asset(
-                key="cog",
-                asset=pystac.Asset(
-                    href=asset_url,
-                    media_type=pystac.MediaType.COG,
-                    roles=["data"]
-                )
-            )
-
-            collection.add_item(item)
-
-    # Set catalog root href to base URL (for link generation)
-    catalog.set_self_href(f"{base_url.rstrip('/')}/catalog.json")
-
-    # Save to local directory but with absolute URLs pointing to base_url
-    catalog.normalize_and_save(
-        root_href=str(output_dir),
-        catalog_type=pystac.CatalogType.ABSOLUTE_PUBLISHED
-    )
+    collection.clear_links()
+    collection_dict = collection.to_dict(include_self_link=False, transform_hrefs=False)
+    collection_dict["links"] = collection_links(catalog_url, manifest_items)
+    return write_json_if_changed(output_dir / COLLECTION_ID / "collection.json", collection_dict)
 
-    
-    original_path = "/Users/alexdonald/Downloads/"
-    replacement_url = "https://better-open-data.com/"
-    for json_file in output_dir.rglob("*.json"):
-        try:
-            print(f"Processing: {json_file}")
-            
-            # Read the file content
-            with open(json_file, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            # Check if the original path exists in the content
-            if original_path in content:
-                # Replace the path
-                updated_content = content.replace(original_path, replacement_url)
-                
-                # Write the updated content back to the file
-                with open(json_file, "w", encoding="utf-8") as f:
-                    f.write(updated_content)
-                
-                print(f"✓ Updated: {json_file}")
-            else:
-                print(f"- No replacements needed in: {json_file}")
-                
-        except Exception as e:
-            print(f"Error processing {json_file}: {str(e)}")
-    
-    print("Path replacement completed!")
 
-    
-    print(f"STAC catalog created at {output_dir.resolve()}")
-    print(f"🔗 All local hrefs updated to use base URL: {base_url.rstrip('/')}")
+def rebuild_item_table(output_dir, item_ids):
+    """
+    Rewrites the ndjson item table from the item files on disk.
+    """
+    collection_dir = output_dir / COLLECTION_ID
+    with open(collection_dir / ITEMS_NDJSON, "w", encoding="utf-8") as table:
+        for item_id in sorted(item_ids):
+            with open(collection_dir / item_id / f"{item_id}.json", "r", encoding="utf-8") as f:
+                table.write(json.dumps(json.load(f)) + "\n")
+
+
+def update_download_json(download_json_path, manifest_items, geotiff_paths, base_url):
+    """
+    Writes the sizes and sha256 digests recorded for the items into the download
+    JSON, replacing the file atomically. Entries are matched on the published
+    asset URL, so a file of the same name under another folder is left alone.
+    """
+    digests_by_url = {
+        f"{base_url.rstrip('/')}/{geotiff_path.name}": manifest_items[geotiff_path.stem]["file"]
+        for geotiff_path in geotiff_paths
+        if manifest_items.get(geotiff_path.stem, {}).get("file")
+    }
+    with open(download_json_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    updated = update_download_entries(entries, digests_by_url, key=lambda url: url.strip())
+    temp_path = f"{download_json_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=2)
+    os.replace(temp_path, download_json_path)
+    print(f"Updated size and sha256 of {updated} entries in {download_json_path}")
+    return updated
+
+
+def write_geoparquet(output_dir):
+    """
+    Converts the ndjson item table to stac-geoparquet, if stac-geoparquet is installed.
+    """
+    try:
+        from stac_geoparquet.arrow import parse_stac_ndjson_to_parquet
+    except ImportError:
+        print("Error writing GeoParquet: the stac-geoparquet package is not installed")
+        return None
+    collection_dir = output_dir / COLLECTION_ID
+    parquet_path = collection_dir / ITEMS_PARQUET
+    parse_stac_ndjson_to_parquet(str(collection_dir / ITEMS_NDJSON), str(parquet_path))
+    return parquet_path
+
+
+def update_stac_catalog(geotiff_dir, base_url, catalog_title="better-open-data.com STAC Catalog", output_dir="stac-catalog",
+                        use_footprints=False, footprint_tolerance=None, workers=8, catalog_url=None, geoparquet=False,
+                        checksums=False, download_json=None):
+    """
+    Brings an existing catalog up to date with the GeoTIFF folder.
+
+    Items whose GeoTIFF fingerprint (path, size, mtime) is unchanged are left
+    untouched on disk, new or changed files get their item (re)written and items
+    of removed files are deleted. The collection and the item table are only
+    rewritten when something changed. Falls back to a full build if there is no
+    catalog yet.
+
+    Args:
+        geotiff_dir (str): Folder containing the GeoTIFF files
+        base_url (str): Base URL where the GeoTIFFs are hosted
+        catalog_title (str): Catalog description, used for a full build
+        output_dir (str): Directory holding the catalog
+        use_footprints (bool): Use valid-data footprints as item geometries
+        footprint_tolerance (float): Footprint simplification tolerance
+        workers (int): Threads used to read GeoTIFF metadata
+        catalog_url (str): Public URL of output_dir (see default_catalog_url)
+        geoparquet (bool): Also write the item table as stac-geoparquet
+        checksums (bool): Add file:size and file:checksum to the cog assets
+        download_json (str): Download JSON to update with the same sizes and
+            sha256 digests (implies checksums)
+
+    Returns:
+        list: (filename, error) for files that could not be read
+    """
+    geotiff_dir = Path(geotiff_dir)
+    output_dir = Path(output_dir)
+    catalog_url = catalog_url or default_catalog_url(base_url, output_dir)
+    collection_path = output_dir / COLLECTION_ID / "collection.json"
+    manifest = load_manifest(output_dir)
+    if manifest is None or not collection_path.exists():
+        print("No existing catalog found, building it from scratch")
+        return create_stac_catalog(geotiff_dir, base_url, catalog_title, output_dir,
+                                   use_footprints, footprint_tolerance, workers, catalog_url, geoparquet,
+                                   checksums, download_json)
+
+    checksums = checksums or download_json is not None
+    previous = manifest["items"]
+    geotiff_paths = sorted(geotiff_dir.glob("*.tif"))
+    current_ids = {geotiff_path.stem for geotiff_path in geotiff_paths}
+
+    changed = []
+    for geotiff_path in geotiff_paths:
+        item_id = geotiff_path.stem
+        entry = previous.get(item_id)
+        item_path = output_dir / COLLECTION_ID / item_id / f"{item_id}.json"
+        if entry is None or not item_path.exists() or (checksums and "file" not in entry) or \
+                not fingerprints_match(entry["fingerprint"], file_fingerprint(str(geotiff_path))):
+            changed.append(geotiff_path)
+
+    results, failures = read_all_metadata(changed, use_footprints, footprint_tolerance, workers, checksums)
+
+    manifest_items = {item_id: entry for item_id, entry in previous.items() if item_id in current_ids}
+    for geotiff_path, metadata in results:
+        item_id = geotiff_path.stem
+        item_dict = item_to_dict(build_item(geotiff_path, metadata, base_url), catalog_url)
+        write_json_if_changed(output_dir / COLLECTION_ID / item_id / f"{item_id}.json", item_dict)
+        manifest_items[item_id] = manifest_entry(metadata)
+        print(f"{'Added' if item_id not in previous else 'Updated'}: {item_id}")
+
+    # Files that failed to read keep their old item if they had one
+    removed = sorted(item_id for item_id in previous if item_id not in current_ids)
+    for item_id in removed:
+        shutil.rmtree(output_dir / COLLECTION_ID / item_id, ignore_errors=True)
+        print(f"Removed: {item_id}")
+
+    if write_collection(output_dir, catalog_url, manifest_items):
+        print(f"Updated: {collection_path}")
+    write_catalog_root(output_dir, catalog_url, catalog_title)
+    if results or removed or not (output_dir / COLLECTION_ID / ITEMS_NDJSON).exists():
+        rebuild_item_table(output_dir, manifest_items)
+        if geoparquet:
+            write_geoparquet(output_dir)
+
+    save_manifest(output_dir, manifest_items)
+    if download_json:
+        update_download_json(download_json, manifest_items, geotiff_paths, base_url)
+    print(f"{len(results)} items written, {len(removed)} removed, "
+          f"{len(manifest_items) - len(results)} unchanged")
+    if failures:
+        print(f"{len(failures)} GeoTIFF files could not be read:")
+        for name, error in failures:
+            print(f" - {name}: {error}")
+    return failures
 
 
 # Example usage
@@ -115,9 +489,29 @@ if __name__ == "__main__":
     parser.add_argument("geotiff_folder", help="Path to the folder containing GeoTIFF files.")
     parser.add_argument("base_url", help="Base URL where the GeoTIFFs will be hosted.")
     parser.add_argument("--output", default="stac-catalog", help="Output directory for the STAC catalog.")
+    parser.add_argument("--footprints", action="store_true", help="Use valid-data footprints as item geometries.")
+    parser.add_argument("--footprint-tolerance", type=float, default=None,
+                        help="Footprint simplification tolerance in CRS units.")
+    parser.add_argument("--workers", type=int, default=8, help="Threads used to read GeoTIFF metadata.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only add, update or remove items whose GeoTIFF changed.")
+    parser.add_argument("--catalog-url", default=None,
+                        help="Public URL of the output directory. Defaults to its name next to base_url.")
+    parser.add_argument("--geoparquet", action="store_true",
+                        help="Also write the item table as stac-geoparquet (needs stac-geoparquet).")
+    parser.add_argument("--checksums", action="store_true",
+                        help="Add file:size and file:checksum (sha256 multihash) to each asset.")
+    parser.add_argument("--download-json", default=None,
+                        help="Download JSON to update in place with the same sizes and sha256 digests.")
+    add_profile_argument(parser, "analysis")
     args = parser.parse_args()
+    apply_profile(args.gdal_profile)
 
-    create_stac_catalog(args.geotiff_folder, args.base_url, output_dir=args.output)
+    build = update_stac_catalog if args.incremental else create_stac_catalog
+    build(args.geotiff_folder, args.base_url, output_dir=args.output,
+          use_footprints=args.footprints, footprint_tolerance=args.footprint_tolerance,
+          workers=args.workers, catalog_url=args.catalog_url, geoparquet=args.geoparquet,
+          checksums=args.checksums, download_json=args.download_json)
 
 
 # python create_stac_from_geotiffs.py lidar https://better-open-data.com/lidar --output stac
@@ -0,0 +1,115 @@
+'''
+Helpers for caching results derived from a raster against the file they came from.
+A fingerprint is the file's path, size and modification time (optionally with a
+sha256 of the content); a cached entry is only reused while the fingerprint matches.
+'''
+import hashlib
+import json
+import os
+
+
+def sha256_file(file_path, chunk_size=8 * 1024 * 1024):
+    """
+    Returns the hex sha256 digest of a file, read in large sequential chunks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(file_path, content_hash=False):
+    """
+    Builds the fingerprint of a file.
+
+    Args:
+        file_path (str): Path to the file
+        content_hash (bool): Also include a sha256 of the file content
+
+    Returns:
+        dict: path, size and mtime_ns (and sha256 when requested)
+    """
+    st = os.stat(file_path)
+    fingerprint = {
+        'path': os.path.abspath(file_path),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns
+    }
+    if content_hash:
+        fingerprint['sha256'] = sha256_file(file_path)
+    return fingerprint
+
+
+def fingerprints_match(cached, current):
+    """
+    Compares two fingerprints. The content hash is only compared when both have one.
+    """
+    if cached is None or current is None:
+        return False
+    for key in ('path', 'size', 'mtime_ns'):
+        if cached.get(key) != current.get(key):
+            return False
+    if 'sha256' in cached and 'sha256' in current:
+        return cached['sha256'] == current['sha256']
+    return True
+
+
+class JsonCache:
+    """
+    A directory of small JSON files, one per source file, each holding the
+    source fingerprint next to the cached payload.
+    """
+
+    def __init__(self, cache_dir, version=1, content_hash=False):
+        self.cache_dir = cache_dir
+        self.version = version
+        self.content_hash = content_hash
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_path(self, file_path):
+        abs_path = os.path.abspath(file_path)
+        key = hashlib.sha1(abs_path.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{os.path.basename(abs_path)}.{key}.json")
+
+    def get(self, file_path, fingerprint=None):
+        """
+        Returns the cached payload for file_path, or None if missing or stale.
+        """
+        entry_path = self.entry_path(file_path)
+        if not os.path.exists(entry_path):
+            return None
+        try:
+            with open(entry_path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if entry.get('version') != self.version:
+            return None
+        if fingerprint is None:
+            fingerprint = file_fingerprint(file_path, self.content_hash)
+        if not fingerprints_match(entry.get('fingerprint'), fingerprint):
+            return None
+        return entry.get('payload')
+
+    def put(self, file_path, payload, fingerprint=None):
+        """
+        Stores payload for file_path, replacing any previous entry atomically.
+        """
+        if fingerprint is None:
+            fingerprint = file_fingerprint(file_path, self.content_hash)
+        entry = {'version': self.version, 'fingerprint': fingerprint, 'payload': payload}
+        entry_path = self.entry_path(file_path)
+        temp_path = entry_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(entry, f)
+        os.replace(temp_path, entry_path)
+
+    def invalidate(self, file_path):
+        try:
+            os.remove(self.entry_path(file_path))
+        except FileNotFoundError:
+            pass
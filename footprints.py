@@ -0,0 +1,145 @@
+'''
+Extracts the valid-data footprint of each raster as a polygon.
+The nodata mask is read from a coarse overview rather than full resolution,
+polygonised, and simplified to a configurable tolerance. Results are cached
+against the file fingerprint so the collection can be re-scanned cheaply.
+'''
+import os
+import glob
+import json
+
+import numpy as np
+import rasterio
+from rasterio import features
+from rasterio.enums import Resampling
+from shapely.geometry import shape, mapping
+from shapely.ops import unary_union
+
+from fingerprint import JsonCache
+from gdal_profiles import apply_profile, add_profile_argument
+
+FOOTPRINT_CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = ".footprint-cache"
+
+
+def read_coarse_valid_mask(src, max_size=1024):
+    """
+    Reads a boolean valid-data mask at reduced resolution.
+
+    GDAL serves the read from the internal overview closest to the requested
+    shape, so only a small fraction of the file is decoded.
+
+    Args:
+        src: Open rasterio dataset
+        max_size (int): Largest width/height of the mask in pixels
+
+    Returns:
+        tuple: (mask array, affine transform of the mask)
+    """
+    factor = max(1.0, max(src.width, src.height) / float(max_size))
+    width = max(1, int(round(src.width / factor)))
+    height = max(1, int(round(src.height / factor)))
+    data = src.read(1, out_shape=(height, width), resampling=Resampling.nearest)
+
+    valid = np.ones(data.shape, dtype=bool)
+    if data.dtype.kind == 'f':
+        valid &= ~np.isnan(data)
+    if src.nodata is not None and not np.isnan(src.nodata):
+        valid &= data != src.nodata
+
+    transform = src.transform * src.transform.scale(src.width / width, src.height / height)
+    return valid, transform
+
+
+def extract_footprint(file_path, tolerance=None, max_size=1024):
+    """
+    Polygonises the valid-data area of a raster.
+
+    Args:
+        file_path (str): Path to the raster
+        tolerance (float): Simplification tolerance in CRS units. Defaults to one
+            pixel of the coarse mask.
+        max_size (int): Largest width/height of the coarse mask in pixels
+
+    Returns:
+        dict: GeoJSON geometry in the raster CRS, or None if there is no valid data
+    """
+    with rasterio.open(file_path) as src:
+        valid, transform = read_coarse_valid_mask(src, max_size)
+
+    if not valid.any():
+        return None
+
+    polygons = [
+        shape(geom)
+        for geom, value in features.shapes(valid.astype(np.uint8), mask=valid, transform=transform)
+        if value == 1
+    ]
+    footprint = unary_union(polygons)
+
+    if tolerance is None:
+        tolerance = abs(transform.a)
+    if tolerance > 0:
+        footprint = footprint.simplify(tolerance, preserve_topology=True)
+
+    # Round-trip through JSON so fresh and cached geometries compare equal
+    return json.loads(json.dumps(mapping(footprint)))
+
+
+def get_footprint(file_path, tolerance=None, max_size=1024, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Returns the footprint of a raster, using the fingerprint cache when possible.
+    """
+    cache = JsonCache(cache_dir, version=FOOTPRINT_CACHE_VERSION) if cache_dir else None
+    params = {'tolerance': tolerance, 'max_size': max_size}
+    if cache is not None:
+        cached = cache.get(file_path)
+        if cached is not None and cached.get('params') == params:
+            return cached['geometry']
+
+    geometry = extract_footprint(file_path, tolerance, max_size)
+    if cache is not None:
+        cache.put(file_path, {'params': params, 'geometry': geometry})
+    return geometry
+
+
+def build_footprint_collection(file_list, tolerance=None, max_size=1024, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Builds a GeoJSON FeatureCollection with one footprint per raster.
+    """
+    feature_list = []
+    for file_path in file_list:
+        try:
+            geometry = get_footprint(file_path, tolerance, max_size, cache_dir)
+            if geometry is None:
+                print(f"No valid data in {os.path.basename(file_path)}")
+                continue
+            feature_list.append({
+                'type': 'Feature',
+                'properties': {'filename': os.path.basename(file_path)},
+                'geometry': geometry
+            })
+            print(f"Processed: {os.path.basename(file_path)}")
+        except Exception as e:
+            print(f"Error processing {os.path.basename(file_path)}: {str(e)}")
+    return {'type': 'FeatureCollection', 'features': feature_list}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract valid-data footprints from GeoTIFF files.")
+    parser.add_argument("geotiff_folder", help="Path to the folder containing GeoTIFF files.")
+    parser.add_argument("--tolerance", type=float, default=None, help="Simplification tolerance in CRS units.")
+    parser.add_argument("--max-size", type=int, default=1024, help="Largest dimension of the coarse mask.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_DIR, help="Directory for cached footprints.")
+    parser.add_argument("--output", default="footprints.geojson", help="Output GeoJSON file.")
+    add_profile_argument(parser, "analysis")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    file_list = sorted(glob.glob(os.path.join(args.geotiff_folder, "*.tif")))
+    collection = build_footprint_collection(file_list, args.tolerance, args.max_size, args.cache)
+    with open(args.output, 'w') as f:
+        json.dump(collection, f)
+    print(f"Wrote {len(collection['features'])} footprints to {args.output}")
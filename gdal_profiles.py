@@ -0,0 +1,277 @@
+'''
+Named GDAL configuration profiles used by every entry point:
+
+    bulk-convert  large local translates and warps (batchconvert, DownloadProcessCOGS, ...)
+    remote-read   small range reads of COGs over HTTP (/vsicurl)
+    analysis      reading whole local rasters (statistics, validation, STAC, tiles)
+
+Profiles are applied as environment variables, so they reach both the osgeo
+and the rasterio copies of GDAL and any worker processes. Options already set
+in the environment are left alone. Profiles tuned on this machine with
+`python gdal_profiles.py tune <profile> <files...>` are saved to
+gdal_profiles.json and override the defaults below.
+'''
+import os
+import sys
+import json
+import time
+import random
+import platform
+import statistics
+import subprocess
+import tempfile
+
+PROFILE_FILE = "gdal_profiles.json"
+PROFILE_FILE_VERSION = 1
+
+PROFILES = {
+    'bulk-convert': {
+        'GDAL_CACHEMAX': '1024',
+        'GDAL_NUM_THREADS': 'ALL_CPUS',
+        'GDAL_SWATH_SIZE': '268435456',
+        'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+        'VSI_CACHE': 'FALSE',
+    },
+    'remote-read': {
+        'GDAL_CACHEMAX': '256',
+        'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+        'CPL_VSIL_CURL_ALLOWED_EXTENSIONS': '.tif,.tiff,.vrt',
+        'CPL_VSIL_CURL_CHUNK_SIZE': '65536',
+        'GDAL_INGESTED_BYTES_AT_OPEN': '32768',
+        'GDAL_HTTP_MULTIRANGE': 'YES',
+        'GDAL_HTTP_MERGE_CONSECUTIVE_RANGES': 'YES',
+        'GDAL_HTTP_MAX_RETRY': '3',
+        'GDAL_HTTP_RETRY_DELAY': '1',
+        'VSI_CACHE': 'TRUE',
+        'VSI_CACHE_SIZE': '67108864',
+    },
+    'analysis': {
+        'GDAL_CACHEMAX': '512',
+        'GDAL_NUM_THREADS': 'ALL_CPUS',
+        'GDAL_DISABLE_READDIR_ON_OPEN': 'EMPTY_DIR',
+        'VSI_CACHE': 'FALSE',
+    },
+}
+
+# Values tried by the tuner, one option at a time
+CANDIDATES = {
+    'bulk-convert': {
+        'GDAL_CACHEMAX': ['256', '1024', '4096'],
+        'GDAL_NUM_THREADS': ['1', 'ALL_CPUS'],
+        'GDAL_SWATH_SIZE': ['67108864', '268435456', '1073741824'],
+    },
+    'remote-read': {
+        'CPL_VSIL_CURL_CHUNK_SIZE': ['16384', '65536', '262144'],
+        'GDAL_INGESTED_BYTES_AT_OPEN': ['16384', '32768', '131072'],
+        'GDAL_HTTP_MULTIRANGE': ['YES', 'NO'],
+        'VSI_CACHE_SIZE': ['16777216', '67108864', '268435456'],
+    },
+    'analysis': {
+        'GDAL_CACHEMAX': ['128', '512', '2048'],
+        'GDAL_NUM_THREADS': ['1', 'ALL_CPUS'],
+    },
+}
+
+
+def load_profiles(path=PROFILE_FILE):
+    """
+    Returns the default profiles with any tuned profiles from path applied on top.
+    """
+    profiles = {name: dict(options) for name, options in PROFILES.items()}
+    if path and os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == PROFILE_FILE_VERSION:
+                for name, options in data.get('profiles', {}).items():
+                    profiles.setdefault(name, {}).update(options)
+        except (OSError, ValueError) as e:
+            print(f"Error reading {path}: {str(e)}")
+    return profiles
+
+
+def apply_profile(name, path=PROFILE_FILE, override=False):
+    """
+    Sets the options of a profile for this process and its children.
+    Should be called before the first raster is opened.
+
+    Args:
+        name (str): Profile name
+        path (str): Tuned profile file
+        override (bool): Replace options already set in the environment
+
+    Returns:
+        dict: The options now in effect for the profile
+    """
+    profiles = load_profiles(path)
+    if name not in profiles:
+        raise ValueError(f"Unknown GDAL profile {name}, expected one of {', '.join(sorted(profiles))}")
+    applied = {}
+    for key, value in profiles[name].items():
+        if override or key not in os.environ:
+            os.environ[key] = str(value)
+        applied[key] = os.environ[key]
+    # osgeo caches some options once loaded, so set them there as well
+    gdal = sys.modules.get('osgeo.gdal')
+    if gdal is not None:
+        for key, value in applied.items():
+            gdal.SetConfigOption(key, value)
+    return applied
+
+
+def add_profile_argument(parser, default):
+    """
+    Adds --gdal-profile to an entry point's argument parser.
+    """
+    parser.add_argument("--gdal-profile", choices=sorted(PROFILES), default=default,
+                        help=f"GDAL configuration profile (default {default}).")
+
+
+def _bench_bulk_convert(files):
+    from osgeo import gdal
+    from batchconvert import CREATION_OPTIONS
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for path in files:
+            output_path = os.path.join(temp_dir, os.path.basename(path))
+            gdal.Translate(output_path, path, options=gdal.TranslateOptions(format='COG', creationOptions=CREATION_OPTIONS))
+            os.remove(output_path)
+
+
+def _bench_analysis(files):
+    import numpy as np
+    import rasterio
+    for path in files:
+        with rasterio.open(path) as src:
+            for _, window in src.block_windows(1):
+                data = src.read(1, window=window, masked=True)
+                np.ma.min(data), np.ma.max(data)
+
+
+def _bench_remote_read(files, reads_per_file=32, window_size=256):
+    import rasterio
+    from rasterio.windows import Window
+    rng = random.Random(0)
+    for path in files:
+        with rasterio.open(path) as src:
+            levels = [None] + list(range(len(src.overviews(1))))
+        for _ in range(reads_per_file):
+            level = rng.choice(levels)
+            with rasterio.open(path, overview_level=level) as src:
+                width, height = min(window_size, src.width), min(window_size, src.height)
+                col = rng.randrange(src.width - width + 1)
+                row = rng.randrange(src.height - height + 1)
+                src.read(1, window=Window(col, row, width, height))
+
+
+BENCHMARKS = {
+    'bulk-convert': _bench_bulk_convert,
+    'remote-read': _bench_remote_read,
+    'analysis': _bench_analysis,
+}
+
+
+def time_options(profile, options, files, repeat=3):
+    """
+    Times the profile's workload in fresh processes with the given options,
+    so caches and once-per-process settings do not carry over between runs.
+
+    Returns:
+        float: Median seconds, or None if the workload failed
+    """
+    env = dict(os.environ)
+    env.update(options)
+    timings = []
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), "_bench", profile] + list(files),
+                                   env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"Error processing {profile} benchmark: {completed.stderr.strip().splitlines()[-1:]}")
+            return None
+        timings.append(float(completed.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def tune_profile(profile, files, repeat=3, path=PROFILE_FILE):
+    """
+    Tunes a profile on this machine by trying each candidate value of one
+    option at a time, keeping the fastest, then saves the result to path.
+
+    Args:
+        profile (str): Profile name
+        files (list): Representative files (URLs for remote-read)
+        repeat (int): Runs per candidate
+        path (str): Tuned profile file to update
+
+    Returns:
+        tuple: (best options, seconds)
+    """
+    best = load_profiles(path)[profile]
+    best_time = time_options(profile, best, files, repeat)
+    if best_time is None:
+        raise RuntimeError(f"The {profile} benchmark failed with the current settings")
+    print(f"Baseline: {best_time:.3f}s")
+
+    for key, values in CANDIDATES[profile].items():
+        for value in values:
+            if best.get(key) == value:
+                continue
+            candidate = dict(best, **{key: value})
+            seconds = time_options(profile, candidate, files, repeat)
+            if seconds is None:
+                continue
+            print(f"{key}={value}: {seconds:.3f}s")
+            # Require a clear gain so noise does not flip settings back and forth
+            if seconds < best_time * 0.97:
+                best, best_time = candidate, seconds
+
+    data = {'version': PROFILE_FILE_VERSION, 'profiles': {}, 'benchmarks': {}}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            existing = json.load(f)
+        if existing.get('version') == PROFILE_FILE_VERSION:
+            data = existing
+    data['profiles'][profile] = best
+    data['benchmarks'][profile] = {
+        'seconds': round(best_time, 4),
+        'files': [os.path.basename(file) for file in files],
+        'machine': platform.node(),
+        'cpus': os.cpu_count(),
+        'tuned_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    return best, best_time
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "_bench":
+        # Worker for time_options: runs the workload once and prints the elapsed time
+        start = time.perf_counter()
+        BENCHMARKS[sys.argv[2]](sys.argv[3:])
+        print(time.perf_counter() - start)
+        sys.exit(0)
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show or tune the GDAL configuration profiles.")
+    parser.add_argument("--profiles", default=PROFILE_FILE, help="Tuned profile file.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    show_parser = subparsers.add_parser("show", help="Print the options of each profile.")
+    show_parser.add_argument("profile", nargs="?", choices=sorted(PROFILES))
+    tune_parser = subparsers.add_parser("tune", help="Benchmark candidate settings and save the fastest.")
+    tune_parser.add_argument("profile", choices=sorted(PROFILES))
+    tune_parser.add_argument("files", nargs="+", help="Representative files (URLs for remote-read).")
+    tune_parser.add_argument("--repeat", type=int, default=3, help="Runs per candidate setting.")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        for name, options in sorted(load_profiles(args.profiles).items()):
+            if args.profile in (None, name):
+                print(name)
+                for key, value in sorted(options.items()):
+                    print(f"  {key}={value}")
+    else:
+        best, seconds = tune_profile(args.profile, args.files, args.repeat, args.profiles)
+        print(f"Best {args.profile} settings ({seconds:.3f}s), saved to {args.profiles}:")
+        for key, value in sorted(best.items()):
+            print(f"  {key}={value}")
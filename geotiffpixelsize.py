@@ -2,6 +2,8 @@ import os
 import sys
 from osgeo import gdal
 
+from gdal_profiles import apply_profile
+
 def get_pixel_sizes(file_list):
     """
     Get the pixel sizes (width and height) of a list of GeoTIFF files.
@@ -75,6 +77,7 @@ def print_results(results):
         print(f"{result['filename']:<40} {width_str:<20} {height_str:<20}")
 
 if __name__ == "__main__":
+    apply_profile('analysis')
     # Example usage
     import glob
     
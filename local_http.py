@@ -0,0 +1,111 @@
+'''
+A small local HTTP server for tests and benchmarks.
+It serves a directory like `python -m http.server`, but also answers single
+and multiple byte-range requests the way the public web server does, and
+counts the requests it receives.
+'''
+import os
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+def parse_range_header(range_header, file_size):
+    """
+    Parses a `Range: bytes=...` header.
+
+    Returns:
+        list: (start, end) inclusive byte positions, or None if unsatisfiable
+    """
+    if not range_header.startswith("bytes="):
+        return None
+    ranges = []
+    for part in range_header[len("bytes="):].split(","):
+        part = part.strip()
+        start, _, end = part.partition("-")
+        if start == "":
+            length = int(end)
+            start, end = max(0, file_size - length), file_size - 1
+        else:
+            start = int(start)
+            end = int(end) if end else file_size - 1
+        end = min(end, file_size - 1)
+        if start > end:
+            continue
+        ranges.append((start, end))
+    return ranges or None
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    SimpleHTTPRequestHandler with byte-range support.
+    """
+
+    def do_GET(self):
+        self.server.request_count += 1
+        range_header = self.headers.get("Range")
+        if not range_header:
+            return super().do_GET()
+
+        path = self.translate_path(self.path)
+        if not os.path.isfile(path):
+            self.send_error(404, "File not found")
+            return
+        file_size = os.path.getsize(path)
+        ranges = parse_range_header(range_header, file_size)
+        if ranges is None:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{file_size}")
+            self.end_headers()
+            return
+
+        with open(path, "rb") as f:
+            parts = []
+            for start, end in ranges:
+                f.seek(start)
+                parts.append((start, end, f.read(end - start + 1)))
+
+        self.send_response(206)
+        if len(parts) == 1:
+            start, end, data = parts[0]
+            self.send_header("Content-Type", self.guess_type(path))
+            self.send_header("Content-Range", f"bytes {start}-{end}/{file_size}")
+            body = data
+        else:
+            boundary = "RANGE_BOUNDARY"
+            chunks = []
+            for start, end, data in parts:
+                chunks.append(
+                    f"\r\n--{boundary}\r\nContent-Type: {self.guess_type(path)}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n".encode("ascii") + data
+                )
+            chunks.append(f"\r\n--{boundary}--\r\n".encode("ascii"))
+            body = b"".join(chunks)
+            self.send_header("Content-Type", f"multipart/byteranges; boundary={boundary}")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_directory(directory, host="127.0.0.1", port=0):
+    """
+    Serves a directory on a background thread.
+
+    Args:
+        directory (str): Directory to serve
+        host (str): Interface to bind
+        port (int): Port to bind, 0 picks a free one
+
+    Returns:
+        tuple: (server, base URL). Call server.shutdown() when done.
+    """
+    handler = partial(RangeRequestHandler, directory=directory)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.request_count = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
@@ -0,0 +1,442 @@
+'''
+Runs the processing workflow (download -> recompress -> validate -> analyse ->
+STAC and download JSON) from one declarative JSON config.
+Each stage is broken into file-level tasks in a dependency graph. A task is
+only run when its parameters, its input file fingerprints or its outputs have
+changed since its last successful run, and independent tasks run concurrently.
+Task state is kept in the state directory, so a small change to the inputs
+only reruns the tasks downstream of it.
+
+Example config (see pipeline.example.json):
+
+    {
+      "state_dir": ".pipeline",
+      "workers": 4,
+      "download": {"urls_file": "urls.txt", "output_dir": "processed"},
+      "recompress": {"output_dir": "newlidar"},
+      "validate": {"log": "validate_cogs_log.txt"},
+      "analyse": {"output": "analysis_results.txt"},
+      "stac": {"base_url": "https://better-open-data.com/lidar", "output": "stac", "checksums": true}
+    }
+'''
+import os
+import sys
+import glob
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from fingerprint import file_fingerprint, fingerprints_match
+from gdal_profiles import apply_profile
+
+STATE_VERSION = 1
+# Raster products written per zip by ZipRasterProcessor
+PRODUCTS = ('DSM', 'DTM')
+
+
+class Task:
+    """
+    A unit of work producing files.
+
+    Args:
+        name (str): Unique task name, e.g. "validate:Foyle_23_05_2004_DTM.tif"
+        action (callable): Called with no arguments to do the work
+        inputs (list or callable): Files the task reads; a callable is evaluated
+            once the task's dependencies have finished
+        outputs (list): Files the task writes
+        params (dict): Parameters that change the result when they change
+        deps (list): Names of tasks that must finish first
+        required_inputs (bool): Skip the task when an input file does not exist
+        adopt_existing (bool): With no recorded state, treat existing outputs as up to date
+    """
+
+    def __init__(self, name, action, inputs=(), outputs=(), params=None, deps=(), required_inputs=False,
+                 adopt_existing=False):
+        self.name = name
+        self.action = action
+        self.inputs = inputs
+        self.outputs = list(outputs)
+        self.params = params or {}
+        self.deps = list(deps)
+        self.required_inputs = required_inputs
+        self.adopt_existing = adopt_existing
+
+    def resolve_inputs(self):
+        inputs = self.inputs() if callable(self.inputs) else self.inputs
+        return sorted(inputs)
+
+    def key(self, inputs):
+        """
+        Hash of the task's parameters and the fingerprints of its existing inputs.
+        """
+        fingerprints = [file_fingerprint(path) for path in inputs if os.path.exists(path)]
+        payload = json.dumps({'name': self.name, 'params': self.params, 'inputs': fingerprints}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class TaskState:
+    """
+    Persistent record of each task's last successful run.
+    """
+
+    def __init__(self, state_dir):
+        self.path = os.path.join(state_dir, 'state.json')
+        os.makedirs(state_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self.tasks = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == STATE_VERSION:
+                self.tasks = data['tasks']
+
+    def is_up_to_date(self, task, key):
+        with self._lock:
+            record = self.tasks.get(task.name)
+        if record is None:
+            return task.adopt_existing and bool(task.outputs) and all(os.path.exists(p) for p in task.outputs)
+        if record['key'] != key:
+            return False
+        if task.outputs and not record['outputs']:
+            # A run that produced nothing is not a result to keep
+            return False
+        for path in task.outputs:
+            if not os.path.exists(path) and path not in record['missing_outputs']:
+                return False
+        for path, fingerprint in record['outputs'].items():
+            if not os.path.exists(path) or not fingerprints_match(fingerprint, file_fingerprint(path)):
+                return False
+        return True
+
+    def record(self, task, key):
+        outputs = {path: file_fingerprint(path) for path in task.outputs if os.path.exists(path)}
+        missing = [path for path in task.outputs if not os.path.exists(path)]
+        with self._lock:
+            self.tasks[task.name] = {'key': key, 'outputs': outputs, 'missing_outputs': missing}
+            temp_path = self.path + '.tmp'
+            with open(temp_path, 'w') as f:
+                json.dump({'version': STATE_VERSION, 'tasks': self.tasks}, f, indent=1, sort_keys=True)
+            os.replace(temp_path, self.path)
+
+
+def run_tasks(tasks, state, workers=4, dry_run=False):
+    """
+    Runs out-of-date tasks in dependency order, with up to `workers` at a time.
+
+    Returns:
+        dict: task name -> 'ran', 'up to date', 'skipped', 'failed' or 'blocked'
+            ('would run' instead of 'ran' for a dry run)
+    """
+    by_name = {task.name: task for task in tasks}
+    for task in tasks:
+        for dep in task.deps:
+            if dep not in by_name:
+                raise ValueError(f"Task {task.name} depends on unknown task {dep}")
+
+    status = {}
+    running = {}
+    pending = list(tasks)
+
+    def check(task):
+        if dry_run and any(status[dep] == 'would run' for dep in task.deps):
+            # Inputs may not exist until the upstream tasks have run
+            return 'would run', None
+        inputs = task.resolve_inputs()
+        if task.required_inputs and not all(os.path.exists(path) for path in inputs):
+            return 'skipped', None
+        key = task.key(inputs)
+        upstream_ran = any(status[dep] == 'ran' for dep in task.deps)
+        if not upstream_ran and state.is_up_to_date(task, key):
+            return 'up to date', key
+        return ('would run' if dry_run else 'run'), key
+
+    def execute(task, key):
+        task.action()
+        # Some actions report errors without raising (ZipRasterProcessor logs a
+        # failed download and carries on). Writing none of the declared outputs
+        # counts as a failure so the task is retried next time; a subset is
+        # fine, not every zip has both products.
+        if task.outputs and not any(os.path.exists(path) for path in task.outputs):
+            raise RuntimeError("none of the outputs were written")
+        state.record(task, key)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            progressed = False
+            for task in list(pending):
+                dep_status = [status.get(dep) for dep in task.deps]
+                if any(s is None for s in dep_status):
+                    continue
+                pending.remove(task)
+                progressed = True
+                if any(s in ('failed', 'blocked') for s in dep_status):
+                    status[task.name] = 'blocked'
+                    continue
+                result, key = check(task)
+                if result != 'run':
+                    status[task.name] = result
+                    continue
+                print(f"Running: {task.name}")
+                running[executor.submit(execute, task, key)] = task
+            if progressed and not running:
+                continue
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    future.result()
+                    status[task.name] = 'ran'
+                except Exception as e:
+                    status[task.name] = 'failed'
+                    print(f"Error processing {task.name}: {str(e)}")
+    # Anything left waiting is part of a dependency cycle
+    for task in pending:
+        status[task.name] = 'blocked'
+    return status
+
+
+def _product_name(url, product):
+    return f"{os.path.basename(url.strip()).replace('.zip', '')}_{product}.tif"
+
+
+def _save_json(data, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def _load_json(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def build_tasks(config):
+    """
+    Turns the pipeline config into the task graph.
+
+    Returns:
+        list: Task objects
+    """
+    state_dir = config.get('state_dir', '.pipeline')
+    tasks = []
+
+    # Download and convert: one task per zip, writing <zip>_DSM.tif and <zip>_DTM.tif
+    download = config.get('download')
+    source_files = {}
+    if download:
+        from DownloadProcessCOGS import ZipRasterProcessor
+        urls = list(download.get('urls', []))
+        if download.get('urls_file'):
+            with open(download['urls_file'], 'r') as f:
+                urls += [line.strip() for line in f if line.strip()]
+        output_dir = download.get('output_dir', 'processed')
+        options = {key: download[key] for key in ('verify_output', 'validate_before_publish', 'extra_projections',
+                                                  'direct_mosaic') if key in download}
+        for url in urls:
+            name = f"download:{os.path.basename(url)}"
+            outputs = [os.path.join(output_dir, _product_name(url, product)) for product in PRODUCTS]
+
+            def action(url=url, output_dir=output_dir, options=options):
+                os.makedirs(output_dir, exist_ok=True)
+                ZipRasterProcessor([url], output_dir, **options).run()
+
+            tasks.append(Task(name, action, outputs=outputs, params={'url': url, 'options': options},
+                              adopt_existing=True))
+            for path in outputs:
+                source_files[path] = name
+        publish_dir = output_dir
+    else:
+        publish_dir = config.get('input_dir', 'processed')
+    for path in glob.glob(os.path.join(publish_dir, '*.tif')):
+        source_files.setdefault(path, None)
+
+    # Recompress: one task per file
+    recompress = config.get('recompress')
+    published = {}
+    if recompress:
+        from batchconvert import convert_file, CREATION_OPTIONS
+        output_dir = recompress.get('output_dir', 'newlidar')
+        creation_options = recompress.get('creation_options', CREATION_OPTIONS)
+        extra_projections = recompress.get('extra_projections', [])
+        for path, upstream in sorted(source_files.items()):
+            output_file = os.path.join(output_dir, os.path.basename(path))
+            name = f"recompress:{os.path.basename(path)}"
+
+            def action(path=path, output_file=output_file):
+                os.makedirs(os.path.dirname(output_file), exist_ok=True)
+                result = convert_file(path, output_file, creation_options, extra_projections)
+                if not result['identical'] or result['errors']:
+                    raise RuntimeError(f"{output_file} does not match {path}")
+
+            tasks.append(Task(name, action, inputs=[path], outputs=[output_file],
+                              params={'creation_options': creation_options, 'extra_projections': extra_projections},
+                              deps=[upstream] if upstream else [], required_inputs=True))
+            published[output_file] = name
+        publish_dir = output_dir
+    else:
+        published = dict(source_files)
+
+    publish_deps = sorted({dep for dep in published.values() if dep})
+
+    def published_files():
+        return sorted(path for path in published if os.path.exists(path))
+
+    # Validate: one task per file, then the combined log
+    validate = config.get('validate')
+    if validate is not None:
+        from validate_cogs import validate_file, write_log, save_json_results, save_csv_results
+        result_paths = []
+        for path, upstream in sorted(published.items()):
+            result_path = os.path.join(state_dir, 'validate', os.path.basename(path) + '.json')
+            name = f"validate:{os.path.basename(path)}"
+
+            def action(path=path, result_path=result_path):
+                _save_json(validate_file(path), result_path)
+
+            tasks.append(Task(name, action, inputs=[path], outputs=[result_path],
+                              deps=[upstream] if upstream else [], required_inputs=True))
+            result_paths.append((result_path, name))
+
+        log_path = validate.get('log', 'validate_cogs_log.txt')
+        report_outputs = [log_path] + [validate[key] for key in ('json', 'csv') if validate.get(key)]
+
+        def validate_report(result_paths=result_paths, log_path=log_path):
+            results = [_load_json(p) for p, _ in result_paths if os.path.exists(p)]
+            write_log(results, publish_dir, log_path)
+            if validate.get('json'):
+                save_json_results(results, validate['json'])
+            if validate.get('csv'):
+                save_csv_results(results, validate['csv'])
+            invalid = [result['filename'] for result in results if not result['valid']]
+            if invalid and validate.get('fail_on_invalid', True):
+                raise RuntimeError(f"{len(invalid)} files are not valid COGs: {', '.join(invalid)}")
+
+        tasks.append(Task("validate:report", validate_report,
+                          inputs=lambda result_paths=result_paths: [p for p, _ in result_paths],
+                          outputs=report_outputs, params=validate, deps=[name for _, name in result_paths]))
+
+    # Analyse: one task per file, then the combined report
+    analyse = config.get('analyse')
+    if analyse is not None:
+        from AnalyseCogs import analyze_geotiff_files, save_text_results, save_markdown_results
+        result_paths = []
+        for path, upstream in sorted(published.items()):
+            result_path = os.path.join(state_dir, 'analyse', os.path.basename(path) + '.json')
+            name = f"analyse:{os.path.basename(path)}"
+
+            def action(path=path, result_path=result_path):
+                results = analyze_geotiff_files([path])
+                # Errors are printed rather than raised; an empty result must not be
+                # recorded as up to date
+                if not results:
+                    raise RuntimeError("no analysis result, see the error above")
+                _save_json(results, result_path)
+
+            tasks.append(Task(name, action, inputs=[path], outputs=[result_path],
+                              deps=[upstream] if upstream else [], required_inputs=True))
+            result_paths.append((result_path, name))
+
+        output = analyse.get('output', 'analysis_results.txt')
+
+        def analyse_report(result_paths=result_paths, output=output):
+            results = [r for p, _ in result_paths if os.path.exists(p) for r in _load_json(p)]
+            results.sort(key=lambda x: x['filename'])
+            save_text_results(results, output)
+            if analyse.get('markdown'):
+                save_markdown_results(results, analyse['markdown'])
+
+        tasks.append(Task("analyse:report", analyse_report,
+                          inputs=lambda result_paths=result_paths: [p for p, _ in result_paths],
+                          outputs=[output] + ([analyse['markdown']] if analyse.get('markdown') else []),
+                          params=analyse, deps=[name for _, name in result_paths]))
+
+    # STAC catalog, checksums and download JSON in one incremental pass
+    stac = config.get('stac')
+    if stac is not None:
+        from create_stac_from_geotiffs import update_stac_catalog
+        output = stac.get('output', 'stac')
+
+        def stac_action():
+            failures = update_stac_catalog(
+                publish_dir, stac['base_url'], output_dir=output,
+                use_footprints=stac.get('footprints', False), footprint_tolerance=stac.get('footprint_tolerance'),
+                workers=stac.get('workers', 8), catalog_url=stac.get('catalog_url'),
+                geoparquet=stac.get('geoparquet', False), checksums=stac.get('checksums', False),
+                download_json=stac.get('download_json'))
+            if failures:
+                raise RuntimeError(f"{len(failures)} GeoTIFF files could not be read")
+
+        deps = publish_deps
+        if validate is not None and validate.get('fail_on_invalid', True):
+            # Only publish a catalog of files that passed validation
+            deps = deps + ["validate:report"]
+        outputs = [os.path.join(output, 'catalog.json')] + ([stac['download_json']] if stac.get('download_json') else [])
+        tasks.append(Task("stac", stac_action, inputs=published_files, outputs=outputs, params=stac, deps=deps))
+
+    return tasks
+
+
+def run_pipeline(config_path, workers=None, dry_run=False, only=None):
+    """
+    Runs the pipeline described by a JSON config file.
+
+    Args:
+        config_path (str): Pipeline config
+        workers (int): Concurrent tasks, overriding the config
+        dry_run (bool): Only report which tasks are out of date
+        only (list): Run only tasks whose name starts with one of these prefixes
+            (and the tasks they depend on)
+
+    Returns:
+        dict: task name -> status
+    """
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    # Most of the time goes on converting, so that profile is the default for the whole run
+    apply_profile(config.get('gdal_profile', 'bulk-convert'))
+    tasks = build_tasks(config)
+    if only:
+        by_name = {task.name: task for task in tasks}
+        selected = set()
+        stack = [task.name for task in tasks if any(task.name.startswith(prefix) for prefix in only)]
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                stack.extend(by_name[name].deps)
+        tasks = [task for task in tasks if task.name in selected]
+
+    state = TaskState(config.get('state_dir', '.pipeline'))
+    status = run_tasks(tasks, state, workers or config.get('workers', 4), dry_run)
+
+    counts = {}
+    for result in status.values():
+        counts[result] = counts.get(result, 0) + 1
+    print("Pipeline finished: " + ", ".join(f"{count} {result}" for result, count in sorted(counts.items())))
+    for name, result in status.items():
+        if result in ('failed', 'blocked'):
+            print(f" - {name}: {result}")
+    return status
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the processing pipeline, rerunning only out-of-date tasks.")
+    parser.add_argument("config", help="Pipeline config (JSON).")
+    parser.add_argument("--workers", type=int, default=None, help="Number of tasks run at once.")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the tasks that are out of date.")
+    parser.add_argument("--only", nargs="+", default=None,
+                        help="Run only tasks starting with these prefixes, e.g. validate stac.")
+    args = parser.parse_args()
+
+    status = run_pipeline(args.config, args.workers, args.dry_run, args.only)
+    if args.dry_run:
+        for name, result in status.items():
+            if result == 'would run':
+                print(f"Out of date: {name}")
+    if any(result in ('failed', 'blocked') for result in status.values()):
+        sys.exit(1)
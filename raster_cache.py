@@ -0,0 +1,293 @@
+'''
+Scratch cache of decoded rasters for repeated analysis passes.
+A band is decoded once into a raw .npy file and loaded back as a read-only
+memory map, so later passes read from the page cache instead of decoding the
+ZSTD/DEFLATE blocks again. A JSON sidecar next to each array keeps the source
+fingerprint (for invalidation) and the georeferencing. The cache has a disk
+quota; the least recently used arrays are removed to stay under it.
+
+CachedRaster offers the parts of the rasterio dataset interface the block
+readers use (read with a window, transform, nodata, block_shapes, ...), so
+code can take either; read returns views of the memory map, not copies.
+'''
+import os
+import json
+import glob
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.windows import Window
+
+from fingerprint import file_fingerprint, fingerprints_match
+from gdal_profiles import apply_profile, add_profile_argument
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = ".raster-cache"
+DEFAULT_QUOTA_BYTES = 20 * 1024 ** 3
+
+
+class CachedRaster:
+    """
+    One decoded band backed by a read-only memory map.
+    """
+
+    def __init__(self, array, meta):
+        self.array = array
+        self.meta = meta
+        self.height, self.width = array.shape
+        self.dtypes = (str(array.dtype),)
+        self.transform = Affine.from_gdal(*meta['transform'])
+        self.res = (abs(self.transform.a), abs(self.transform.e))
+        self.crs = rasterio.crs.CRS.from_wkt(meta['crs']) if meta['crs'] else None
+        self.nodata = meta['nodata']
+        self.block_shapes = [tuple(meta['block_shape'])]
+        self.name = meta['source']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        # The memory map is released when the last view of it goes
+        pass
+
+    def window_transform(self, window):
+        return rasterio.windows.transform(window, self.transform)
+
+    def block_windows(self, bidx=1):
+        block_y, block_x = self.block_shapes[0]
+        for row in range((self.height + block_y - 1) // block_y):
+            for col in range((self.width + block_x - 1) // block_x):
+                window = Window(col * block_x, row * block_y, min(block_x, self.width - col * block_x),
+                                min(block_y, self.height - row * block_y))
+                yield (row, col), window
+
+    def read(self, indexes=1, window=None, boundless=False, fill_value=None):
+        """
+        Returns the window as a view of the memory map. Boundless reads that
+        go past the edges return a padded copy instead.
+        """
+        if indexes != 1:
+            raise ValueError("A cached raster holds a single band")
+        if window is None:
+            return self.array
+        col, row = int(window.col_off), int(window.row_off)
+        width, height = int(window.width), int(window.height)
+        if col >= 0 and row >= 0 and col + width <= self.width and row + height <= self.height:
+            return self.array[row:row + height, col:col + width]
+        if not boundless:
+            raise ValueError(f"Window {window} is outside the raster")
+        fill = fill_value if fill_value is not None else (self.nodata if self.nodata is not None else 0)
+        out = np.full((height, width), fill, dtype=self.array.dtype)
+        col0, row0 = max(0, col), max(0, row)
+        col1, row1 = min(self.width, col + width), min(self.height, row + height)
+        if col1 > col0 and row1 > row0:
+            out[row0 - row:row1 - row, col0 - col:col1 - col] = self.array[row0:row1, col0:col1]
+        return out
+
+
+def _decode_windows(src_path, band, windows, array):
+    # Each thread opens its own handle, rasterio datasets are not thread safe
+    with rasterio.open(src_path) as src:
+        for window in windows:
+            row, col = int(window.row_off), int(window.col_off)
+            array[row:row + int(window.height), col:col + int(window.width)] = src.read(band, window=window)
+
+
+class RasterCache:
+    """
+    Decoded rasters on local disk, keyed by source path and band.
+
+    Args:
+        cache_dir (str): Directory for the arrays and sidecars
+        quota_bytes (int): Disk space the arrays may use
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, quota_bytes=DEFAULT_QUOTA_BYTES):
+        self.cache_dir = cache_dir
+        self.quota_bytes = quota_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def entry_paths(self, path, band=1):
+        """
+        Returns (array path, sidecar path) for a source band.
+        """
+        key = hashlib.sha1(f"{os.path.abspath(path)}|{band}".encode('utf-8')).hexdigest()[:16]
+        stem = os.path.join(self.cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}-{key}")
+        return stem + ".npy", stem + ".json"
+
+    def lookup(self, path, band=1):
+        """
+        Returns the cached band, or None if it is missing or the source changed.
+        """
+        array_path, sidecar_path = self.entry_paths(path, band)
+        try:
+            with open(sidecar_path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != CACHE_VERSION or not os.path.exists(array_path) \
+                or not fingerprints_match(meta['fingerprint'], file_fingerprint(path)):
+            return None
+        # The sidecar's modification time records the last use for LRU eviction
+        os.utime(sidecar_path)
+        return CachedRaster(np.load(array_path, mmap_mode='r'), meta)
+
+    def open(self, path, band=1, workers=None):
+        """
+        Returns the cached band, decoding the source first if needed.
+
+        Args:
+            path (str): Source raster
+            band (int): Band to cache
+            workers (int): Threads used to decode (defaults to the CPU count)
+
+        Returns:
+            CachedRaster: The band as a read-only memory map
+        """
+        cached = self.lookup(path, band)
+        if cached is not None:
+            return cached
+
+        with rasterio.open(path) as src:
+            size = src.width * src.height * np.dtype(src.dtypes[band - 1]).itemsize
+            if size > self.quota_bytes:
+                raise ValueError(f"{os.path.basename(path)} needs {size} bytes, more than the cache quota")
+            meta = {
+                'version': CACHE_VERSION,
+                'source': os.path.abspath(path),
+                'band': band,
+                'fingerprint': file_fingerprint(path),
+                'dtype': src.dtypes[band - 1],
+                'shape': [src.height, src.width],
+                'transform': list(src.transform.to_gdal()),
+                'crs': src.crs.to_wkt() if src.crs else None,
+                'nodata': src.nodata,
+                'block_shape': list(src.block_shapes[band - 1]),
+                'bytes': size
+            }
+            windows = [window for _, window in src.block_windows(band)]
+
+        self.invalidate(path, band)
+        self.evict(self.quota_bytes - size)
+
+        array_path, sidecar_path = self.entry_paths(path, band)
+        temp_path = f"{array_path}.{os.getpid()}.tmp.npy"
+        array = np.lib.format.open_memmap(temp_path, mode='w+', dtype=meta['dtype'], shape=tuple(meta['shape']))
+        try:
+            workers = min(workers or os.cpu_count() or 1, max(1, len(windows)))
+            chunks = [windows[i::workers] for i in range(workers)]
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(lambda chunk: _decode_windows(path, band, chunk, array), chunks))
+            array.flush()
+        except Exception:
+            del array
+            os.remove(temp_path)
+            raise
+        del array
+        os.replace(temp_path, array_path)
+        with open(sidecar_path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(sidecar_path + '.tmp', sidecar_path)
+        return CachedRaster(np.load(array_path, mmap_mode='r'), meta)
+
+    def invalidate(self, path, band=1):
+        for entry_path in self.entry_paths(path, band):
+            if os.path.exists(entry_path):
+                os.remove(entry_path)
+
+    def entries(self):
+        """
+        Returns the cached bands as sidecar dicts with 'last_used' added,
+        least recently used first.
+        """
+        entries = []
+        for sidecar_path in glob.glob(os.path.join(self.cache_dir, "*.json")):
+            try:
+                with open(sidecar_path, 'r') as f:
+                    meta = json.load(f)
+                meta['last_used'] = os.path.getmtime(sidecar_path)
+            except (OSError, ValueError):
+                continue
+            meta['sidecar_path'] = sidecar_path
+            meta['array_path'] = sidecar_path[:-len(".json")] + ".npy"
+            entries.append(meta)
+        entries.sort(key=lambda entry: entry['last_used'])
+        return entries
+
+    def usage(self):
+        return sum(entry['bytes'] for entry in self.entries())
+
+    def evict(self, max_bytes=None):
+        """
+        Removes least recently used arrays until they take at most max_bytes
+        (the quota by default).
+
+        Returns:
+            int: Bytes freed
+        """
+        max_bytes = self.quota_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        used = sum(entry['bytes'] for entry in entries)
+        freed = 0
+        for entry in entries:
+            if used - freed <= max_bytes:
+                break
+            for entry_path in (entry['array_path'], entry['sidecar_path']):
+                if os.path.exists(entry_path):
+                    os.remove(entry_path)
+            freed += entry['bytes']
+        return freed
+
+
+def open_raster(path, cache_dir=None, quota_bytes=DEFAULT_QUOTA_BYTES):
+    """
+    Opens path through the scratch cache when cache_dir is set, falling back to
+    rasterio if it can not be cached. Use as a context manager either way.
+    """
+    if cache_dir:
+        try:
+            return RasterCache(cache_dir, quota_bytes).open(path)
+        except ValueError as e:
+            print(f"Not cached: {str(e)}")
+    return rasterio.open(path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the scratch cache of decoded rasters.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Cache directory.")
+    parser.add_argument("--quota-gb", type=float, default=DEFAULT_QUOTA_BYTES / 1024 ** 3, help="Disk quota in GB.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    warm_parser = subparsers.add_parser("warm", help="Decode rasters into the cache.")
+    warm_parser.add_argument("files", nargs="+")
+    warm_parser.add_argument("--workers", type=int, default=None, help="Decode threads per file.")
+    subparsers.add_parser("list", help="List cached rasters, least recently used first.")
+    subparsers.add_parser("evict", help="Remove least recently used rasters down to the quota.")
+    subparsers.add_parser("clear", help="Remove every cached raster.")
+    add_profile_argument(parser, "analysis")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    cache = RasterCache(args.cache_dir, int(args.quota_gb * 1024 ** 3))
+    if args.command == "warm":
+        for file_path in args.files:
+            try:
+                cache.open(file_path, workers=args.workers)
+                print(f"Cached: {os.path.basename(file_path)}")
+            except Exception as e:
+                print(f"Error processing {os.path.basename(file_path)}: {str(e)}")
+    elif args.command == "list":
+        for entry in cache.entries():
+            print(f"{os.path.basename(entry['source']):<40} band {entry['band']} {entry['bytes'] / 1024 ** 2:>10.1f} MB")
+        print(f"Total: {cache.usage() / 1024 ** 2:.1f} MB of {cache.quota_bytes / 1024 ** 2:.1f} MB")
+    elif args.command == "evict":
+        print(f"Freed {cache.evict() / 1024 ** 2:.1f} MB")
+    else:
+        print(f"Freed {cache.evict(0) / 1024 ** 2:.1f} MB")
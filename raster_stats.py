@@ -0,0 +1,420 @@
+'''
+Streaming statistics for single-band elevation rasters.
+Walks each file block by block in constant memory and builds a fixed-bin histogram,
+a mergeable quantile sketch (p1/p50/p99), the valid pixel count and the nodata fraction.
+Partial results from threads and from separate files merge exactly, and per-file
+results can be cached so collection-level distributions are cheap to rebuild.
+'''
+import os
+import glob
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from fingerprint import JsonCache
+from raster_cache import open_raster
+from gdal_profiles import apply_profile, add_profile_argument
+
+STATS_CACHE_VERSION = 1
+
+
+class QuantileSketch:
+    """
+    A relative-error quantile sketch (DDSketch style). Values are bucketed on a
+    logarithmic scale so every reported quantile is within `relative_accuracy` of
+    a true sample value. Values closer to zero than `min_value` are counted as zero.
+    Two sketches with the same parameters merge by adding bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=0.001, min_value=1e-3):
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.zero_count = 0
+        # Dense bucket counts; index i holds key offset + i
+        self.positive = (0, np.zeros(0, dtype=np.int64))
+        self.negative = (0, np.zeros(0, dtype=np.int64))
+
+    @property
+    def count(self):
+        return int(self.zero_count + self.positive[1].sum() + self.negative[1].sum())
+
+    def _keys(self, magnitudes):
+        return np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+
+    @staticmethod
+    def _add_store(store, offset, counts):
+        store_offset, store_counts = store
+        if counts.size == 0:
+            return store
+        if store_counts.size == 0:
+            return offset, counts.astype(np.int64)
+        lo = min(store_offset, offset)
+        hi = max(store_offset + store_counts.size, offset + counts.size)
+        merged = np.zeros(hi - lo, dtype=np.int64)
+        merged[store_offset - lo:store_offset - lo + store_counts.size] += store_counts
+        merged[offset - lo:offset - lo + counts.size] += counts
+        return lo, merged
+
+    def _add_keys(self, store, keys):
+        if keys.size == 0:
+            return store
+        offset = int(keys.min())
+        counts = np.bincount(keys - offset)
+        return self._add_store(store, offset, counts)
+
+    def update(self, values):
+        """
+        Adds a 1-D array of valid values to the sketch.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        magnitudes = np.abs(values)
+        small = magnitudes < self.min_value
+        self.zero_count += int(small.sum())
+        positive = values[(values > 0) & ~small]
+        negative = -values[(values < 0) & ~small]
+        self.positive = self._add_keys(self.positive, self._keys(positive))
+        self.negative = self._add_keys(self.negative, self._keys(negative))
+
+    def merge(self, other):
+        if (other.relative_accuracy != self.relative_accuracy
+                or other.min_value != self.min_value):
+            raise ValueError("Cannot merge sketches with different parameters")
+        self.zero_count += other.zero_count
+        self.positive = self._add_store(self.positive, *other.positive)
+        self.negative = self._add_store(self.negative, *other.negative)
+        return self
+
+    def _bucket_value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """
+        Returns the approximate q-quantile (0 <= q <= 1), or None if empty.
+        """
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        neg_offset, neg_counts = self.negative
+        # Most negative values have the largest keys, so walk the store in reverse
+        neg_cum = np.cumsum(neg_counts[::-1])
+        neg_total = int(neg_cum[-1]) if neg_cum.size else 0
+        if rank < neg_total:
+            i = int(np.searchsorted(neg_cum, rank, side='right'))
+            key = neg_offset + neg_counts.size - 1 - i
+            return -self._bucket_value(key)
+        rank -= neg_total
+        if rank < self.zero_count:
+            return 0.0
+        rank -= self.zero_count
+        pos_offset, pos_counts = self.positive
+        pos_cum = np.cumsum(pos_counts)
+        i = int(np.searchsorted(pos_cum, rank, side='right'))
+        i = min(i, pos_counts.size - 1)
+        return self._bucket_value(pos_offset + i)
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'min_value': self.min_value,
+            'zero_count': self.zero_count,
+            'positive': [self.positive[0], self.positive[1].tolist()],
+            'negative': [self.negative[0], self.negative[1].tolist()]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'], data['min_value'])
+        sketch.zero_count = data['zero_count']
+        sketch.positive = (data['positive'][0], np.array(data['positive'][1], dtype=np.int64))
+        sketch.negative = (data['negative'][0], np.array(data['negative'][1], dtype=np.int64))
+        return sketch
+
+
+class FixedHistogram:
+    """
+    A histogram with fixed bins of `bin_width` between `lower` and `upper`, plus
+    underflow and overflow counts. Histograms with the same bins merge by addition.
+    """
+
+    def __init__(self, lower=-100.0, upper=1000.0, bin_width=1.0):
+        self.lower = lower
+        self.upper = upper
+        self.bin_width = bin_width
+        self.nbins = int(math.ceil((upper - lower) / bin_width))
+        self.counts = np.zeros(self.nbins, dtype=np.int64)
+        self.underflow = 0
+        self.overflow = 0
+
+    def update(self, values):
+        index = np.floor((np.asarray(values, dtype=np.float64) - self.lower) / self.bin_width)
+        index = index.astype(np.int64)
+        self.underflow += int((index < 0).sum())
+        self.overflow += int((index >= self.nbins).sum())
+        index = index[(index >= 0) & (index < self.nbins)]
+        self.counts += np.bincount(index, minlength=self.nbins)
+
+    def merge(self, other):
+        if (other.lower, other.upper, other.bin_width) != (self.lower, self.upper, self.bin_width):
+            raise ValueError("Cannot merge histograms with different bins")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+    def bin_edges(self):
+        return self.lower + self.bin_width * np.arange(self.nbins + 1)
+
+    def to_dict(self):
+        return {
+            'lower': self.lower,
+            'upper': self.upper,
+            'bin_width': self.bin_width,
+            'counts': self.counts.tolist(),
+            'underflow': self.underflow,
+            'overflow': self.overflow
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data['lower'], data['upper'], data['bin_width'])
+        histogram.counts = np.array(data['counts'], dtype=np.int64)
+        histogram.underflow = data['underflow']
+        histogram.overflow = data['overflow']
+        return histogram
+
+
+class StreamingStats:
+    """
+    Mergeable summary of a stream of raster blocks: pixel counts, min/max/mean/std,
+    a fixed-bin histogram and a quantile sketch.
+    """
+
+    def __init__(self, hist_lower=-100.0, hist_upper=1000.0, bin_width=1.0, relative_accuracy=0.001):
+        self.total_pixels = 0
+        self.valid_pixels = 0
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.histogram = FixedHistogram(hist_lower, hist_upper, bin_width)
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def update(self, block, nodata=None):
+        """
+        Adds one block of pixels. Pixels equal to nodata, and NaNs, are not valid.
+        """
+        block = np.asarray(block)
+        self.total_pixels += block.size
+        valid = ~np.isnan(block) if block.dtype.kind == 'f' else np.ones(block.shape, dtype=bool)
+        if nodata is not None and not (isinstance(nodata, float) and math.isnan(nodata)):
+            valid &= block != nodata
+        values = block[valid].astype(np.float64, copy=False)
+        if values.size == 0:
+            return
+        self.valid_pixels += values.size
+        self.sum += float(values.sum())
+        self.sum_sq += float(np.dot(values, values))
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.histogram.update(values)
+        self.sketch.update(values)
+
+    def merge(self, other):
+        self.total_pixels += other.total_pixels
+        self.valid_pixels += other.valid_pixels
+        self.sum += other.sum
+        self.sum_sq += other.sum_sq
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.histogram.merge(other.histogram)
+        self.sketch.merge(other.sketch)
+        return self
+
+    @property
+    def nodata_fraction(self):
+        if self.total_pixels == 0:
+            return 0.0
+        return 1.0 - self.valid_pixels / self.total_pixels
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    def summary(self):
+        """
+        Returns a flat dictionary of the headline statistics.
+        """
+        if self.valid_pixels:
+            mean = self.sum / self.valid_pixels
+            variance = max(self.sum_sq / self.valid_pixels - mean * mean, 0.0)
+            std = math.sqrt(variance)
+        else:
+            mean = std = None
+        return {
+            'valid_pixels': self.valid_pixels,
+            'nodata_fraction': self.nodata_fraction,
+            'min_value': self.min if self.valid_pixels else None,
+            'max_value': self.max if self.valid_pixels else None,
+            'mean': mean,
+            'std': std,
+            'p1': self.quantile(0.01),
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99)
+        }
+
+    def to_dict(self):
+        return {
+            'total_pixels': self.total_pixels,
+            'valid_pixels': self.valid_pixels,
+            'sum': self.sum,
+            'sum_sq': self.sum_sq,
+            'min': self.min if self.valid_pixels else None,
+            'max': self.max if self.valid_pixels else None,
+            'histogram': self.histogram.to_dict(),
+            'sketch': self.sketch.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.total_pixels = data['total_pixels']
+        stats.valid_pixels = data['valid_pixels']
+        stats.sum = data['sum']
+        stats.sum_sq = data['sum_sq']
+        stats.min = data['min'] if data['min'] is not None else math.inf
+        stats.max = data['max'] if data['max'] is not None else -math.inf
+        stats.histogram = FixedHistogram.from_dict(data['histogram'])
+        stats.sketch = QuantileSketch.from_dict(data['sketch'])
+        return stats
+
+
+def _stats_for_windows(file_path, windows, stats_kwargs, raster_cache=None):
+    # Each worker opens its own handle, rasterio datasets are not thread safe
+    stats = StreamingStats(**stats_kwargs)
+    with open_raster(file_path, raster_cache) as src:
+        for window in windows:
+            stats.update(src.read(1, window=window), src.nodata)
+    return stats
+
+
+def compute_file_stats(file_path, workers=None, raster_cache=None, **stats_kwargs):
+    """
+    Computes streaming statistics for one single-band raster.
+
+    Blocks are shared round-robin between `workers` threads, each building a
+    partial result that is merged at the end.
+
+    Args:
+        file_path (str): Path to the raster
+        workers (int): Number of threads (defaults to the CPU count)
+        raster_cache (str): Scratch cache directory to read decoded blocks from
+            (see raster_cache.py), or None to decode the file
+        **stats_kwargs: Histogram/sketch parameters passed to StreamingStats
+
+    Returns:
+        StreamingStats: Statistics for the whole file
+    """
+    workers = workers or os.cpu_count() or 1
+    with open_raster(file_path, raster_cache) as src:
+        windows = [window for _, window in src.block_windows(1)]
+
+    stats = StreamingStats(**stats_kwargs)
+    if not windows:
+        return stats
+    workers = min(workers, len(windows))
+    chunks = [windows[i::workers] for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for partial in executor.map(lambda chunk: _stats_for_windows(file_path, chunk, stats_kwargs, raster_cache), chunks):
+            stats.merge(partial)
+    return stats
+
+
+def analyze_collection(file_list, workers=None, cache_dir=None, raster_cache=None, **stats_kwargs):
+    """
+    Computes statistics for each file and merges them into collection statistics.
+
+    Args:
+        file_list (list): List of paths to rasters
+        workers (int): Threads used per file
+        cache_dir (str): Directory for cached per-file statistics, or None to disable
+        raster_cache (str): Scratch cache directory for decoded rasters, or None
+        **stats_kwargs: Histogram/sketch parameters passed to StreamingStats
+
+    Returns:
+        tuple: (list of per-file result dictionaries, merged StreamingStats)
+    """
+    cache = JsonCache(cache_dir, version=STATS_CACHE_VERSION) if cache_dir else None
+    results = []
+    collection = StreamingStats(**stats_kwargs)
+
+    for file_path in file_list:
+        try:
+            stats = None
+            if cache is not None:
+                cached = cache.get(file_path)
+                if cached is not None and cached.get('params') == stats_kwargs:
+                    stats = StreamingStats.from_dict(cached['stats'])
+            if stats is None:
+                stats = compute_file_stats(file_path, workers, raster_cache, **stats_kwargs)
+                if cache is not None:
+                    cache.put(file_path, {'params': stats_kwargs, 'stats': stats.to_dict()})
+
+            result = {'filename': os.path.basename(file_path)}
+            result.update(stats.summary())
+            results.append(result)
+            collection.merge(stats)
+            print(f"Processed: {os.path.basename(file_path)}")
+        except Exception as e:
+            print(f"Error processing {os.path.basename(file_path)}: {str(e)}")
+
+    return results, collection
+
+
+def _fmt(value):
+    return f"{value:.6f}" if value is not None else "N/A"
+
+
+def format_results(results, collection=None):
+    """
+    Returns the results as lines of a fixed-width text table.
+    """
+    lines = ["GeoTIFF Distribution Results", "-" * 150]
+    lines.append(f"{'Filename':<40} {'Valid Pixels':<14} {'Nodata %':<10} {'Min Value':<13} "
+                 f"{'P1':<13} {'P50':<13} {'P99':<13} {'Max Value':<13}")
+    lines.append("-" * 150)
+    rows = list(results)
+    if collection is not None:
+        rows.append(dict(filename='COLLECTION', **collection.summary()))
+    for result in rows:
+        lines.append(f"{result['filename']:<40} {result['valid_pixels']:<14} "
+                     f"{result['nodata_fraction'] * 100:<10.2f} {_fmt(result['min_value']):<13} "
+                     f"{_fmt(result['p1']):<13} {_fmt(result['p50']):<13} {_fmt(result['p99']):<13} "
+                     f"{_fmt(result['max_value']):<13}")
+    return lines
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compute streaming histograms and percentiles for GeoTIFF files.")
+    parser.add_argument("geotiff_folder", help="Path to the folder containing GeoTIFF files.")
+    parser.add_argument("--workers", type=int, default=None, help="Threads used per file.")
+    parser.add_argument("--cache", default=".stats-cache", help="Directory for cached per-file statistics.")
+    parser.add_argument("--output", default="distribution_results.txt", help="Text file for the results table.")
+    parser.add_argument("--raster-cache", default=None, help="Read through a scratch cache of decoded rasters.")
+    add_profile_argument(parser, "analysis")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    file_list = sorted(glob.glob(os.path.join(args.geotiff_folder, "*.tif")))
+    if not file_list:
+        print(f"No GeoTIFF files found in {args.geotiff_folder}")
+    else:
+        results, collection = analyze_collection(file_list, args.workers, args.cache, args.raster_cache)
+        lines = format_results(results, collection)
+        print("\n" + "\n".join(lines))
+        with open(args.output, 'w') as f:
+            f.write("\n".join(lines) + "\n")
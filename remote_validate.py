@@ -0,0 +1,443 @@
+'''
+Validates a COG as served over HTTP while keeping range requests to a minimum.
+The header region is fetched with one read, sized from the IFD header size that
+validate.py reports, and every IFD is parsed locally. For the full check, leader
+and trailer probes of all images are merged into a few large Range requests.
+The number of requests and bytes transferred are reported with the result.
+'''
+import sys
+import json
+import struct
+import bisect
+
+import numpy as np
+import requests
+
+import validate
+from byte_ranges import merge_ranges
+
+DEFAULT_HEADER_SIZE = 16384
+
+TIFFTAG_NEWSUBFILETYPE = 254
+TIFFTAG_IMAGEWIDTH = 256
+TIFFTAG_IMAGELENGTH = 257
+TIFFTAG_ROWSPERSTRIP = 278
+TIFFTAG_TILEWIDTH = 322
+TIFFTAG_TILELENGTH = 323
+
+FILETYPE_MASK = 0x4
+
+TIFF_TYPE_FORMATS = {1: "B", 3: "H", 4: "I", 13: "I", 16: "Q", 18: "Q"}
+
+
+class RemoteFile:
+    """
+    Byte-range reader over HTTP that caches what it has fetched and counts
+    requests and bytes transferred.
+    """
+
+    def __init__(self, url, session=None, ranges_per_request=1):
+        self.url = url
+        self.session = session or requests.Session()
+        self.ranges_per_request = max(1, ranges_per_request)
+        self.requests = 0
+        self.bytes_transferred = 0
+        self.size = None
+        # Fetched segments as sorted parallel lists of start offsets and data
+        self._starts = []
+        self._data = []
+
+    def _store(self, start, data):
+        i = bisect.bisect_left(self._starts, start)
+        self._starts.insert(i, start)
+        self._data.insert(i, data)
+
+    def _cached(self, offset, size):
+        # Every segment starting at or before offset may cover the range: a long
+        # one further back can reach past shorter ones that start later
+        for i in range(bisect.bisect_right(self._starts, offset) - 1, -1, -1):
+            start, data = self._starts[i], self._data[i]
+            if offset + size <= start + len(data):
+                return data[offset - start:offset - start + size]
+        return None
+
+    def _request(self, ranges):
+        header = "bytes=" + ",".join(f"{offset}-{offset + size - 1}" for offset, size in ranges)
+        response = self.session.get(self.url, headers={"Range": header})
+        self.requests += 1
+        self.bytes_transferred += len(response.content)
+        response.raise_for_status()
+
+        if response.status_code == 200:
+            self.size = len(response.content)
+            self._store(0, response.content)
+            return
+        content_type = response.headers.get("Content-Type", "")
+        if content_type.startswith("multipart/byteranges"):
+            boundary = content_type.split("boundary=")[1].strip('"').encode("ascii")
+            for part in response.content.split(b"--" + boundary):
+                head, sep, body = part.partition(b"\r\n\r\n")
+                if not sep:
+                    continue
+                for line in head.decode("latin1").split("\r\n"):
+                    if line.lower().startswith("content-range:"):
+                        self._store_content_range(line.split(":", 1)[1], body)
+        else:
+            self._store_content_range(response.headers["Content-Range"], response.content)
+
+    def _store_content_range(self, content_range, body):
+        # "bytes start-end/total"
+        span, _, total = content_range.strip()[len("bytes "):].partition("/")
+        start, end = (int(v) for v in span.split("-"))
+        if total != "*":
+            self.size = int(total)
+        self._store(start, body[:end - start + 1])
+
+    def prefetch(self, ranges, max_gap=0):
+        """
+        Fetches (offset, size) ranges not yet cached, merging those closer than
+        max_gap bytes and sending up to ranges_per_request ranges per request.
+        """
+        missing = [(offset, size) for offset, size in ranges if size > 0 and self._cached(offset, size) is None]
+        if self.size is not None:
+            missing = [(offset, min(size, self.size - offset)) for offset, size in missing if offset < self.size]
+        merged = [(offset, size) for offset, size, _ in merge_ranges(missing, max_gap)]
+        for i in range(0, len(merged), self.ranges_per_request):
+            self._request(merged[i:i + self.ranges_per_request])
+
+    def read(self, offset, size):
+        data = self._cached(offset, size)
+        if data is None:
+            self.prefetch([(offset, size)])
+            data = self._cached(offset, size)
+        return data if data is not None else b""
+
+    def read_probes(self, positions, length):
+        """
+        Same contract as validate.read_probes, served from the cache.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        out = np.zeros((positions.size, length), dtype=np.uint8)
+        complete = np.zeros(positions.size, dtype=bool)
+        for i, position in enumerate(positions):
+            data = self._cached(int(position), length)
+            if data is None:
+                data = self.read(int(position), length)
+            out[i, :len(data)] = np.frombuffer(data, dtype=np.uint8)
+            complete[i] = len(data) == length
+        return out, complete
+
+
+def parse_ifds(remote):
+    """
+    Parses the TIFF header and every IFD of a remote file.
+
+    Returns:
+        tuple: (endian, bigtiff, list of IFD dictionaries)
+    """
+    header = remote.read(0, 16)
+    if header[0:2] == b"II":
+        endian = "<"
+    elif header[0:2] == b"MM":
+        endian = ">"
+    else:
+        raise validate.ValidateCloudOptimizedGeoTIFFException("The file is not a GeoTIFF")
+    bigtiff = struct.unpack(endian + "H", header[2:4])[0] == 43
+    pointer_format = endian + ("Q" if bigtiff else "I")
+    entry_size = 20 if bigtiff else 12
+    count_size = 8 if bigtiff else 2
+    pointer_size = 8 if bigtiff else 4
+    next_offset = struct.unpack(pointer_format, header[8:16] if bigtiff else header[4:8])[0]
+
+    ifds = []
+    while next_offset and len(ifds) < 1000:
+        ifd_offset = next_offset
+        raw_count = remote.read(ifd_offset, count_size)
+        entry_count = struct.unpack(endian + ("Q" if bigtiff else "H"), raw_count)[0]
+        raw = remote.read(ifd_offset + count_size, entry_count * entry_size + pointer_size)
+        tags = {}
+        for i in range(entry_count):
+            entry = raw[i * entry_size:(i + 1) * entry_size]
+            tag, value_type = struct.unpack(endian + "HH", entry[0:4])
+            if bigtiff:
+                count = struct.unpack(endian + "Q", entry[4:12])[0]
+                value = entry[12:20]
+            else:
+                count = struct.unpack(endian + "I", entry[4:8])[0]
+                value = entry[8:12]
+            tags[tag] = (value_type, count, value)
+        next_pos = entry_count * entry_size
+        next_offset = struct.unpack(pointer_format, raw[next_pos:next_pos + pointer_size])[0]
+
+        def values(tag, default=None):
+            if tag not in tags:
+                return default
+            value_type, count, value = tags[tag]
+            fmt = TIFF_TYPE_FORMATS.get(value_type)
+            if fmt is None:
+                return default
+            size = count * struct.calcsize(fmt)
+            data = value[:size] if size <= len(value) else remote.read(struct.unpack(pointer_format, value)[0], size)
+            return np.frombuffer(data, dtype=np.dtype(endian + fmt)).astype(np.int64)
+
+        width = int(values(TIFFTAG_IMAGEWIDTH)[0])
+        height = int(values(TIFFTAG_IMAGELENGTH)[0])
+        if TIFFTAG_TILEWIDTH in tags:
+            block_size = (int(values(TIFFTAG_TILEWIDTH)[0]), int(values(TIFFTAG_TILELENGTH)[0]))
+            offsets = values(validate.TIFFTAG_TILEOFFSETS)
+            bytecounts = values(validate.TIFFTAG_TILEBYTECOUNTS)
+        else:
+            block_size = (width, int(values(TIFFTAG_ROWSPERSTRIP, [height])[0]))
+            offsets = values(validate.TIFFTAG_STRIPOFFSETS)
+            bytecounts = values(validate.TIFFTAG_STRIPBYTECOUNTS)
+
+        ifds.append({
+            'offset': ifd_offset,
+            'subfile_type': int(values(TIFFTAG_NEWSUBFILETYPE, [0])[0]),
+            'width': width,
+            'height': height,
+            'block_size': block_size,
+            'xblocks': (width + block_size[0] - 1) // block_size[0],
+            'offsets': offsets,
+            'bytecounts': bytecounts
+        })
+    return endian, bigtiff, ifds
+
+
+def read_structural_metadata(remote, bigtiff):
+    """
+    Reads GDAL's ghost area after the TIFF header.
+
+    Returns:
+        tuple: (metadata text or None, expected offset of the first IFD)
+    """
+    expected_ifd_pos = 16 if bigtiff else 8
+    pattern = "GDAL_STRUCTURAL_METADATA_SIZE=%06d bytes\n" % 0
+    got = remote.read(expected_ifd_pos, len(pattern)).decode("LATIN1")
+    if len(got) != len(pattern) or not got.startswith("GDAL_STRUCTURAL_METADATA_SIZE="):
+        return None, expected_ifd_pos
+    size = int(got[len("GDAL_STRUCTURAL_METADATA_SIZE="):][0:6])
+    extra_md = remote.read(expected_ifd_pos + len(pattern), size).decode("LATIN1")
+    expected_ifd_pos += len(pattern) + size
+    expected_ifd_pos += expected_ifd_pos % 2
+    return extra_md, expected_ifd_pos
+
+
+def validate_remote(url, header_size=None, full_check=True, max_gap=65536, ranges_per_request=1, session=None):
+    """
+    Checks a remote (Geo)TIFF for a cloud optimized structure.
+
+    Args:
+        url (str): HTTP(S) URL of the file
+        header_size (int): Bytes to fetch up front, e.g. the IFD header size
+            validate.py reported for the local copy. Defaults to 16 KB.
+        full_check (bool): Check tile leader/trailer bytes
+        max_gap (int): Probes closer than this are fetched in one range
+        ranges_per_request (int): Ranges sent per multi-range request
+        session: Optional requests session
+
+    Returns:
+        tuple: (warnings, errors, details, stats) where stats holds the request
+            count and bytes transferred
+    """
+    remote = RemoteFile(url, session, ranges_per_request)
+    remote.prefetch([(0, header_size or DEFAULT_HEADER_SIZE)])
+    header_requests = remote.requests
+
+    warnings = []
+    errors = []
+    details = {'ifd_offsets': {}, 'data_offsets': {}}
+
+    endian, bigtiff, ifds = parse_ifds(remote)
+    images = []
+    masks = {}
+    for ifd in ifds:
+        if ifd['subfile_type'] & FILETYPE_MASK:
+            if images:
+                masks[len(images) - 1] = ifd
+        else:
+            images.append(ifd)
+    if not images:
+        raise validate.ValidateCloudOptimizedGeoTIFFException("No image found in file")
+
+    main = images[0]
+    overviews = images[1:]
+    if main['width'] > 512 or main['height'] > 512:
+        if main['block_size'][0] == main['width'] and main['block_size'][0] > 1024:
+            errors += ["The file is greater than 512xH or Wx512, but is not tiled"]
+        if not overviews:
+            warnings += [
+                "The file is greater than 512xH or Wx512, it is recommended "
+                "to include internal overviews"
+            ]
+
+    block_order_row_major = False
+    block_leader_size_as_uint4 = False
+    block_trailer_last_4_bytes_repeated = False
+    mask_interleaved_with_imagery = False
+    if main['offset'] not in (8, 16):
+        extra_md, expected_ifd_pos = read_structural_metadata(remote, bigtiff)
+        if extra_md is not None:
+            block_order_row_major = "BLOCK_ORDER=ROW_MAJOR" in extra_md
+            block_leader_size_as_uint4 = "BLOCK_LEADER=SIZE_AS_UINT4" in extra_md
+            block_trailer_last_4_bytes_repeated = "BLOCK_TRAILER=LAST_4_BYTES_REPEATED" in extra_md
+            mask_interleaved_with_imagery = "MASK_INTERLEAVED_WITH_IMAGERY=YES" in extra_md
+            if "KNOWN_INCOMPATIBLE_EDITION=YES" in extra_md:
+                errors += ["KNOWN_INCOMPATIBLE_EDITION=YES is declared in the file"]
+        if expected_ifd_pos != main['offset']:
+            errors += [
+                "The offset of the main IFD should be %d. It is %d instead"
+                % (expected_ifd_pos, main['offset'])
+            ]
+
+    details['ifd_offsets']['main'] = main['offset']
+    for i, ovr in enumerate(overviews):
+        previous = images[i]
+        if ovr['width'] > previous['width'] or ovr['height'] > previous['height']:
+            if i == 0:
+                errors += ["First overview has larger dimension than main band"]
+            else:
+                errors += [
+                    "Overview of index %d has larger dimension than "
+                    "overview of index %d" % (i, i - 1)
+                ]
+        if ovr['block_size'][0] == ovr['width'] and ovr['block_size'][0] > 1024:
+            errors += ["Overview of index %d is not tiled" % i]
+        details['ifd_offsets']["overview_%d" % i] = ovr['offset']
+        if ovr['offset'] < previous['offset']:
+            if i == 0:
+                errors += [
+                    "The offset of the IFD for overview of index %d is %d, "
+                    "whereas it should be greater than the one of the main "
+                    "image, which is at byte %d" % (i, ovr['offset'], previous['offset'])
+                ]
+            else:
+                errors += [
+                    "The offset of the IFD for overview of index %d is %d, "
+                    "whereas it should be greater than the one of index %d, "
+                    "which is at byte %d" % (i, ovr['offset'], i - 1, previous['offset'])
+                ]
+
+    data_offsets = []
+    for i, image in enumerate(images):
+        nonzero = image['offsets'][image['offsets'] > 0]
+        block_offset = int(nonzero[0]) if nonzero.size else 0
+        data_offsets.append(block_offset)
+        details['data_offsets']['main' if i == 0 else "overview_%d" % (i - 1)] = block_offset
+
+    if data_offsets[-1] != 0 and data_offsets[-1] < images[-1]['offset']:
+        if overviews:
+            errors += ["The offset of the first block of the smallest overview should be after its IFD"]
+        else:
+            errors += ["The offset of the first block of the image should be after its IFD"]
+    for i in range(len(data_offsets) - 2, 0, -1):
+        if data_offsets[i] != 0 and data_offsets[i] < data_offsets[i + 1]:
+            errors += [
+                "The offset of the first block of overview of index %d should "
+                "be after the one of the overview of index %d" % (i - 1, i)
+            ]
+    if len(data_offsets) >= 2 and data_offsets[0] != 0 and data_offsets[0] < data_offsets[1]:
+        errors += [
+            "The offset of the first block of the main resolution image "
+            "should be after the one of the overview of index %d" % (len(overviews) - 1)
+        ]
+
+    if full_check and (
+        block_order_row_major
+        or block_leader_size_as_uint4
+        or block_trailer_last_4_bytes_repeated
+        or mask_interleaved_with_imagery
+    ):
+        checks = []
+        for i, image in enumerate(images):
+            name = "Main resolution image" if i == 0 else "Overview %d" % (i - 1)
+            mask = masks.get(i)
+            interleaved = mask if mask_interleaved_with_imagery and mask is not None else None
+            if interleaved is not None and interleaved['block_size'] != image['block_size']:
+                errors += [name + ": mask block size is different from its imagery band"]
+                interleaved = None
+            checks.append((name, image, interleaved))
+            if mask is not None:
+                mask_name = "Mask band of main resolution image" if i == 0 else "Mask band of overview %d" % (i - 1)
+                checks.append((mask_name, mask, None))
+
+        # Gather every leader/trailer probe first so they share merged requests
+        probes = []
+        for _, ifd, _ in checks:
+            has_data = ifd['offsets'] > 0
+            if block_leader_size_as_uint4:
+                probes += [(int(o) - 4, 4) for o in ifd['offsets'][has_data]]
+            if block_trailer_last_4_bytes_repeated:
+                tail = has_data & (ifd['bytecounts'] >= 4)
+                probes += [(int(o + c) - 4, 8) for o, c in zip(ifd['offsets'][tail], ifd['bytecounts'][tail])]
+        remote.prefetch(probes, max_gap)
+
+        for name, ifd, interleaved in checks:
+            validate.check_block_arrays(
+                name,
+                ifd['xblocks'],
+                ifd['offsets'],
+                ifd['bytecounts'],
+                interleaved['offsets'] if interleaved is not None else None,
+                errors,
+                block_order_row_major,
+                block_leader_size_as_uint4,
+                block_trailer_last_4_bytes_repeated,
+                remote.read_probes,
+            )
+
+    stats = {
+        'requests': remote.requests,
+        'header_requests': header_requests,
+        'bytes_transferred': remote.bytes_transferred,
+        'file_size': remote.size
+    }
+    return warnings, errors, details, stats
+
+
+def main(argv=sys.argv):
+    """Return 0 in case of success, 1 for failure."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Validate a COG served over HTTP with few range requests.")
+    parser.add_argument("url", help="URL of the COG.")
+    parser.add_argument("--header-size", type=int, default=None,
+                        help="Bytes to fetch up front (the IFD header size reported by validate.py).")
+    parser.add_argument("--full-check", choices=["yes", "no"], default="yes",
+                        help="Check tile leader/trailer bytes.")
+    parser.add_argument("--max-gap", type=int, default=65536, help="Largest gap merged into one range.")
+    parser.add_argument("--ranges-per-request", type=int, default=1,
+                        help="Ranges per multi-range request, if the server supports it.")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON.")
+    args = parser.parse_args(argv[1:])
+
+    try:
+        warnings, errors, details, stats = validate_remote(
+            args.url, args.header_size, args.full_check == "yes", args.max_gap, args.ranges_per_request)
+    except (validate.ValidateCloudOptimizedGeoTIFFException, requests.RequestException) as e:
+        print("%s is NOT a valid cloud optimized GeoTIFF : %s" % (args.url, str(e)))
+        return 1
+
+    if args.json:
+        print(json.dumps({'url': args.url, 'warnings': warnings, 'errors': errors,
+                          'details': details, 'stats': stats}, indent=2))
+    else:
+        if warnings:
+            print("The following warnings were found:")
+            for warning in warnings:
+                print(" - " + warning)
+            print("")
+        if errors:
+            print("%s is NOT a valid cloud optimized GeoTIFF." % args.url)
+            print("The following errors were found:")
+            for error in errors:
+                print(" - " + error)
+            print("")
+        else:
+            print("%s is a valid cloud optimized GeoTIFF" % args.url)
+        print("%d HTTP requests, %d bytes transferred" % (stats['requests'], stats['bytes_transferred']))
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,162 @@
+'''
+Reprojected COG outputs (EPSG:3857 web mercator, EPSG:2157 ITM) aligned to a
+tile matrix, so they can be served without reprojecting on every request.
+The output resolution is snapped to a level of the tile matrix and the extent
+to whole tiles of a few levels above it, so the COG blocks and the first
+overviews line up with the matrix tiles. The source is first wrapped in a
+warped VRT with a multi-threaded warper, an approximate transformer and a
+configurable warp memory limit; the COG driver then warps it chunk by chunk.
+'''
+import os
+import math
+from osgeo import gdal
+
+from gdal_profiles import apply_profile, add_profile_argument
+
+WEB_MERCATOR_HALF = 20037508.342789244
+# Tile matrices: top-left origin, tile size in pixels and the resolution of level 0.
+# Each level halves the resolution of the previous one.
+TILE_MATRICES = {
+    'EPSG:3857': {'origin': (-WEB_MERCATOR_HALF, WEB_MERCATOR_HALF), 'tile_size': 256,
+                  'level0_resolution': 2 * WEB_MERCATOR_HALF / 256},
+    # ITM has no common web tile matrix; use power-of-two resolutions (level 12 is 1 m)
+    # on a grid anchored at the projection's false origin
+    'EPSG:2157': {'origin': (0.0, 0.0), 'tile_size': 512, 'level0_resolution': 4096.0},
+}
+DEFAULT_NODATA = -9999.0
+
+
+def matrix_level(tile_matrix, resolution):
+    """
+    Returns the coarsest tile matrix level at least as fine as resolution, so
+    the elevations are never downsampled.
+    """
+    return max(0, int(math.ceil(math.log2(tile_matrix['level0_resolution'] / resolution) - 1e-6)))
+
+
+def snap_bounds(bounds, origin, span):
+    """
+    Expands (minx, miny, maxx, maxy) to whole multiples of span from a top-left origin.
+    """
+    minx, miny, maxx, maxy = bounds
+    origin_x, origin_y = origin
+    return (
+        origin_x + math.floor((minx - origin_x) / span) * span,
+        origin_y - math.ceil((origin_y - miny) / span) * span,
+        origin_x + math.ceil((maxx - origin_x) / span) * span,
+        origin_y - math.floor((origin_y - maxy) / span) * span
+    )
+
+
+def aligned_grid(src_path, dst_srs, aligned_levels=4, src_srs=None):
+    """
+    Works out the output resolution and extent of src_path warped to dst_srs.
+
+    Args:
+        src_path (str): Source raster or VRT
+        dst_srs (str): Key of TILE_MATRICES
+        aligned_levels (int): Overview levels that should also line up with the matrix
+        src_srs (str): Source CRS, if the source does not have one set
+
+    Returns:
+        tuple: (resolution, (minx, miny, maxx, maxy))
+    """
+    tile_matrix = TILE_MATRICES[dst_srs]
+    # Let GDAL suggest the warped resolution and extent first
+    suggested = gdal.Warp('', src_path, options=gdal.WarpOptions(format='VRT', srcSRS=src_srs, dstSRS=dst_srs))
+    gt = suggested.GetGeoTransform()
+    bounds = (gt[0], gt[3] + gt[5] * suggested.RasterYSize, gt[0] + gt[1] * suggested.RasterXSize, gt[3])
+    suggested = None
+
+    level = matrix_level(tile_matrix, gt[1])
+    resolution = tile_matrix['level0_resolution'] / (2 ** level)
+    span = tile_matrix['tile_size'] * resolution * (2 ** min(aligned_levels, level))
+    return resolution, snap_bounds(bounds, tile_matrix['origin'], span)
+
+
+def reproject_to_cog(src_path, output_path, dst_srs, warp_memory_mb=512, num_threads='ALL_CPUS',
+                     resampling='bilinear', error_threshold=0.125, aligned_levels=4,
+                     creation_options=("COMPRESS=DEFLATE", "BIGTIFF=YES"), src_srs=None):
+    """
+    Writes src_path as a COG in dst_srs, aligned to the tile matrix of dst_srs.
+
+    Args:
+        src_path (str): Source raster or VRT
+        output_path (str): Output COG
+        dst_srs (str): 'EPSG:3857' or 'EPSG:2157'
+        warp_memory_mb (int): Warp buffer size in MB
+        num_threads (str): Warper threads, e.g. 'ALL_CPUS' or '4'
+        resampling (str): Warp resampling
+        error_threshold (float): Pixel error allowed by the approximate transformer
+        aligned_levels (int): Overview levels that should line up with the matrix
+        creation_options (tuple): COG creation options besides BLOCKSIZE and NUM_THREADS
+        src_srs (str): Source CRS, if the source does not have one set (e.g. 'EPSG:29902')
+
+    Returns:
+        str: output_path
+    """
+    tile_matrix = TILE_MATRICES[dst_srs]
+    resolution, bounds = aligned_grid(src_path, dst_srs, aligned_levels, src_srs)
+
+    src = gdal.Open(src_path)
+    has_nodata = src.GetRasterBand(1).GetNoDataValue() is not None
+    src = None
+
+    vrt_path = f"/vsimem/warp/{os.path.basename(output_path)}.vrt"
+    warp_options = gdal.WarpOptions(
+        format='VRT',
+        srcSRS=src_srs,
+        dstSRS=dst_srs,
+        xRes=resolution,
+        yRes=resolution,
+        outputBounds=bounds,
+        resampleAlg=resampling,
+        errorThreshold=error_threshold,
+        multithread=True,
+        warpMemoryLimit=warp_memory_mb,
+        warpOptions=[f"NUM_THREADS={num_threads}"],
+        dstNodata=None if has_nodata else DEFAULT_NODATA
+    )
+    vrt = gdal.Warp(vrt_path, src_path, options=warp_options)
+    vrt = None
+
+    translate_options = gdal.TranslateOptions(
+        format='COG',
+        creationOptions=list(creation_options) + [f"BLOCKSIZE={tile_matrix['tile_size']}",
+                                                  f"NUM_THREADS={num_threads}"]
+    )
+    try:
+        gdal.Translate(output_path, vrt_path, options=translate_options)
+    finally:
+        gdal.Unlink(vrt_path)
+    return output_path
+
+
+def projected_output_path(output_dir, file_name, dst_srs):
+    """
+    Reprojected outputs go in a folder per CRS, e.g. output/EPSG_3857/name.tif.
+    """
+    folder = os.path.join(output_dir, dst_srs.replace(':', '_'))
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, file_name)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a raster as a tile-matrix-aligned COG in another CRS.")
+    parser.add_argument("input", help="Source raster.")
+    parser.add_argument("output", help="Output COG.")
+    parser.add_argument("--srs", choices=sorted(TILE_MATRICES), default="EPSG:3857")
+    parser.add_argument("--warp-memory", type=int, default=512, help="Warp buffer size in MB.")
+    parser.add_argument("--threads", default="ALL_CPUS", help="Warper threads.")
+    parser.add_argument("--resampling", default="bilinear")
+    parser.add_argument("--aligned-levels", type=int, default=4, help="Overview levels aligned to the tile matrix.")
+    parser.add_argument("--source-srs", default=None, help="Source CRS if the input has none, e.g. EPSG:29902.")
+    add_profile_argument(parser, "bulk-convert")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    reproject_to_cog(args.input, args.output, args.srs, args.warp_memory, args.threads, args.resampling,
+                     aligned_levels=args.aligned_levels, src_srs=args.source_srs)
+    print(f"Converted to {args.srs} COG: {args.output}")
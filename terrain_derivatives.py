@@ -0,0 +1,313 @@
+'''
+Slope, aspect and hillshade of the DTM/DSM COGs, computed tile by tile.
+Each source block is read with a one-pixel halo and run through vectorised
+Horn kernels (as used by gdaldem), across a process pool. The derivative COG
+uses the same block size as its source, so its tiles line up with the source
+tiles. A digest of every compressed source block is kept next to the output,
+so a rerun only recomputes the blocks whose neighbourhood changed and copies
+the rest from the previous output.
+'''
+import os
+import sys
+import glob
+import json
+import math
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.shutil import copy as rio_copy
+from rasterio.windows import Window
+
+from gdal_profiles import apply_profile, add_profile_argument
+from raster_cache import open_raster
+
+DERIVATIVES = ('slope', 'aspect', 'hillshade')
+FLOAT_NODATA = -9999.0
+BLOCKS_MANIFEST_VERSION = 1
+DEFAULT_TILE_SIZE = 512
+
+
+def _neighbourhood(padded, compute_edges=False):
+    """
+    Returns the nine 3x3 neighbourhood views (a..i, row by row) of a padded array.
+    With compute_edges, missing neighbours take the centre value.
+    """
+    height, width = padded.shape[0] - 2, padded.shape[1] - 2
+    views = [padded[r:r + height, c:c + width] for r in range(3) for c in range(3)]
+    if compute_edges:
+        centre = views[4]
+        views = [np.where(np.isnan(view), centre, view) for view in views]
+    return views
+
+
+def horn_gradients(padded, res_x, res_y, z_factor=1.0, compute_edges=False):
+    """
+    Horn's 3x3 gradients of an elevation array padded with a one-pixel halo.
+    NaN marks nodata; any output pixel with a NaN neighbour is NaN unless
+    compute_edges is set.
+
+    Returns:
+        tuple: (dz/dx towards east, dz/dy towards south), both (height-2, width-2)
+    """
+    a, b, c, d, e, f, g, h, i = _neighbourhood(padded.astype(np.float64) * z_factor, compute_edges)
+    dzdx = ((c + 2 * f + i) - (a + 2 * d + g)) / (8.0 * res_x)
+    dzdy = ((g + 2 * h + i) - (a + 2 * b + c)) / (8.0 * res_y)
+    return dzdx, dzdy
+
+
+def slope(padded, res_x, res_y, z_factor=1.0, compute_edges=False):
+    """
+    Slope in degrees.
+    """
+    dzdx, dzdy = horn_gradients(padded, res_x, res_y, z_factor, compute_edges)
+    return np.degrees(np.arctan(np.hypot(dzdx, dzdy))).astype(np.float32)
+
+
+def aspect(padded, res_x, res_y, z_factor=1.0, compute_edges=False):
+    """
+    Direction the slope faces, in degrees clockwise from north. Flat areas are NaN.
+    """
+    dzdx, dzdy = horn_gradients(padded, res_x, res_y, z_factor, compute_edges)
+    # Downslope direction is minus the gradient; dzdy points south
+    result = np.degrees(np.arctan2(-dzdx, dzdy)) % 360.0
+    result[(dzdx == 0) & (dzdy == 0)] = np.nan
+    return result.astype(np.float32)
+
+
+def hillshade(padded, res_x, res_y, azimuth=315.0, altitude=45.0, z_factor=1.0, compute_edges=False):
+    """
+    Lambertian hillshade in 0..1, the cosine between the surface normal and the sun.
+    """
+    dzdx, dzdy = horn_gradients(padded, res_x, res_y, z_factor, compute_edges)
+    east, north = dzdx, -dzdy
+    azimuth = math.radians(azimuth)
+    altitude = math.radians(altitude)
+    shade = (math.sin(altitude)
+             - east * math.sin(azimuth) * math.cos(altitude)
+             - north * math.cos(azimuth) * math.cos(altitude)) / np.sqrt(1 + east ** 2 + north ** 2)
+    return np.clip(shade, 0, 1).astype(np.float32)
+
+
+def derive(padded, derivative, res_x, res_y, azimuth=315.0, altitude=45.0, z_factor=1.0, compute_edges=False):
+    """
+    Computes one derivative and encodes it for output: float32 with FLOAT_NODATA
+    for slope and aspect, uint8 1..255 with 0 as nodata for hillshade.
+    """
+    if derivative == 'slope':
+        result = slope(padded, res_x, res_y, z_factor, compute_edges)
+    elif derivative == 'aspect':
+        result = aspect(padded, res_x, res_y, z_factor, compute_edges)
+    elif derivative == 'hillshade':
+        shade = hillshade(padded, res_x, res_y, azimuth, altitude, z_factor, compute_edges)
+        return np.where(np.isnan(shade), 0, 1 + np.round(np.nan_to_num(shade) * 254)).astype(np.uint8)
+    else:
+        raise ValueError(f"Unknown derivative: {derivative}")
+    return np.where(np.isnan(result), FLOAT_NODATA, result).astype(np.float32)
+
+
+def output_profile(derivative):
+    if derivative == 'hillshade':
+        return {'dtype': 'uint8', 'nodata': 0}
+    return {'dtype': 'float32', 'nodata': FLOAT_NODATA}
+
+
+def block_grid(src):
+    """
+    Returns (tile_x, tile_y, columns, rows) of the processing grid: the source
+    blocks when the source is tiled with square blocks, otherwise DEFAULT_TILE_SIZE.
+    """
+    block_y, block_x = src.block_shapes[0]
+    if block_x != block_y or block_x == src.width:
+        block_x = block_y = DEFAULT_TILE_SIZE
+    return block_x, block_y, (src.width + block_x - 1) // block_x, (src.height + block_y - 1) // block_y
+
+
+def block_window(src, tile_x, tile_y, row, col):
+    return Window(col * tile_x, row * tile_y,
+                  min(tile_x, src.width - col * tile_x), min(tile_y, src.height - row * tile_y))
+
+
+def source_block_digests(src_path):
+    """
+    Digests of each compressed source block, read straight from the file.
+
+    Returns:
+        dict: "row_col" -> sha1 hex digest, or None if the source is not tiled
+            the way the processing grid expects
+    """
+    digests = {}
+    with rasterio.open(src_path) as src:
+        tile_x, tile_y, columns, rows = block_grid(src)
+        if (tile_y, tile_x) != tuple(src.block_shapes[0]):
+            return None
+        with open(src_path, 'rb') as f:
+            for row in range(rows):
+                for col in range(columns):
+                    offset = src.get_tag_item(f"BLOCK_OFFSET_{col}_{row}", 'TIFF', bidx=1)
+                    size = src.get_tag_item(f"BLOCK_SIZE_{col}_{row}", 'TIFF', bidx=1)
+                    digest = hashlib.sha1()
+                    if offset and size:
+                        f.seek(int(offset))
+                        digest.update(f.read(int(size)))
+                    digests[f"{row}_{col}"] = digest.hexdigest()
+    return digests
+
+
+def changed_blocks(old_digests, new_digests, columns, rows):
+    """
+    Blocks whose own digest or a neighbour's digest changed; the halo means a
+    change in one block also changes its neighbours' edge pixels.
+    """
+    changed = {key for key, digest in new_digests.items() if old_digests.get(key) != digest}
+    result = set()
+    for key in changed:
+        row, col = map(int, key.split("_"))
+        for r in range(max(0, row - 1), min(rows, row + 2)):
+            for c in range(max(0, col - 1), min(columns, col + 2)):
+                result.add((r, c))
+    return result
+
+
+def _derive_blocks(src_path, derivative, blocks, options, raster_cache=None):
+    results = []
+    with open_raster(src_path, raster_cache) as src:
+        tile_x, tile_y, _, _ = block_grid(src)
+        res_x, res_y = src.res
+        nodata = src.nodata
+        for row, col in blocks:
+            window = block_window(src, tile_x, tile_y, row, col)
+            halo = Window(window.col_off - 1, window.row_off - 1, window.width + 2, window.height + 2)
+            fill = nodata if nodata is not None else 0
+            padded = src.read(1, window=halo, boundless=True, fill_value=fill).astype(np.float64)
+            if nodata is not None:
+                padded[padded == nodata] = np.nan
+            # Outside the raster is nodata even if the source has no nodata value
+            if halo.row_off < 0:
+                padded[0, :] = np.nan
+            if halo.col_off < 0:
+                padded[:, 0] = np.nan
+            if window.row_off + window.height >= src.height:
+                padded[-1, :] = np.nan
+            if window.col_off + window.width >= src.width:
+                padded[:, -1] = np.nan
+            results.append(((row, col), derive(padded, derivative, res_x, res_y, **options)))
+    return results
+
+
+def generate_derivative(src_path, output_path, derivative, workers=None, blocks_per_task=16, incremental=True,
+                        azimuth=315.0, altitude=45.0, z_factor=1.0, compute_edges=False, compress='DEFLATE',
+                        raster_cache=None):
+    """
+    Writes one terrain derivative of a DTM/DSM as a COG.
+
+    Args:
+        src_path (str): Source elevation raster
+        output_path (str): Output COG
+        derivative (str): 'slope', 'aspect' or 'hillshade'
+        workers (int): Process pool size (defaults to the CPU count)
+        blocks_per_task (int): Blocks handed to a worker at a time
+        incremental (bool): Reuse unchanged blocks of an existing output
+        azimuth (float): Sun azimuth for hillshade, degrees clockwise from north
+        altitude (float): Sun altitude for hillshade, degrees
+        z_factor (float): Vertical exaggeration
+        compute_edges (bool): Compute values next to nodata and at the raster
+            edge instead of leaving them as nodata
+        compress (str): Output compression
+        raster_cache (str): Scratch cache directory; the source is decoded into
+            it once and the workers read the memory map (see raster_cache.py)
+
+    Returns:
+        dict: blocks_total and blocks_computed
+    """
+    manifest_path = output_path + ".blocks.json"
+    options = {'azimuth': azimuth, 'altitude': altitude, 'z_factor': z_factor, 'compute_edges': compute_edges}
+    digests = source_block_digests(src_path)
+
+    with rasterio.open(src_path) as src:
+        tile_x, tile_y, columns, rows = block_grid(src)
+        profile = {
+            'driver': 'GTiff', 'width': src.width, 'height': src.height, 'count': 1,
+            'crs': src.crs, 'transform': src.transform,
+            'tiled': True, 'blockxsize': tile_x, 'blockysize': tile_y
+        }
+        profile.update(output_profile(derivative))
+        windows = {(row, col): block_window(src, tile_x, tile_y, row, col)
+                   for row in range(rows) for col in range(columns)}
+
+    todo = set(windows)
+    reuse = False
+    if incremental and digests is not None and os.path.exists(output_path) and os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == BLOCKS_MANIFEST_VERSION and manifest.get('options') == options \
+                and manifest.get('derivative') == derivative and manifest.get('grid') == [tile_x, tile_y, columns, rows]:
+            todo = changed_blocks(manifest['digests'], digests, columns, rows)
+            reuse = True
+
+    temp_path = output_path + ".tmp.tif"
+    blocks = sorted(todo)
+    if raster_cache and blocks:
+        # Decode once here so the workers all map the same array
+        open_raster(src_path, raster_cache).close()
+    with rasterio.open(temp_path, 'w', **profile) as dst:
+        if reuse:
+            with rasterio.open(output_path) as previous:
+                for key in sorted(set(windows) - todo):
+                    dst.write(previous.read(1, window=windows[key]), 1, window=windows[key])
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_derive_blocks, src_path, derivative, blocks[i:i + blocks_per_task], options,
+                                       raster_cache)
+                       for i in range(0, len(blocks), blocks_per_task)]
+            for future in futures:
+                for key, data in future.result():
+                    dst.write(data, 1, window=windows[key])
+
+    resampling = 'NEAREST' if derivative == 'aspect' else 'AVERAGE'
+    rio_copy(temp_path, output_path, driver='COG', BLOCKSIZE=tile_x, COMPRESS=compress,
+             OVERVIEW_RESAMPLING=resampling)
+    os.remove(temp_path)
+
+    if digests is not None:
+        with open(manifest_path, 'w') as f:
+            json.dump({'version': BLOCKS_MANIFEST_VERSION, 'derivative': derivative, 'options': options,
+                       'grid': [tile_x, tile_y, columns, rows], 'digests': digests}, f)
+    return {'blocks_total': len(windows), 'blocks_computed': len(blocks)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Tiled slope, aspect and hillshade of DTM/DSM COGs.")
+    parser.add_argument("input", help="Elevation COG, or a folder of them.")
+    parser.add_argument("output_dir", help="Folder for the derivative COGs.")
+    parser.add_argument("--derivatives", nargs="+", choices=DERIVATIVES, default=['hillshade'])
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    parser.add_argument("--azimuth", type=float, default=315.0)
+    parser.add_argument("--altitude", type=float, default=45.0)
+    parser.add_argument("--z-factor", type=float, default=1.0)
+    parser.add_argument("--compute-edges", action="store_true", help="Compute values at nodata and raster edges.")
+    parser.add_argument("--full", action="store_true", help="Recompute every block, ignoring previous outputs.")
+    parser.add_argument("--raster-cache", default=None, help="Read through a scratch cache of decoded rasters.")
+    add_profile_argument(parser, "bulk-convert")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    inputs = sorted(glob.glob(os.path.join(args.input, "*.tif"))) if os.path.isdir(args.input) else [args.input]
+    os.makedirs(args.output_dir, exist_ok=True)
+    failed = False
+    for src_path in inputs:
+        stem = os.path.splitext(os.path.basename(src_path))[0]
+        for derivative in args.derivatives:
+            output_path = os.path.join(args.output_dir, f"{stem}_{derivative}.tif")
+            try:
+                result = generate_derivative(src_path, output_path, derivative, args.workers, incremental=not args.full,
+                                             azimuth=args.azimuth, altitude=args.altitude, z_factor=args.z_factor,
+                                             compute_edges=args.compute_edges, raster_cache=args.raster_cache)
+                print(f"{output_path}: {result['blocks_computed']} of {result['blocks_total']} blocks computed")
+            except Exception as e:
+                failed = True
+                print(f"Error processing {src_path} ({derivative}): {str(e)}")
+    if failed:
+        sys.exit(1)
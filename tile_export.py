@@ -0,0 +1,343 @@
+'''
+Exports a pre-rendered web mercator tile pyramid of the COG collection to a
+single MBTiles or PMTiles archive, for offline and CDN delivery.
+Tiles over the collection's footprints are rendered in a process pool with the
+tile server's renderer (which reads only the source blocks each tile needs).
+Empty tiles are not stored and identical tiles are stored once. Tiles are
+written to an MBTiles database as they arrive, along with a record of every
+finished tile, so an interrupted export resumes where it stopped. A PMTiles
+archive is written from that database in one pass at the end.
+'''
+import os
+import sys
+import gzip
+import json
+import math
+import struct
+import sqlite3
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from rasterio.warp import transform_bounds
+from shapely.geometry import box
+
+from cog_index import CogIndex, DEFAULT_INDEX_PATH, INDEX_EPSG
+from tile_server import TileRenderer, tile_bounds
+from gdal_profiles import apply_profile, add_profile_argument
+
+MBTILES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT);
+CREATE UNIQUE INDEX IF NOT EXISTS metadata_name ON metadata (name);
+CREATE TABLE IF NOT EXISTS map (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT);
+CREATE UNIQUE INDEX IF NOT EXISTS map_index ON map (zoom_level, tile_column, tile_row);
+CREATE TABLE IF NOT EXISTS images (tile_data BLOB, tile_id TEXT);
+CREATE UNIQUE INDEX IF NOT EXISTS images_id ON images (tile_id);
+CREATE VIEW IF NOT EXISTS tiles AS
+    SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column, map.tile_row AS tile_row,
+           images.tile_data AS tile_data
+    FROM map JOIN images ON images.tile_id = map.tile_id;
+CREATE TABLE IF NOT EXISTS export_done (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER);
+CREATE UNIQUE INDEX IF NOT EXISTS export_done_index ON export_done (zoom_level, tile_column, tile_row);
+"""
+
+PMTILES_HEADER_SIZE = 127
+PMTILES_ROOT_MAX = 16384 - PMTILES_HEADER_SIZE
+PMTILES_COMPRESSION_NONE = 1
+PMTILES_COMPRESSION_GZIP = 2
+PMTILES_TILE_PNG = 2
+
+
+def zxy_to_tileid(z, x, y):
+    """
+    PMTiles tile id: tiles of lower zooms first, then the Hilbert curve index.
+    """
+    tile_id = ((1 << (z * 2)) - 1) // 3
+    for a in range(z - 1, -1, -1):
+        s = 1 << a
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        tile_id += s * s * ((3 * rx) ^ ry)
+        if ry == 0:
+            if rx == 1:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+        x &= s - 1
+        y &= s - 1
+    return tile_id
+
+
+def lonlat_to_tile(lon, lat, z):
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    lat = max(min(lat, 85.0511), -85.0511)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def pyramid_tiles(index, min_zoom, max_zoom, name_contains=None):
+    """
+    Tiles of each zoom level that intersect a footprint in the index, in
+    PMTiles tile id order so neighbouring tiles are rendered together.
+    """
+    geometries = [geometry for entry, geometry in zip(index.entries, index.geometries)
+                  if not name_contains or name_contains in entry['filename']]
+    lonlat_bounds = [transform_bounds(f'EPSG:{INDEX_EPSG}', 'EPSG:4326', *geometry.bounds) for geometry in geometries]
+    tiles = set()
+    for z in range(min_zoom, max_zoom + 1):
+        for geometry, (west, south, east, north) in zip(geometries, lonlat_bounds):
+            x0, y0 = lonlat_to_tile(west, north, z)
+            x1, y1 = lonlat_to_tile(east, south, z)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    if (z, x, y) in tiles:
+                        continue
+                    tile_box = box(*transform_bounds('EPSG:3857', f'EPSG:{INDEX_EPSG}', *tile_bounds(z, x, y)))
+                    if tile_box.intersects(geometry):
+                        tiles.add((z, x, y))
+    return sorted(tiles, key=lambda tile: zxy_to_tileid(*tile))
+
+
+_renderer = None
+
+
+def _init_worker(index_path, name_contains, block_cache_bytes):
+    global _renderer
+    _renderer = TileRenderer(CogIndex.load(index_path), block_cache_bytes=block_cache_bytes, tile_cache_bytes=0,
+                             name_contains=name_contains)
+
+
+def _render_tiles(tiles, style, vmin, vmax):
+    return [(z, x, y, _renderer.render(style, z, x, y, vmin, vmax)) for z, x, y in tiles]
+
+
+def open_mbtiles(path):
+    connection = sqlite3.connect(path)
+    connection.executescript(MBTILES_SCHEMA)
+    return connection
+
+
+def write_rendered(connection, rendered):
+    """
+    Stores rendered tiles, each distinct image once, and marks them finished.
+    """
+    for z, x, y, png in rendered:
+        tms_row = (2 ** z) - 1 - y
+        if png:
+            tile_id = hashlib.sha1(png).hexdigest()
+            connection.execute("INSERT OR IGNORE INTO images (tile_data, tile_id) VALUES (?, ?)", (png, tile_id))
+            connection.execute("INSERT OR REPLACE INTO map VALUES (?, ?, ?, ?)", (z, x, tms_row, tile_id))
+        connection.execute("INSERT OR IGNORE INTO export_done VALUES (?, ?, ?)", (z, x, tms_row))
+    connection.commit()
+
+
+def export_mbtiles(index_path, mbtiles_path, min_zoom, max_zoom, style='hillshade', vmin=0.0, vmax=800.0,
+                   name_contains=None, workers=None, tiles_per_task=64, block_cache_bytes=256 * 1024 * 1024):
+    """
+    Renders the tile pyramid into an MBTiles database, skipping finished tiles.
+
+    Args:
+        index_path (str): Index built with cog_index.py
+        mbtiles_path (str): MBTiles file, created or resumed
+        min_zoom (int): Lowest zoom level
+        max_zoom (int): Highest zoom level
+        style (str): 'elevation' or 'hillshade'
+        vmin (float): Elevation at the start of the colour ramp
+        vmax (float): Elevation at the end of the colour ramp
+        name_contains (str): Only use COGs whose filename contains this, e.g. "DTM"
+        workers (int): Process pool size (defaults to the CPU count)
+        tiles_per_task (int): Tiles handed to a worker at a time
+        block_cache_bytes (int): Decoded block cache size of each worker
+
+    Returns:
+        dict: tiles_total, tiles_rendered, tiles_stored and images_stored
+    """
+    index = CogIndex.load(index_path)
+    tiles = pyramid_tiles(index, min_zoom, max_zoom, name_contains)
+
+    connection = open_mbtiles(mbtiles_path)
+    done = {(z, x, (2 ** z) - 1 - tms_row)
+            for z, x, tms_row in connection.execute("SELECT zoom_level, tile_column, tile_row FROM export_done")}
+    todo = [tile for tile in tiles if tile not in done]
+    print(f"{len(tiles)} tiles in the pyramid, {len(tiles) - len(todo)} already exported")
+
+    west, south, east, north = 180.0, 90.0, -180.0, -90.0
+    for geometry in index.geometries:
+        bounds = transform_bounds(f'EPSG:{INDEX_EPSG}', 'EPSG:4326', *geometry.bounds)
+        west, south = min(west, bounds[0]), min(south, bounds[1])
+        east, north = max(east, bounds[2]), max(north, bounds[3])
+    metadata = {
+        'name': f"better-open-data.com {style}",
+        'format': 'png',
+        'type': 'baselayer',
+        'minzoom': str(min_zoom),
+        'maxzoom': str(max_zoom),
+        'bounds': f"{west},{south},{east},{north}",
+        'center': f"{(west + east) / 2},{(south + north) / 2},{min_zoom}"
+    }
+    connection.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)", metadata.items())
+    connection.commit()
+
+    chunks = [todo[i:i + tiles_per_task] for i in range(0, len(todo), tiles_per_task)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(index_path, name_contains, block_cache_bytes)) as executor:
+        futures = [executor.submit(_render_tiles, chunk, style, vmin, vmax) for chunk in chunks]
+        for i, future in enumerate(futures):
+            write_rendered(connection, future.result())
+            if (i + 1) % 10 == 0 or i + 1 == len(futures):
+                print(f"Exported {min(len(todo), (i + 1) * tiles_per_task)} of {len(todo)} tiles")
+
+    stored = connection.execute("SELECT COUNT(*) FROM map").fetchone()[0]
+    images = connection.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    connection.close()
+    return {'tiles_total': len(tiles), 'tiles_rendered': len(todo), 'tiles_stored': stored, 'images_stored': images}
+
+
+def _write_varint(buffer, value):
+    while value >= 0x80:
+        buffer.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def serialize_directory(entries):
+    """
+    Encodes PMTiles directory entries (tile_id, offset, length, run_length), gzipped.
+    """
+    buffer = bytearray()
+    _write_varint(buffer, len(entries))
+    last_id = 0
+    for tile_id, _, _, _ in entries:
+        _write_varint(buffer, tile_id - last_id)
+        last_id = tile_id
+    for _, _, _, run_length in entries:
+        _write_varint(buffer, run_length)
+    for _, _, length, _ in entries:
+        _write_varint(buffer, length)
+    for i, (_, offset, _, _) in enumerate(entries):
+        previous = entries[i - 1] if i > 0 else None
+        if previous is not None and offset == previous[1] + previous[2]:
+            _write_varint(buffer, 0)
+        else:
+            _write_varint(buffer, offset + 1)
+    return gzip.compress(bytes(buffer), mtime=0)
+
+
+def build_directories(entries):
+    """
+    Returns (root directory, leaf directories) bytes, moving entries into leaf
+    directories until the root fits in the first 16 KiB of the archive.
+    """
+    root = serialize_directory(entries)
+    if len(root) <= PMTILES_ROOT_MAX:
+        return root, b""
+    leaf_size = 4096
+    while True:
+        root_entries = []
+        leaves = bytearray()
+        for i in range(0, len(entries), leaf_size):
+            leaf = serialize_directory(entries[i:i + leaf_size])
+            root_entries.append((entries[i][0], len(leaves), len(leaf), 0))
+            leaves += leaf
+        root = serialize_directory(root_entries)
+        if len(root) <= PMTILES_ROOT_MAX:
+            return root, bytes(leaves)
+        leaf_size *= 2
+
+
+def mbtiles_to_pmtiles(mbtiles_path, pmtiles_path):
+    """
+    Writes a clustered PMTiles v3 archive from an MBTiles database. Tiles are
+    written in tile id order; repeated images are stored once and consecutive
+    tiles with the same image share one run-length entry.
+    """
+    connection = sqlite3.connect(mbtiles_path)
+    metadata = dict(connection.execute("SELECT name, value FROM metadata"))
+    rows = connection.execute("SELECT zoom_level, tile_column, tile_row, tile_id FROM map").fetchall()
+    tiles = sorted((zxy_to_tileid(z, x, (2 ** z) - 1 - tms_row), image_id) for z, x, tms_row, image_id in rows)
+
+    temp_data_path = pmtiles_path + ".data.tmp"
+    entries = []
+    offsets = {}
+    data_length = 0
+    with open(temp_data_path, 'wb') as data_file:
+        for tile_id, image_id in tiles:
+            if image_id not in offsets:
+                png = connection.execute("SELECT tile_data FROM images WHERE tile_id = ?", (image_id,)).fetchone()[0]
+                offsets[image_id] = (data_length, len(png))
+                data_file.write(png)
+                data_length += len(png)
+            offset, length = offsets[image_id]
+            last = entries[-1] if entries else None
+            if last is not None and last[1] == offset and last[0] + last[3] == tile_id:
+                entries[-1] = (last[0], last[1], last[2], last[3] + 1)
+            else:
+                entries.append((tile_id, offset, length, 1))
+    connection.close()
+
+    root, leaves = build_directories(entries)
+    metadata_json = gzip.compress(json.dumps(metadata).encode('utf-8'), mtime=0)
+    west, south, east, north = (float(v) for v in metadata.get('bounds', '-180,-85,180,85').split(','))
+    min_zoom, max_zoom = int(metadata.get('minzoom', 0)), int(metadata.get('maxzoom', 0))
+
+    root_offset = PMTILES_HEADER_SIZE
+    metadata_offset = root_offset + len(root)
+    leaves_offset = metadata_offset + len(metadata_json)
+    data_offset = leaves_offset + len(leaves)
+    header = b"PMTiles" + struct.pack(
+        "<BQQQQQQQQQQQBBBBBBiiiiBii",
+        3, root_offset, len(root), metadata_offset, len(metadata_json), leaves_offset, len(leaves),
+        data_offset, data_length, len(tiles), len(entries), len(offsets),
+        1, PMTILES_COMPRESSION_GZIP, PMTILES_COMPRESSION_NONE, PMTILES_TILE_PNG, min_zoom, max_zoom,
+        int(west * 1e7), int(south * 1e7), int(east * 1e7), int(north * 1e7),
+        min_zoom, int((west + east) / 2 * 1e7), int((south + north) / 2 * 1e7))
+
+    temp_path = pmtiles_path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(header)
+        f.write(root)
+        f.write(metadata_json)
+        f.write(leaves)
+        with open(temp_data_path, 'rb') as data_file:
+            while True:
+                chunk = data_file.read(8 * 1024 * 1024)
+                if not chunk:
+                    break
+                f.write(chunk)
+    os.remove(temp_data_path)
+    os.replace(temp_path, pmtiles_path)
+    return {'addressed_tiles': len(tiles), 'entries': len(entries), 'contents': len(offsets)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export a tile pyramid of the COG collection to MBTiles or PMTiles.")
+    parser.add_argument("output", help="Output .mbtiles or .pmtiles archive.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Index built with cog_index.py.")
+    parser.add_argument("--min-zoom", type=int, default=8)
+    parser.add_argument("--max-zoom", type=int, default=15)
+    parser.add_argument("--style", choices=("elevation", "hillshade"), default="hillshade")
+    parser.add_argument("--min", type=float, default=0.0, help="Elevation at the start of the colour ramp.")
+    parser.add_argument("--max", type=float, default=800.0, help="Elevation at the end of the colour ramp.")
+    parser.add_argument("--name-contains", default="DTM", help="Only use COGs whose filename contains this.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    add_profile_argument(parser, "analysis")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    pmtiles = args.output.endswith(".pmtiles")
+    # PMTiles archives are written from an MBTiles staging file, which is what resumes
+    mbtiles_path = args.output + ".mbtiles" if pmtiles else args.output
+    try:
+        result = export_mbtiles(args.index, mbtiles_path, args.min_zoom, args.max_zoom, args.style, args.min, args.max,
+                                args.name_contains or None, args.workers)
+    except KeyboardInterrupt:
+        print(f"Export interrupted, run again to resume from {mbtiles_path}")
+        sys.exit(1)
+    print(f"{result['tiles_stored']} tiles stored as {result['images_stored']} distinct images in {mbtiles_path}")
+    if pmtiles:
+        summary = mbtiles_to_pmtiles(mbtiles_path, args.output)
+        os.remove(mbtiles_path)
+        print(f"Wrote {args.output}: {summary['addressed_tiles']} tiles, {summary['entries']} directory entries, "
+              f"{summary['contents']} distinct tiles")
@@ -0,0 +1,435 @@
+'''
+A lightweight XYZ tile server over the COG collection.
+Tiles are rendered in web mercator from the COG index (see cog_index.py), as
+either a colour-ramped elevation or a hillshade. For each tile the overview
+level that suits its zoom is chosen per file, and only the blocks the tile
+needs are decoded. Decoded blocks and rendered tiles are kept in size-bounded
+LRU caches, requests are handled on a thread pool, and cache hit rates and
+latencies are served as JSON from /metrics.
+
+    GET /{elevation|hillshade}/{z}/{x}/{y}.png[?min=0&max=800]
+    GET /metrics
+'''
+import os
+import re
+import glob
+import json
+import time
+import zlib
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import rasterio
+from rasterio.warp import transform as transform_points
+
+from cog_index import CogIndex, DEFAULT_INDEX_PATH, INDEX_EPSG, build_index
+from raster_stats import QuantileSketch
+from terrain_derivatives import hillshade
+from gdal_profiles import apply_profile, add_profile_argument
+
+TILE_SIZE = 256
+WEB_MERCATOR_HALF = 20037508.342789244
+TILE_PATTERN = re.compile(r"^/(elevation|hillshade)/(\d+)/(\d+)/(\d+)\.png$")
+# Elevation (fraction of the ramp range) -> RGB
+DEFAULT_RAMP = [
+    (0.0, (26, 150, 65)),
+    (0.25, (166, 217, 106)),
+    (0.5, (255, 255, 191)),
+    (0.75, (253, 174, 97)),
+    (1.0, (215, 25, 28))
+]
+
+
+def tile_bounds(z, x, y):
+    """
+    Returns (minx, miny, maxx, maxy) of an XYZ tile in EPSG:3857.
+    """
+    size = 2 * WEB_MERCATOR_HALF / (2 ** z)
+    minx = -WEB_MERCATOR_HALF + x * size
+    maxy = WEB_MERCATOR_HALF - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def encode_png(rgba):
+    """
+    Encodes an (height, width, 4) uint8 array as a PNG.
+    """
+    height, width, _ = rgba.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw.tobytes(), 6))
+            + chunk(b"IEND", b""))
+
+
+def colour_ramp(elevation, vmin, vmax, ramp=DEFAULT_RAMP):
+    """
+    Maps elevations to RGBA with a linear colour ramp; NaN is transparent.
+    """
+    valid = ~np.isnan(elevation)
+    t = np.clip((np.nan_to_num(elevation) - vmin) / max(vmax - vmin, 1e-9), 0, 1)
+    stops = [stop for stop, _ in ramp]
+    rgba = np.zeros(elevation.shape + (4,), dtype=np.uint8)
+    for band in range(3):
+        rgba[..., band] = np.interp(t, stops, [colour[band] for _, colour in ramp])
+    rgba[..., 3] = np.where(valid, 255, 0)
+    return rgba
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by the total size of its values in bytes.
+    """
+
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.current_bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._items),
+                'bytes': self.current_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else None
+            }
+
+
+class LatencyMetrics:
+    """
+    Request count and latency quantiles in milliseconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.sketch = QuantileSketch(relative_accuracy=0.01)
+
+    def record(self, milliseconds):
+        with self._lock:
+            self.count += 1
+            self.total += milliseconds
+            self.sketch.update(np.array([milliseconds]))
+
+    def summary(self):
+        with self._lock:
+            result = {'count': self.count, 'mean': self.total / self.count if self.count else None}
+            for p in (50, 95, 99):
+                result[f"p{p}"] = self.sketch.quantile(p / 100.0) if self.count else None
+            return result
+
+
+class TileRenderer:
+    """
+    Renders XYZ tiles from the COG collection through the block and tile caches.
+    """
+
+    def __init__(self, index, block_cache_bytes=256 * 1024 * 1024, tile_cache_bytes=64 * 1024 * 1024,
+                 name_contains=None):
+        self.index = index
+        self.name_contains = name_contains
+        self.block_cache = LRUCache(block_cache_bytes, sizeof=lambda block: block.nbytes)
+        self.tile_cache = LRUCache(tile_cache_bytes)
+        self.tile_latency = LatencyMetrics()
+        self.render_latency = LatencyMetrics()
+        self._grids = {}
+        self._grids_lock = threading.Lock()
+        # rasterio datasets must not be shared between threads
+        self._local = threading.local()
+
+    def _dataset(self, path, level):
+        datasets = getattr(self._local, 'datasets', None)
+        if datasets is None:
+            datasets = self._local.datasets = OrderedDict()
+        key = (path, level)
+        if key in datasets:
+            datasets.move_to_end(key)
+            return datasets[key]
+        datasets[key] = rasterio.open(path, overview_level=level)
+        if len(datasets) > 64:
+            datasets.popitem(last=False)[1].close()
+        return datasets[key]
+
+    def _grid(self, path, level):
+        key = (path, level)
+        with self._grids_lock:
+            if key in self._grids:
+                return self._grids[key]
+        src = self._dataset(path, level)
+        block_y, block_x = src.block_shapes[0]
+        grid = {
+            'transform': src.transform,
+            'width': src.width,
+            'height': src.height,
+            'block_x': block_x,
+            'block_y': block_y,
+            'nodata': src.nodata
+        }
+        with self._grids_lock:
+            self._grids[key] = grid
+        return grid
+
+    def _overview_level(self, path, resolution):
+        key = (path, 'levels')
+        with self._grids_lock:
+            levels = self._grids.get(key)
+        if levels is None:
+            src = self._dataset(path, None)
+            levels = (abs(src.transform.a), src.overviews(1))
+            with self._grids_lock:
+                self._grids[key] = levels
+        native, factors = levels
+        level = None
+        for i, factor in enumerate(factors):
+            if native * factor <= resolution * (1 + 1e-9):
+                level = i
+        return level
+
+    def read_block(self, path, level, block_row, block_col):
+        """
+        Returns a decoded block as float32 with NaN for nodata, from the cache if possible.
+        """
+        key = (path, level, block_row, block_col)
+        block = self.block_cache.get(key)
+        if block is not None:
+            return block
+        grid = self._grid(path, level)
+        window = rasterio.windows.Window(
+            block_col * grid['block_x'], block_row * grid['block_y'],
+            min(grid['block_x'], grid['width'] - block_col * grid['block_x']),
+            min(grid['block_y'], grid['height'] - block_row * grid['block_y']))
+        block = self._dataset(path, level).read(1, window=window).astype(np.float32)
+        if grid['nodata'] is not None:
+            block[block == grid['nodata']] = np.nan
+        self.block_cache.put(key, block)
+        return block
+
+    def sample(self, x, y, resolution):
+        """
+        Nearest-neighbour elevations at EPSG:29902 points, NaN where there is no data.
+        The first file (by filename) with valid data wins where surveys overlap.
+        """
+        values = np.full(x.shape, np.nan, dtype=np.float32)
+        bbox = (float(x.min()), float(y.min()), float(x.max()), float(y.max()))
+        for entry in self.index.query(bbox):
+            if self.name_contains and self.name_contains not in entry['filename']:
+                continue
+            path = entry['path']
+            level = self._overview_level(path, resolution)
+            grid = self._grid(path, level)
+            cols, rows = ~grid['transform'] * (x, y)
+            cols = np.floor(cols).astype(np.int64)
+            rows = np.floor(rows).astype(np.int64)
+            todo = np.isnan(values) & (cols >= 0) & (rows >= 0) & (cols < grid['width']) & (rows < grid['height'])
+            if not todo.any():
+                continue
+            block_ids = (rows // grid['block_y']) * 1000000 + cols // grid['block_x']
+            for block_id in np.unique(block_ids[todo]):
+                block_row, block_col = divmod(int(block_id), 1000000)
+                block = self.read_block(path, level, block_row, block_col)
+                points = todo & (block_ids == block_id)
+                values[points] = block[rows[points] - block_row * grid['block_y'],
+                                       cols[points] - block_col * grid['block_x']]
+        return values
+
+    def elevation_tile(self, z, x, y, halo=1):
+        """
+        Returns (elevations, ground resolution) on the tile's pixel grid plus a halo.
+        """
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        pixel = (maxx - minx) / TILE_SIZE
+        offsets = (np.arange(-halo, TILE_SIZE + halo) + 0.5) * pixel
+        mx, my = np.meshgrid(minx + offsets, maxy - offsets)
+        px, py = transform_points('EPSG:3857', f'EPSG:{INDEX_EPSG}', mx.ravel(), my.ravel())
+        px = np.asarray(px).reshape(mx.shape)
+        py = np.asarray(py).reshape(mx.shape)
+        resolution = float(np.hypot(px[0, -1] - px[0, 0], py[0, -1] - py[0, 0])) / (mx.shape[1] - 1)
+        return self.sample(px, py, resolution), resolution
+
+    def render(self, style, z, x, y, vmin=0.0, vmax=800.0):
+        """
+        Returns the PNG bytes of a tile, or b"" if it has no data.
+        """
+        started = time.perf_counter()
+        key = (style, z, x, y, vmin, vmax)
+        png = self.tile_cache.get(key)
+        if png is None:
+            elevation, resolution = self.elevation_tile(z, x, y)
+            if np.isnan(elevation).all():
+                png = b""
+            elif style == 'hillshade':
+                shade = hillshade(elevation, resolution, resolution)
+                rgba = np.zeros(shade.shape + (4,), dtype=np.uint8)
+                rgba[..., :3] = (np.nan_to_num(shade) * 255)[..., None]
+                rgba[..., 3] = np.where(np.isnan(shade), 0, 255)
+                png = encode_png(rgba)
+            else:
+                png = encode_png(colour_ramp(elevation[1:-1, 1:-1], vmin, vmax))
+            self.tile_cache.put(key, png)
+            self.render_latency.record((time.perf_counter() - started) * 1000)
+        self.tile_latency.record((time.perf_counter() - started) * 1000)
+        return png
+
+    def metrics(self):
+        return {
+            'block_cache': self.block_cache.stats(),
+            'tile_cache': self.tile_cache.stats(),
+            'tile_latency_ms': self.tile_latency.summary(),
+            'render_latency_ms': self.render_latency.summary()
+        }
+
+
+class TileRequestHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/metrics":
+            self._send(200, "application/json", json.dumps(self.server.renderer.metrics(), indent=2).encode("utf-8"))
+            return
+        match = TILE_PATTERN.match(url.path)
+        if not match:
+            self.send_error(404, "Not found")
+            return
+        style, z, x, y = match.group(1), int(match.group(2)), int(match.group(3)), int(match.group(4))
+        if x >= 2 ** z or y >= 2 ** z:
+            self.send_error(404, "Tile outside the zoom level")
+            return
+        query = parse_qs(url.query)
+        try:
+            vmin = float(query.get("min", [0.0])[0])
+            vmax = float(query.get("max", [800.0])[0])
+            png = self.server.renderer.render(style, z, x, y, vmin, vmax)
+        except Exception as e:
+            print(f"Error rendering {self.path}: {str(e)}")
+            self.send_error(500, "Error rendering tile")
+            return
+        if not png:
+            self._send(204, "image/png", b"")
+        else:
+            self._send(200, "image/png", png)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """
+    HTTPServer that handles requests on a fixed-size thread pool.
+    """
+
+    def __init__(self, server_address, handler_class, renderer, workers=8):
+        super().__init__(server_address, handler_class)
+        self.renderer = renderer
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+def serve_tiles(renderer, host="127.0.0.1", port=8080, workers=8):
+    """
+    Starts the tile server on a background thread.
+
+    Returns:
+        tuple: (server, base URL). Call server.shutdown() and server.server_close() when done.
+    """
+    server = ThreadPoolHTTPServer((host, port), TileRequestHandler, renderer, workers)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Serve XYZ tiles from the COG collection.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Index built with cog_index.py.")
+    parser.add_argument("--directory", default=None, help="Build or refresh the index from this folder first.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8, help="Request handler threads.")
+    parser.add_argument("--block-cache-mb", type=int, default=256, help="Size of the decoded block cache.")
+    parser.add_argument("--tile-cache-mb", type=int, default=64, help="Size of the rendered tile cache.")
+    parser.add_argument("--name-contains", default="DTM", help="Only use COGs whose filename contains this.")
+    add_profile_argument(parser, "analysis")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    if args.directory:
+        index = build_index(glob.glob(os.path.join(args.directory, "*.tif")), args.index)
+    else:
+        index = CogIndex.load(args.index)
+    renderer = TileRenderer(index, args.block_cache_mb * 1024 * 1024, args.tile_cache_mb * 1024 * 1024,
+                            args.name_contains or None)
+    server, base_url = serve_tiles(renderer, args.host, args.port, args.workers)
+    print(f"Serving {len(index.entries)} COGs at {base_url}/{{elevation|hillshade}}/{{z}}/{{x}}/{{y}}.png")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        server.server_close()
@@ -1,25 +1,24 @@
 '''
 This will update the files sizes of the json payload. Useful for when the data is converted from lzw to deflate.
 Matches the download url and updates the filesize.
+Sizes come from a sizes file (lines of "<size>, '<download url>'"), or are read
+together with sha256 digests from the files in a data directory (cached by
+fingerprint). Files in the data directory are matched on the URL path, so the
+same file name published under two folders is not confused.
 '''
 import json
+import os
 import re
 import sys
+from urllib.parse import urlparse
 
-def update_file_sizes(json_file_path, sizes_file_path, output_file_path):
-    # Read the JSON data
-    with open(json_file_path, 'r') as f:
-        try:
-            json_data = json.load(f)
-        except json.JSONDecodeError:
-            # Try to parse JSON with a workaround for the provided format
-            with open(json_file_path, 'r') as f2:
-                content = f2.read()
-                # Fix the missing array brackets and commas between objects
-                content = '[' + content.replace('}\n {', '}, {') + ']'
-                json_data = json.loads(content)
-
-    # Read the file sizes
+from checksums import file_digests, update_download_entries, DEFAULT_CACHE_DIR
+
+
+def read_sizes_file(sizes_file_path):
+    """
+    Reads "<size>, '<download url>'" lines into a download url -> size dict.
+    """
     file_sizes = {}
     with open(sizes_file_path, 'r') as f:
         for line in f:
@@ -27,27 +26,118 @@ def update_file_sizes(json_file_path, sizes_file_path, output_file_path):
             if match:
                 size, path = match.groups()
                 file_sizes[path] = size
+    return file_sizes
+
+
+def url_path(download_url):
+    """
+    Path part of a download URL without the leading slash, e.g. lpslidar/Foyle_23_05_2004_DTM.tif
+    """
+    return urlparse(download_url).path.strip('/')
+
+
+def match_data_files(download_urls, data_dir):
+    """
+    Finds the file in data_dir for each download URL.
+
+    The whole URL path is tried first (a data directory laid out like the
+    server), then shorter trailing parts of it down to the file name. URLs that
+    only match through a trailing part shared with another URL are ambiguous
+    and left out.
+
+    Returns:
+        dict: download url -> file path
+    """
+    candidates = {}
+    for download_url in download_urls:
+        parts = url_path(download_url).split('/')
+        for i in range(len(parts)):
+            candidate = os.path.join(data_dir, *parts[i:])
+            if parts[-1] and os.path.isfile(candidate):
+                candidates[download_url] = (i == 0, candidate)
+                break
+
+    claims = {}
+    for download_url, (_, path) in candidates.items():
+        claims.setdefault(path, []).append(download_url)
+    matches = {}
+    for download_url, (exact, path) in candidates.items():
+        if exact or len(claims[path]) == 1:
+            matches[download_url] = path
+        else:
+            print(f"Ambiguous: {download_url} matches {path} along with {len(claims[path]) - 1} other URLs")
+    return matches
 
-    # Update file sizes in JSON data
-    for item in json_data:
-        download_url = item.get('downloadUrl', '')
-        if download_url in file_sizes:
-            item['fileSize'] = file_sizes[download_url]
 
-    # Write the updated JSON data to the output file
+def update_file_sizes(json_file_path, sizes_file_path, output_file_path, data_dir=None, workers=4,
+                      cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Updates fileSize (and with data_dir, sha256) of the download entries.
+
+    Args:
+        json_file_path (str): Download JSON, a list of entries with downloadUrl
+        sizes_file_path (str): Sizes file keyed by download url, or None
+        output_file_path (str): Where to write the updated JSON
+        data_dir (str): Directory holding the published files, or None
+        workers (int): Threads used to hash files
+        cache_dir (str): Digest cache directory, or None to disable the cache
+
+    Returns:
+        int: Number of entries updated
+    """
+    with open(json_file_path, 'r') as f:
+        json_data = json.load(f)
+
+    updated_urls = set()
+    if sizes_file_path:
+        file_sizes = read_sizes_file(sizes_file_path)
+        for item in json_data:
+            download_url = item.get('downloadUrl', '')
+            if download_url in file_sizes:
+                item['fileSize'] = file_sizes[download_url]
+                updated_urls.add(download_url)
+
+    if data_dir:
+        # Only hash files the payload refers to
+        matches = match_data_files({item.get('downloadUrl', '') for item in json_data}, data_dir)
+        digests = file_digests(sorted(set(matches.values())), workers, cache_dir)
+        digests_by_url = {url: digests[path] for url, path in matches.items() if path in digests}
+        update_download_entries(json_data, digests_by_url, key=lambda url: url)
+        updated_urls |= set(digests_by_url)
+
     with open(output_file_path, 'w') as f:
         json.dump(json_data, f, indent=2)
 
-    print(f"Updated JSON data written to {output_file_path}")
+    updated = sum(1 for item in json_data if item.get('downloadUrl', '') in updated_urls)
+    print(f"Updated {updated} of {len(json_data)} entries, JSON data written to {output_file_path}")
+    return updated
+
 
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python update_file_sizes.py <json_file> <sizes_file> <output_file>")
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Update file sizes and checksums in the download JSON.",
+        usage="%(prog)s json_file [sizes_file] output_file [--data-dir DIR]")
+    parser.add_argument("paths", nargs="+", metavar="json_file [sizes_file] output_file",
+                        help="Download JSON, the sizes file (optional with --data-dir) and the output file.")
+    parser.add_argument("--data-dir", default=None,
+                        help="Directory holding the published files, to read sizes and sha256 from.")
+    parser.add_argument("--workers", type=int, default=4, help="Threads used to hash files.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory for cached digests.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write cached digests.")
+    args = parser.parse_args()
+
+    if len(args.paths) == 3:
+        json_file, sizes_file, output_file = args.paths
+    elif len(args.paths) == 2 and args.data_dir:
+        (json_file, output_file), sizes_file = args.paths, None
+    else:
+        parser.error("expected json_file sizes_file output_file, or json_file output_file with --data-dir")
+
+    try:
+        update_file_sizes(json_file, sizes_file, output_file, args.data_dir, args.workers,
+                          None if args.no_cache else args.cache_dir)
+    except json.JSONDecodeError as e:
+        print(f"Error processing {json_file}: not valid JSON ({str(e)})")
         sys.exit(1)
-    
-    json_file = sys.argv[1]
-    sizes_file = sys.argv[2]
-    output_file = sys.argv[3]
-    
-    update_file_sizes(json_file, sizes_file, output_file)
-    
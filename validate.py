@@ -33,6 +33,7 @@ import os.path
 import struct
 import sys
 
+import numpy as np
 from osgeo import gdal
 
 
@@ -53,6 +54,278 @@ class ValidateCloudOptimizedGeoTIFFException(Exception):
     pass
 
 
+# TIFF tag ids and value types used by the vectorised full check
+TIFFTAG_STRIPOFFSETS = 273
+TIFFTAG_SAMPLESPERPIXEL = 277
+TIFFTAG_STRIPBYTECOUNTS = 279
+TIFFTAG_PLANARCONFIG = 284
+TIFFTAG_TILEOFFSETS = 324
+TIFFTAG_TILEBYTECOUNTS = 325
+TIFF_TYPE_DTYPES = {3: "u2", 4: "u4", 13: "u4", 16: "u8", 18: "u8"}
+
+# Probes closer than this are fetched with a single read
+PROBE_MAX_GAP = 16384
+# Upper bound on the size of a single coalesced read
+PROBE_MAX_READ = 16 * 1024 * 1024
+
+
+def read_tiff_header(f):
+    """Return (numpy byte order character, is_bigtiff) for an open file."""
+
+    gdal.VSIFSeekL(f, 0, 0)
+    header = gdal.VSIFReadL(1, 4, f)
+    if header[0:2] == b"II":
+        endian = "<"
+    elif header[0:2] == b"MM":
+        endian = ">"
+    else:
+        raise ValidateCloudOptimizedGeoTIFFException("The file is not a TIFF")
+    version = struct.unpack(endian + "H", header[2:4])[0]
+    return endian, version == 43
+
+
+def read_ifd_block_arrays(f, ifd_offset, endian, bigtiff):
+    """Read the TileOffsets/TileByteCounts (or strip equivalents) of an IFD.
+
+    Returns:
+      A tuple of two int64 arrays in TIFF (row major) block order, or None
+      when the layout is not handled by the fast path (e.g. band separate
+      multi-band files).
+    """
+
+    pointer_format = endian + ("Q" if bigtiff else "I")
+    entry_size = 20 if bigtiff else 12
+    gdal.VSIFSeekL(f, ifd_offset, 0)
+    if bigtiff:
+        entry_count = struct.unpack(endian + "Q", gdal.VSIFReadL(1, 8, f))[0]
+    else:
+        entry_count = struct.unpack(endian + "H", gdal.VSIFReadL(1, 2, f))[0]
+    raw = gdal.VSIFReadL(1, entry_count * entry_size, f)
+    if len(raw) != entry_count * entry_size:
+        return None
+
+    tags = {}
+    for i in range(entry_count):
+        entry = raw[i * entry_size : (i + 1) * entry_size]
+        tag, value_type = struct.unpack(endian + "HH", entry[0:4])
+        if bigtiff:
+            count = struct.unpack(endian + "Q", entry[4:12])[0]
+            value = entry[12:20]
+        else:
+            count = struct.unpack(endian + "I", entry[4:8])[0]
+            value = entry[8:12]
+        tags[tag] = (value_type, count, value)
+
+    def short_value(tag, default):
+        if tag not in tags:
+            return default
+        return struct.unpack(endian + "H", tags[tag][2][0:2])[0]
+
+    if (
+        short_value(TIFFTAG_PLANARCONFIG, 1) != 1
+        and short_value(TIFFTAG_SAMPLESPERPIXEL, 1) > 1
+    ):
+        return None
+
+    def read_array(tag):
+        value_type, count, value = tags[tag]
+        if value_type not in TIFF_TYPE_DTYPES:
+            return None
+        dtype = np.dtype(endian + TIFF_TYPE_DTYPES[value_type])
+        size = count * dtype.itemsize
+        if size <= len(value):
+            data = value[0:size]
+        else:
+            gdal.VSIFSeekL(f, struct.unpack(pointer_format, value)[0], 0)
+            data = gdal.VSIFReadL(1, size, f)
+            if len(data) != size:
+                return None
+        return np.frombuffer(data, dtype=dtype).astype(np.int64)
+
+    if TIFFTAG_TILEOFFSETS in tags and TIFFTAG_TILEBYTECOUNTS in tags:
+        offsets = read_array(TIFFTAG_TILEOFFSETS)
+        bytecounts = read_array(TIFFTAG_TILEBYTECOUNTS)
+    elif TIFFTAG_STRIPOFFSETS in tags and TIFFTAG_STRIPBYTECOUNTS in tags:
+        offsets = read_array(TIFFTAG_STRIPOFFSETS)
+        bytecounts = read_array(TIFFTAG_STRIPBYTECOUNTS)
+    else:
+        return None
+    if offsets is None or bytecounts is None or offsets.size != bytecounts.size:
+        return None
+    return offsets, bytecounts
+
+
+def read_probes(f, positions, length, max_gap=PROBE_MAX_GAP, max_read=PROBE_MAX_READ):
+    """Read `length` bytes at each of `positions` with coalesced reads.
+
+    Probes separated by at most max_gap bytes are fetched with a single read,
+    and reads are split at max_read boundaries to bound memory use.
+
+    Returns:
+      A tuple (uint8 array of shape (len(positions), length), boolean array
+      telling whether each probe was read completely).
+    """
+
+    positions = np.asarray(positions, dtype=np.int64)
+    out = np.zeros((positions.size, length), dtype=np.uint8)
+    complete = np.zeros(positions.size, dtype=bool)
+    if positions.size == 0:
+        return out, complete
+
+    order = np.argsort(positions, kind="stable")
+    sorted_positions = positions[order]
+    ends = np.maximum.accumulate(sorted_positions + length)
+    breaks = (
+        np.nonzero(
+            (sorted_positions[1:] > ends[:-1] + max_gap)
+            | (sorted_positions[1:] // max_read != sorted_positions[:-1] // max_read)
+        )[0]
+        + 1
+    )
+    starts = np.concatenate(([0], breaks))
+    stops = np.concatenate((breaks, [positions.size]))
+    window = np.arange(length)
+    for a, b in zip(starts, stops):
+        start = int(sorted_positions[a])
+        size = int(ends[b - 1]) - start
+        gdal.VSIFSeekL(f, start, 0)
+        data = gdal.VSIFReadL(1, size, f)
+        buf = np.zeros(size, dtype=np.uint8)
+        got = np.frombuffer(data, dtype=np.uint8) if data else buf[0:0]
+        buf[0 : got.size] = got
+        relative = sorted_positions[a:b] - start
+        out[order[a:b]] = buf[relative[:, None] + window]
+        complete[order[a:b]] = relative + length <= got.size
+    return out, complete
+
+
+def get_block_arrays(f, band, block_count, header):
+    """Return (offsets, bytecounts) of a band read from its IFD, or None."""
+
+    ifd_offset = band.GetMetadataItem("IFD_OFFSET", "TIFF")
+    if ifd_offset is None:
+        return None
+    arrays = read_ifd_block_arrays(f, int(ifd_offset), *header)
+    if arrays is None or arrays[0].size != block_count:
+        return None
+    return arrays
+
+
+def check_block_arrays(
+    band_name,
+    xblocks,
+    offset,
+    bytecount,
+    offset_mask,
+    errors,
+    block_order_row_major,
+    block_leader_size_as_uint4,
+    block_trailer_last_4_bytes_repeated,
+    probe_reader,
+):
+    """Run the full check on block offset/size arrays in TIFF block order.
+
+    Args:
+      offset, bytecount: int64 arrays of the band's block offsets and sizes.
+      offset_mask: block offsets of the interleaved mask, or None.
+      probe_reader: callable(positions, length) returning the bytes at each
+        position and whether they were read completely, as read_probes does.
+    """
+
+    has_data = offset > 0
+
+    # Offset the ordering check compares against: the previous block's data
+    # offset, or its mask offset when the block itself is empty
+    effective = offset.copy()
+    if offset_mask is not None:
+        use_mask = ~has_data & (offset_mask > 0)
+        effective[use_mask] = offset_mask[use_mask]
+    previous = np.concatenate(([0], effective[:-1]))
+
+    # (block index, check rank, message), sorted to match per block order
+    found = []
+
+    def xy(i):
+        return (int(i) % xblocks, int(i) // xblocks)
+
+    if block_order_row_major:
+        for i in np.nonzero(has_data & (offset < previous))[0]:
+            found.append(
+                (
+                    i,
+                    0,
+                    band_name
+                    + ": offset of block (%d, %d) is smaller than previous block"
+                    % xy(i),
+                )
+            )
+
+    if block_leader_size_as_uint4:
+        idx = np.nonzero(has_data)[0]
+        probes, _ = probe_reader(offset[idx] - 4, 4)
+        leader_size = np.ascontiguousarray(probes).view("<u4").reshape(-1)
+        bad = leader_size != bytecount[idx]
+        for i, size in zip(idx[bad], leader_size[bad]):
+            found.append(
+                (
+                    i,
+                    1,
+                    band_name
+                    + ": for block (%d, %d), size in leader bytes is %d instead of %d"
+                    % (xy(i) + (int(size), int(bytecount[i]))),
+                )
+            )
+
+    if block_trailer_last_4_bytes_repeated:
+        idx = np.nonzero(has_data & (bytecount >= 4))[0]
+        probes, complete = probe_reader(offset[idx] + bytecount[idx] - 4, 8)
+        bad = np.any(probes[:, 0:4] != probes[:, 4:8], axis=1) | ~complete
+        for i in idx[bad]:
+            found.append(
+                (
+                    i,
+                    2,
+                    band_name
+                    + ": for block (%d, %d), trailer bytes are invalid" % xy(i),
+                )
+            )
+
+    if offset_mask is not None:
+        expected_offset_mask = (
+            offset
+            + bytecount
+            + (4 if block_leader_size_as_uint4 else 0)
+            + (4 if block_trailer_last_4_bytes_repeated else 0)
+        )
+        both = has_data & (offset_mask > 0)
+        for i in np.nonzero(both & (offset_mask != expected_offset_mask))[0]:
+            found.append(
+                (
+                    i,
+                    3,
+                    "Mask of "
+                    + band_name
+                    + ": for block (%d, %d), offset is %d, whereas %d was expected"
+                    % (xy(i) + (int(offset_mask[i]), int(expected_offset_mask[i]))),
+                )
+            )
+        if block_order_row_major:
+            for i in np.nonzero(use_mask & (offset_mask < previous))[0]:
+                found.append(
+                    (
+                        i,
+                        3,
+                        "Mask of "
+                        + band_name
+                        + ": offset of block (%d, %d) is smaller than previous block"
+                        % xy(i),
+                    )
+                )
+
+    found.sort(key=lambda item: (item[0], item[1]))
+    errors += [message for _, _, message in found]
+
+
 def full_check_band(
     f,
     band_name,
@@ -63,6 +336,70 @@ def full_check_band(
     block_trailer_last_4_bytes_repeated,
     mask_interleaved_with_imagery,
 ):
+    """Check tile/strip ordering, leader and trailer bytes of a band.
+
+    The block offsets and sizes are read straight from the IFD and checked
+    with vectorised comparisons; leader and trailer bytes are fetched with
+    coalesced reads. Falls back to per block metadata queries when the IFD
+    layout is not handled.
+    """
+
+    block_size = band.GetBlockSize()
+    mask_band = None
+    if mask_interleaved_with_imagery:
+        mask_band = band.GetMaskBand()
+        mask_block_size = mask_band.GetBlockSize()
+        if block_size != mask_block_size:
+            errors += [
+                band_name + ": mask block size is different from its imagery band"
+            ]
+            mask_band = None
+
+    yblocks = (band.YSize + block_size[1] - 1) // block_size[1]
+    xblocks = (band.XSize + block_size[0] - 1) // block_size[0]
+
+    header = read_tiff_header(f)
+    arrays = get_block_arrays(f, band, xblocks * yblocks, header)
+    mask_arrays = None
+    if arrays is not None and mask_band is not None:
+        mask_arrays = get_block_arrays(f, mask_band, xblocks * yblocks, header)
+    if arrays is None or (mask_band is not None and mask_arrays is None):
+        full_check_band_per_block(
+            f,
+            band_name,
+            band,
+            errors,
+            block_order_row_major,
+            block_leader_size_as_uint4,
+            block_trailer_last_4_bytes_repeated,
+            mask_interleaved_with_imagery,
+        )
+        return
+
+    check_block_arrays(
+        band_name,
+        xblocks,
+        arrays[0],
+        arrays[1],
+        mask_arrays[0] if mask_arrays is not None else None,
+        errors,
+        block_order_row_major,
+        block_leader_size_as_uint4,
+        block_trailer_last_4_bytes_repeated,
+        lambda positions, length: read_probes(f, positions, length),
+    )
+
+
+def full_check_band_per_block(
+    f,
+    band_name,
+    band,
+    errors,
+    block_order_row_major,
+    block_leader_size_as_uint4,
+    block_trailer_last_4_bytes_repeated,
+    mask_interleaved_with_imagery,
+):
 
     block_size = band.GetBlockSize()
     mask_band = None
@@ -1,76 +1,227 @@
 import os
-import subprocess
 import sys
+import csv
+import json
 import datetime
+from concurrent.futures import ProcessPoolExecutor
 
-def validate_directory(directory_path, output_log_path):
+from osgeo import gdal
+
+import validate
+from fingerprint import JsonCache
+from gdal_profiles import apply_profile, add_profile_argument
+
+# Bump when validate.py or the result layout changes so cached results are redone
+VALIDATOR_VERSION = 1
+DEFAULT_CACHE_DIR = ".validation-cache"
+
+
+def validate_file(file_path, full_check=None):
     """
-    Run validate.py against each file in the specified directory and log the output.
-    
+    Validate a single file in-process with validate.validate().
+
     Args:
-        directory_path: Path to the directory containing files to validate
-        output_log_path: Path to the log file where results will be saved
+        file_path: Path to the file to validate
+        full_check: Check leader/trailer bytes. None means yes for local files,
+            as validate.py does with --full-check=auto
+
+    Returns:
+        dict: filename, path, valid, warnings, errors, details and headers_size
+    """
+    if full_check is None:
+        full_check = file_path.startswith("/vsimem/") or os.path.exists(file_path)
+
+    result = {
+        'filename': os.path.basename(file_path),
+        'path': file_path,
+        'valid': False,
+        'warnings': [],
+        'errors': [],
+        'details': {},
+        'headers_size': None,
+        'exception': None
+    }
+    try:
+        warnings, errors, details = validate.validate(file_path, full_check=full_check)
+        result['warnings'] = warnings
+        result['errors'] = errors
+        result['details'] = details
+        result['valid'] = not errors
+        headers_size = min(details["data_offsets"][k] for k in details["data_offsets"])
+        if headers_size == 0:
+            headers_size = gdal.VSIStatL(file_path).size
+        result['headers_size'] = headers_size
+    except Exception as e:
+        # Anything else (a truncated IFD, no data offsets, ...) is recorded per
+        # file too, so one bad file can not abort a whole batch
+        result['valid'] = False
+        result['exception'] = str(e) or type(e).__name__
+    return result
+
+
+def validate_files(file_paths, workers=None, full_check=None):
+    """
+    Validate files across a process pool.
+
+    Returns:
+        list: Result dictionaries in the same order as file_paths
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(validate_file, file_paths, [full_check] * len(file_paths)))
+
+
+def render_output(result):
+    """
+    Recreate the text validate.py prints for a result.
+    """
+    lines = []
+    file_path = result['path']
+    if result['exception'] is not None:
+        lines.append("%s is NOT a valid cloud optimized GeoTIFF : %s" % (file_path, result['exception']))
+        return "\n".join(lines) + "\n"
+    if result['warnings']:
+        lines.append("The following warnings were found:")
+        lines += [" - " + warning for warning in result['warnings']]
+        lines.append("")
+    if result['errors']:
+        lines.append("%s is NOT a valid cloud optimized GeoTIFF." % file_path)
+        lines.append("The following errors were found:")
+        lines += [" - " + error for error in result['errors']]
+        lines.append("")
+    else:
+        lines.append("%s is a valid cloud optimized GeoTIFF" % file_path)
+    if not result['warnings'] and not result['errors']:
+        lines.append("\nThe size of all IFD headers is %d bytes" % result['headers_size'])
+    return "\n".join(lines) + "\n"
+
+
+def write_log(results, directory_path, output_log_path):
+    """
+    Write results in the validation log format.
     """
-    # Check if directory exists
-    if not os.path.isdir(directory_path):
-        print(f"Error: Directory '{directory_path}' does not exist.")
-        return
-    
-    # Get current timestamp for the log header
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Create/open the log file
     with open(output_log_path, 'w') as log_file:
         log_file.write(f"Validation Log - {timestamp}\n")
         log_file.write(f"Directory: {os.path.abspath(directory_path)}\n")
         log_file.write("=" * 60 + "\n\n")
-        
-        # Get all files in the directory
-        files = [f for f in os.listdir(directory_path) if os.path.isfile(os.path.join(directory_path, f))]
-        
-        if not files:
+
+        if not results:
             log_file.write("No files found in the directory.\n")
-            print("No files found in the directory.")
             return
-        
-        # Process each file
-        for file_name in files:
-            file_path = os.path.join(directory_path, file_name)
-            log_file.write(f"Validating: {file_name}\n")
-            print(f"Validating: {file_name}")
-            
-            try:
-                # Run validate.py with the file as an argument
-                result = subprocess.run(
-                    ["python3", "validate.py", file_path], 
-                    capture_output=True, 
-                    text=True,
-                    check=False
-                )
-                
-                # Log the output
-                log_file.write(f"Return code: {result.returncode}\n")
-                log_file.write("STDOUT:\n")
-                log_file.write(result.stdout if result.stdout else "No output\n")
-                log_file.write("STDERR:\n")
-                log_file.write(result.stderr if result.stderr else "No errors\n")
-                log_file.write("-" * 60 + "\n\n")
-                
-            except Exception as e:
-                log_file.write(f"Error executing validate.py: {str(e)}\n")
-                log_file.write("-" * 60 + "\n\n")
-                print(f"Error with {file_name}: {str(e)}")
-        
+
+        for result in results:
+            log_file.write(f"Validating: {result['filename']}\n")
+            log_file.write(f"Return code: {0 if result['valid'] else 1}\n")
+            log_file.write("STDOUT:\n")
+            log_file.write(render_output(result))
+            log_file.write("STDERR:\n")
+            log_file.write("No errors\n")
+            log_file.write("-" * 60 + "\n\n")
+
         log_file.write("Validation completed.\n")
-    
+
+
+def save_json_results(results, output_file):
+    with open(output_file, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def save_csv_results(results, output_file):
+    fields = ['filename', 'valid', 'headers_size', 'warnings', 'errors', 'exception']
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for result in results:
+            writer.writerow({
+                'filename': result['filename'],
+                'valid': result['valid'],
+                'headers_size': result['headers_size'],
+                'warnings': " | ".join(result['warnings']),
+                'errors': " | ".join(result['errors']),
+                'exception': result['exception'] or ""
+            })
+
+
+def validate_directory(directory_path, output_log_path, workers=None, json_path=None, csv_path=None,
+                       cache_dir=DEFAULT_CACHE_DIR, force=False, content_hash=False):
+    """
+    Validate each file in the specified directory and log the results.
+
+    Results are cached by file fingerprint (path, size, mtime, optional content
+    hash) and validator version, so unchanged files are not validated again.
+
+    Args:
+        directory_path: Path to the directory containing files to validate
+        output_log_path: Path to the log file where results will be saved
+        workers: Number of worker processes (defaults to the CPU count)
+        json_path: Optional path for structured JSON results
+        csv_path: Optional path for CSV results
+        cache_dir: Directory for cached results, or None to disable the cache
+        force: Validate every file even if a cached result is still valid
+        content_hash: Include a sha256 of each file in its fingerprint
+
+    Returns:
+        list: Result dictionaries, or None if the directory does not exist
+    """
+    # Check if directory exists
+    if not os.path.isdir(directory_path):
+        print(f"Error: Directory '{directory_path}' does not exist.")
+        return None
+
+    # Get all files in the directory
+    files = sorted(f for f in os.listdir(directory_path) if os.path.isfile(os.path.join(directory_path, f)))
+    if not files:
+        print("No files found in the directory.")
+
+    file_paths = [os.path.join(directory_path, f) for f in files]
+    cache = JsonCache(cache_dir, version=VALIDATOR_VERSION, content_hash=content_hash) if cache_dir else None
+
+    results = {}
+    if cache is not None and not force:
+        for file_path in file_paths:
+            cached = cache.get(file_path)
+            if cached is not None:
+                results[file_path] = cached
+
+    pending = [file_path for file_path in file_paths if file_path not in results]
+    for file_path, result in zip(pending, validate_files(pending, workers) if pending else []):
+        results[file_path] = result
+        if cache is not None:
+            cache.put(file_path, result)
+        status = "valid" if result['valid'] else "NOT valid"
+        print(f"Validated: {result['filename']} ({status})")
+    print(f"{len(pending)} files validated, {len(file_paths) - len(pending)} unchanged files taken from the cache")
+
+    results = [results[file_path] for file_path in file_paths]
+
+    write_log(results, directory_path, output_log_path)
+    if json_path:
+        save_json_results(results, json_path)
+    if csv_path:
+        save_csv_results(results, csv_path)
+
     print(f"Validation completed. Results saved to {output_log_path}")
+    return results
+
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python3 validatefiles.py directory_path output_log_path")
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Validate every file in a directory as a cloud optimized GeoTIFF.")
+    parser.add_argument("directory_path", help="Directory containing the files to validate.")
+    parser.add_argument("output_log_path", help="Log file to write.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    parser.add_argument("--json", default=None, help="Also write structured results as JSON.")
+    parser.add_argument("--csv", default=None, help="Also write results as CSV.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Directory for cached results.")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write cached results.")
+    parser.add_argument("--force", action="store_true", help="Validate every file, ignoring cached results.")
+    parser.add_argument("--hash", action="store_true", help="Include a sha256 of each file in its fingerprint.")
+    add_profile_argument(parser, "analysis")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    results = validate_directory(args.directory_path, args.output_log_path, args.workers, args.json, args.csv,
+                                 None if args.no_cache else args.cache_dir, args.force, args.hash)
+    if results is None or not all(result['valid'] for result in results):
         sys.exit(1)
-    
-    directory_path = sys.argv[1]
-    output_log_path = sys.argv[2]
-    
-    validate_directory(directory_path, output_log_path)
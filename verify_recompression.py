@@ -0,0 +1,232 @@
+'''
+Verifies that a recompressed raster holds the same pixels as its source.
+The output's block grid is split between a pool of workers that each read the
+matching windows from both files and compare them. The first mismatch stops the
+run unless a full report is requested. A tolerance can be given for lossy modes.
+'''
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import numpy as np
+from osgeo import gdal
+
+from gdal_profiles import apply_profile, add_profile_argument
+
+
+def block_windows(band):
+    """
+    Returns the (xoff, yoff, xsize, ysize) windows of a band's block grid.
+    """
+    block_x, block_y = band.GetBlockSize()
+    windows = []
+    for yoff in range(0, band.YSize, block_y):
+        for xoff in range(0, band.XSize, block_x):
+            windows.append((xoff, yoff, min(block_x, band.XSize - xoff), min(block_y, band.YSize - yoff)))
+    return windows
+
+
+def valid_mask(data, nodata):
+    """
+    Returns a boolean mask of pixels that are not nodata or NaN.
+    """
+    valid = np.ones(data.shape, dtype=bool)
+    if data.dtype.kind == 'f':
+        valid &= ~np.isnan(data)
+    if nodata is not None and not np.isnan(nodata):
+        valid &= data != nodata
+    return valid
+
+
+def compare_arrays(source, output, source_nodata, output_nodata, tolerance=0.0):
+    """
+    Compares two blocks. Nodata areas must match exactly and valid pixels must
+    be equal, or within `tolerance` when it is greater than zero.
+
+    Returns:
+        dict: Details of the difference, or None if the blocks match
+    """
+    source_valid = valid_mask(source, source_nodata)
+    output_valid = valid_mask(output, output_nodata)
+    mask_mismatch = int(np.count_nonzero(source_valid != output_valid))
+
+    both = source_valid & output_valid
+    source_values = source[both].astype(np.float64)
+    output_values = output[both].astype(np.float64)
+    if tolerance > 0:
+        diff = np.abs(source_values - output_values)
+        value_mismatch = int(np.count_nonzero(diff > tolerance))
+    else:
+        diff = np.abs(source_values - output_values) if source_values.size else np.zeros(0)
+        value_mismatch = int(np.count_nonzero(source_values != output_values))
+
+    if mask_mismatch == 0 and value_mismatch == 0:
+        return None
+    return {
+        'nodata_mismatch_pixels': mask_mismatch,
+        'value_mismatch_pixels': value_mismatch,
+        'max_abs_diff': float(diff.max()) if diff.size else 0.0
+    }
+
+
+def _check_windows(source_path, output_path, windows, tolerance, fail_fast, stop_event=None):
+    # Each worker opens its own datasets, GDAL handles are not shareable between threads
+    source_ds = gdal.Open(source_path)
+    output_ds = gdal.Open(output_path)
+    mismatches = []
+    checked = 0
+    for xoff, yoff, xsize, ysize in windows:
+        if stop_event is not None and stop_event.is_set():
+            break
+        for band_index in range(1, output_ds.RasterCount + 1):
+            source_band = source_ds.GetRasterBand(band_index)
+            output_band = output_ds.GetRasterBand(band_index)
+            difference = compare_arrays(
+                source_band.ReadAsArray(xoff, yoff, xsize, ysize),
+                output_band.ReadAsArray(xoff, yoff, xsize, ysize),
+                source_band.GetNoDataValue(),
+                output_band.GetNoDataValue(),
+                tolerance
+            )
+            if difference is not None:
+                difference.update({'band': band_index, 'xoff': xoff, 'yoff': yoff,
+                                   'xsize': xsize, 'ysize': ysize})
+                mismatches.append(difference)
+        checked += 1
+        if mismatches and fail_fast:
+            if stop_event is not None:
+                stop_event.set()
+            break
+    source_ds = None
+    output_ds = None
+    return checked, mismatches
+
+
+def check_structure(source_ds, output_ds):
+    """
+    Compares dimensions, band count, geotransform and data types of two datasets.
+
+    Returns:
+        list: Error messages, empty if the structure matches
+    """
+    errors = []
+    if (source_ds.RasterXSize, source_ds.RasterYSize) != (output_ds.RasterXSize, output_ds.RasterYSize):
+        errors.append("Raster size differs: %dx%d vs %dx%d" % (
+            source_ds.RasterXSize, source_ds.RasterYSize, output_ds.RasterXSize, output_ds.RasterYSize))
+    if source_ds.RasterCount != output_ds.RasterCount:
+        errors.append("Band count differs: %d vs %d" % (source_ds.RasterCount, output_ds.RasterCount))
+    source_gt = source_ds.GetGeoTransform()
+    output_gt = output_ds.GetGeoTransform()
+    if not np.allclose(source_gt, output_gt, rtol=0, atol=1e-6):
+        errors.append("Geotransform differs: %s vs %s" % (source_gt, output_gt))
+    for band_index in range(1, min(source_ds.RasterCount, output_ds.RasterCount) + 1):
+        source_type = source_ds.GetRasterBand(band_index).DataType
+        output_type = output_ds.GetRasterBand(band_index).DataType
+        if source_type != output_type:
+            errors.append("Band %d data type differs: %s vs %s" % (
+                band_index, gdal.GetDataTypeName(source_type), gdal.GetDataTypeName(output_type)))
+    return errors
+
+
+def verify_rasters(source_path, output_path, tolerance=0.0, workers=None, fail_fast=True,
+                   use_processes=False, chunk_size=64):
+    """
+    Compares a source raster with its recompressed output block by block.
+
+    Args:
+        source_path (str): Original raster (any GDAL readable path, including VRT)
+        output_path (str): Recompressed raster
+        tolerance (float): Allowed absolute difference, 0 for lossless modes
+        workers (int): Pool size (defaults to the CPU count)
+        fail_fast (bool): Stop on the first differing block
+        use_processes (bool): Use a process pool instead of threads
+        chunk_size (int): Number of blocks handed to a worker at a time
+
+    Returns:
+        dict: 'identical', 'blocks_checked', 'blocks_total', 'errors' and 'mismatches'
+    """
+    source_ds = gdal.Open(source_path)
+    output_ds = gdal.Open(output_path)
+    if source_ds is None or output_ds is None:
+        missing = source_path if source_ds is None else output_path
+        return {'identical': False, 'blocks_checked': 0, 'blocks_total': 0,
+                'errors': [f"Could not open {missing}"], 'mismatches': []}
+
+    errors = check_structure(source_ds, output_ds)
+    windows = block_windows(output_ds.GetRasterBand(1))
+    source_ds = None
+    output_ds = None
+    result = {'identical': False, 'blocks_checked': 0, 'blocks_total': len(windows),
+              'errors': errors, 'mismatches': []}
+    if errors:
+        return result
+
+    workers = workers or os.cpu_count() or 1
+    chunks = [windows[i:i + chunk_size] for i in range(0, len(windows), chunk_size)]
+    stop_event = None if use_processes else threading.Event()
+    executor_cls = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+
+    executor = executor_cls(max_workers=workers)
+    try:
+        futures = [
+            executor.submit(_check_windows, source_path, output_path, chunk, tolerance, fail_fast, stop_event)
+            for chunk in chunks
+        ]
+        for future in as_completed(futures):
+            checked, mismatches = future.result()
+            result['blocks_checked'] += checked
+            result['mismatches'].extend(mismatches)
+            if mismatches and fail_fast:
+                if stop_event is not None:
+                    stop_event.set()
+                for pending in futures:
+                    pending.cancel()
+                break
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    result['mismatches'].sort(key=lambda m: (m['band'], m['yoff'], m['xoff']))
+    result['identical'] = not result['mismatches']
+    return result
+
+
+def print_report(source_path, output_path, result):
+    """
+    Prints a verification result in a readable form.
+    """
+    print(f"Source: {source_path}")
+    print(f"Output: {output_path}")
+    for error in result['errors']:
+        print(f" - {error}")
+    print(f"Blocks checked: {result['blocks_checked']} of {result['blocks_total']}")
+    if result['mismatches']:
+        print("Differing blocks:")
+        for m in result['mismatches']:
+            print(f" - band {m['band']} block at ({m['xoff']}, {m['yoff']}) {m['xsize']}x{m['ysize']}: "
+                  f"{m['value_mismatch_pixels']} values differ (max abs diff {m['max_abs_diff']:.6g}), "
+                  f"{m['nodata_mismatch_pixels']} nodata pixels differ")
+    if result['identical'] and not result['errors']:
+        print("Output matches source")
+    else:
+        print("Output does NOT match source")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Verify a recompressed raster against its source.")
+    parser.add_argument("source", help="Original raster.")
+    parser.add_argument("output", help="Recompressed raster.")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Allowed absolute difference for lossy modes.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of workers.")
+    parser.add_argument("--processes", action="store_true", help="Use a process pool instead of threads.")
+    parser.add_argument("--full-report", action="store_true", help="Check every block instead of stopping at the first mismatch.")
+    add_profile_argument(parser, "analysis")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    result = verify_rasters(args.source, args.output, args.tolerance, args.workers,
+                            fail_fast=not args.full_report, use_processes=args.processes)
+    print_report(args.source, args.output, result)
+    sys.exit(0 if result['identical'] and not result['errors'] else 1)
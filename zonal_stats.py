@@ -0,0 +1,279 @@
+'''
+Zonal statistics for a polygon layer against the COG collection.
+Polygons are grouped by the COG blocks they touch so each block is read at most
+once. The polygons in a block are rasterised together into an id raster (one
+per layer of non-overlapping polygons) and per-polygon partial results
+(count, sum, min, max and a quantile sketch) are merged across blocks and files.
+Blocks are spread across a process pool.
+'''
+import sys
+import csv
+import json
+import math
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.features import rasterize
+from rasterio.windows import Window
+from shapely import STRtree
+from shapely.geometry import box, shape
+
+from cog_index import CogIndex, DEFAULT_INDEX_PATH
+from raster_stats import QuantileSketch
+from gdal_profiles import apply_profile, add_profile_argument
+
+
+class ZoneStats:
+    """
+    Mergeable per-polygon summary: count, sum, min, max and a quantile sketch.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch()
+
+    def update(self, values):
+        if values.size == 0:
+            return
+        values = values.astype(np.float64, copy=False)
+        self.count += values.size
+        self.sum += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.sketch.update(values)
+
+    def merge(self, other):
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def summary(self, percentiles=(1, 50, 99)):
+        result = {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else None,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None
+        }
+        for p in percentiles:
+            result[f"p{p:g}"] = self.sketch.quantile(p / 100.0)
+        return result
+
+
+def load_polygons(geojson_path, id_field=None):
+    """
+    Reads polygons from a GeoJSON file in EPSG:29902.
+
+    Args:
+        geojson_path (str): Path to a FeatureCollection
+        id_field (str): Property used as the polygon id. Defaults to the feature
+            id, or its position in the file.
+
+    Returns:
+        list: (id, shapely geometry) tuples
+    """
+    with open(geojson_path, 'r') as f:
+        collection = json.load(f)
+    polygons = []
+    for i, feature in enumerate(collection['features']):
+        if feature.get('geometry') is None:
+            continue
+        if id_field:
+            polygon_id = feature['properties'][id_field]
+        else:
+            polygon_id = feature.get('id', i)
+        polygons.append((polygon_id, shape(feature['geometry'])))
+    return polygons
+
+
+def plan_block_reads(index, polygons, name_contains=None):
+    """
+    Groups polygons by the COG blocks they touch.
+
+    Returns:
+        dict: path -> {(block_row, block_col): [polygon positions]}
+    """
+    plan = defaultdict(lambda: defaultdict(list))
+    grids = {}
+    for position, (_, geometry) in enumerate(polygons):
+        for entry in index.query(geometry.bounds):
+            if name_contains and name_contains not in entry['filename']:
+                continue
+            path = entry['path']
+            if path not in grids:
+                with rasterio.open(path) as src:
+                    block_y, block_x = src.block_shapes[0]
+                    grids[path] = (src.transform, src.width, src.height, block_x, block_y)
+            transform, width, height, block_x, block_y = grids[path]
+
+            minx, miny, maxx, maxy = geometry.bounds
+            col0, row0 = ~transform * (minx, maxy)
+            col1, row1 = ~transform * (maxx, miny)
+            bcol0 = max(0, int(math.floor(col0)) // block_x)
+            brow0 = max(0, int(math.floor(row0)) // block_y)
+            bcol1 = min((width - 1) // block_x, int(math.floor(col1)) // block_x)
+            brow1 = min((height - 1) // block_y, int(math.floor(row1)) // block_y)
+            for brow in range(brow0, brow1 + 1):
+                for bcol in range(bcol0, bcol1 + 1):
+                    plan[path][(brow, bcol)].append(position)
+    return plan
+
+
+def _conflicts(geometries, all_touched):
+    """
+    Pairs of polygons that can claim the same pixel, so can not share an id raster.
+
+    Returns:
+        dict: position -> set of conflicting positions
+    """
+    positions = list(geometries)
+    shapes = [geometries[p] for p in positions]
+    tree = STRtree(shapes)
+    pairs = set(zip(*tree.query(shapes, predicate='intersects')))
+    if not all_touched:
+        # With the pixel centre rule polygons that only share an edge do not compete
+        pairs -= set(zip(*tree.query(shapes, predicate='touches')))
+    conflicts = defaultdict(set)
+    for i, j in pairs:
+        if i != j:
+            conflicts[positions[i]].add(positions[j])
+    return conflicts
+
+
+def _layers(positions, conflicts):
+    # Greedy colouring: polygons in one layer never overlap. Disjoint or
+    # tessellating polygons need only one or a few layers.
+    layers = []
+    for position in positions:
+        for layer in layers:
+            if not conflicts[position] & layer:
+                layer.add(position)
+                break
+        else:
+            layers.append({position})
+    return [sorted(layer) for layer in layers]
+
+
+def _zonal_for_blocks(path, blocks, geometries, all_touched):
+    # blocks: list of ((block_row, block_col), [polygon positions])
+    results = {}
+    conflicts = _conflicts(geometries, all_touched)
+    with rasterio.open(path) as src:
+        block_y, block_x = src.block_shapes[0]
+        nodata = src.nodata
+        for (brow, bcol), positions in blocks:
+            window = Window(bcol * block_x, brow * block_y,
+                            min(block_x, src.width - bcol * block_x),
+                            min(block_y, src.height - brow * block_y))
+            data = src.read(1, window=window)
+            valid = ~np.isnan(data) if data.dtype.kind == 'f' else np.ones(data.shape, dtype=bool)
+            if nodata is not None and not np.isnan(nodata):
+                valid &= data != nodata
+            if not valid.any():
+                continue
+            transform = src.window_transform(window)
+            block_box = box(*rasterio.windows.bounds(window, src.transform))
+            positions = [p for p in positions if geometries[p].intersects(block_box)]
+            # One id raster per layer of non-overlapping polygons, then the values
+            # are grouped by id with a single sort
+            for layer in _layers(positions, conflicts):
+                ids = rasterize(((geometries[p], i + 1) for i, p in enumerate(layer)), out_shape=data.shape,
+                                transform=transform, fill=0, all_touched=all_touched, dtype='int32')
+                selected = valid & (ids > 0)
+                labels = ids[selected]
+                if labels.size == 0:
+                    continue
+                order = np.argsort(labels, kind='stable')
+                labels, values = labels[order], data[selected][order]
+                found, starts = np.unique(labels, return_index=True)
+                for label, group in zip(found, np.split(values, starts[1:])):
+                    results.setdefault(layer[label - 1], ZoneStats()).update(group)
+    return results
+
+
+def zonal_statistics(index, polygons, name_contains=None, workers=None, blocks_per_task=32, all_touched=False):
+    """
+    Computes statistics of the raster values inside each polygon.
+
+    Args:
+        index (CogIndex): Index over the COG collection
+        polygons (list): (id, shapely geometry) tuples in EPSG:29902
+        name_contains (str): Only use COGs whose filename contains this, e.g. "DTM"
+        workers (int): Process pool size (defaults to the CPU count)
+        blocks_per_task (int): Blocks handed to a worker at a time
+        all_touched (bool): Include every pixel touched by a polygon, not just
+            those whose centre falls inside
+
+    Returns:
+        dict: polygon position -> ZoneStats
+    """
+    plan = plan_block_reads(index, polygons, name_contains)
+    geometries = [geometry for _, geometry in polygons]
+
+    tasks = []
+    for path, blocks in plan.items():
+        items = sorted(blocks.items())
+        for i in range(0, len(items), blocks_per_task):
+            chunk = items[i:i + blocks_per_task]
+            needed = {p for _, positions in chunk for p in positions}
+            # Only ship the geometries this task uses to the worker
+            chunk_geometries = {p: geometries[p] for p in needed}
+            tasks.append((path, chunk, chunk_geometries))
+
+    zones = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_zonal_for_blocks, path, chunk, chunk_geometries, all_touched)
+                   for path, chunk, chunk_geometries in tasks]
+        for future in futures:
+            for position, stats in future.result().items():
+                if position in zones:
+                    zones[position].merge(stats)
+                else:
+                    zones[position] = stats
+    return zones
+
+
+def save_csv_results(polygons, zones, output_file='zonal_stats.csv', percentiles=(1, 50, 99)):
+    """
+    Writes one row per polygon; polygons without valid pixels have a count of 0.
+    """
+    fields = ['id', 'count', 'mean', 'min', 'max'] + [f"p{p:g}" for p in percentiles]
+    with open(output_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for position, (polygon_id, _) in enumerate(polygons):
+            row = zones.get(position, ZoneStats()).summary(percentiles)
+            row['id'] = polygon_id
+            writer.writerow(row)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Zonal statistics of polygons against the COG collection.")
+    parser.add_argument("polygons", help="GeoJSON FeatureCollection of polygons in EPSG:29902.")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="Index built with cog_index.py.")
+    parser.add_argument("--id-field", default=None, help="Property to use as the polygon id.")
+    parser.add_argument("--name-contains", default="DTM", help="Only use COGs whose filename contains this.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes.")
+    parser.add_argument("--all-touched", action="store_true", help="Include all pixels touched by each polygon.")
+    parser.add_argument("--output", default="zonal_stats.csv", help="Output CSV file.")
+    add_profile_argument(parser, "analysis")
+    args = parser.parse_args()
+    apply_profile(args.gdal_profile)
+
+    polygons = load_polygons(args.polygons, args.id_field)
+    if not polygons:
+        print(f"No polygons found in {args.polygons}")
+        sys.exit(1)
+    zones = zonal_statistics(CogIndex.load(args.index), polygons, args.name_contains, args.workers,
+                             all_touched=args.all_touched)
+    save_csv_results(polygons, zones, args.output)
+    print(f"Statistics for {len(zones)} of {len(polygons)} polygons written to {args.output}")